@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+"""
+    Madgwick AHRS on plain floats.
+
+    Same filter as algorithms.madgwickahrs.MadgwickAHRS (gradient descent step against gravity and
+    the earth magnetic field, beta gain), with f, J^T f and the quaternion products written out per
+    component. No matrix, list or Quaternion objects are created per update, on ports with boxed
+    floats (ESP32) the intermediate floats are still heap objects.
+"""
+
+import math
+
+try:
+    import micropython
+except ImportError:
+    # CPython (benchmarks, validation against MadgwickAHRS): no native emitter
+    class micropython:
+        @staticmethod
+        def native(f):
+            return f
+
+
+class Madgwick:
+    def __init__(self, beta=1.0, quaternion=(1.0, 0.0, 0.0, 0.0)):
+        """
+        :param beta: Algorithm gain beta
+        :param quaternion: Initial orientation (w, x, y, z)
+        """
+        self.beta = beta
+        self.q0, self.q1, self.q2, self.q3 = quaternion
+
+    @micropython.native
+    def update(self, gx, gy, gz, ax, ay, az, mx, my, mz, dt):
+        """
+        One 9-DOF update step
+        :param gx, gy, gz: Gyroscope in radians per second
+        :param ax, ay, az: Accelerometer, any unit
+        :param mx, my, mz: Magnetometer, any unit
+        :param dt: Sample period in seconds
+        :return: False if the accelerometer or magnetometer reads zero and the step was skipped
+        """
+        q0 = self.q0
+        q1 = self.q1
+        q2 = self.q2
+        q3 = self.q3
+
+        n = math.sqrt(ax * ax + ay * ay + az * az)
+        if n == 0:
+            return False
+        ax /= n
+        ay /= n
+        az /= n
+        n = math.sqrt(mx * mx + my * my + mz * mz)
+        if n == 0:
+            return False
+        mx /= n
+        my /= n
+        mz /= n
+
+        # Magnetic field in the earth frame, h = q (0, m) q*, reference direction b = (|hxy|, 0, hz)
+        q0q0 = q0 * q0
+        q1q1 = q1 * q1
+        q2q2 = q2 * q2
+        q3q3 = q3 * q3
+        q0q1 = q0 * q1
+        q0q2 = q0 * q2
+        q0q3 = q0 * q3
+        q1q2 = q1 * q2
+        q1q3 = q1 * q3
+        q2q3 = q2 * q3
+        hx = mx * (q0q0 + q1q1 - q2q2 - q3q3) + 2 * my * (q1q2 - q0q3) + 2 * mz * (q1q3 + q0q2)
+        hy = 2 * mx * (q1q2 + q0q3) + my * (q0q0 - q1q1 + q2q2 - q3q3) + 2 * mz * (q2q3 - q0q1)
+        bx = math.sqrt(hx * hx + hy * hy)
+        bz = 2 * mx * (q1q3 - q0q2) + 2 * my * (q2q3 + q0q1) + mz * (q0q0 - q1q1 - q2q2 + q3q3)
+
+        # Objective function f
+        f1 = 2 * (q1q3 - q0q2) - ax
+        f2 = 2 * (q0q1 + q2q3) - ay
+        f3 = 2 * (0.5 - q1q1 - q2q2) - az
+        f4 = 2 * bx * (0.5 - q2q2 - q3q3) + 2 * bz * (q1q3 - q0q2) - mx
+        f5 = 2 * bx * (q1q2 - q0q3) + 2 * bz * (q0q1 + q2q3) - my
+        f6 = 2 * bx * (q0q2 + q1q3) + 2 * bz * (0.5 - q1q1 - q2q2) - mz
+
+        # Gradient J^T f
+        s0 = -2 * q2 * f1 + 2 * q1 * f2 - 2 * bz * q2 * f4 + (-2 * bx * q3 + 2 * bz * q1) * f5 + 2 * bx * q2 * f6
+        s1 = 2 * q3 * f1 + 2 * q0 * f2 - 4 * q1 * f3 + 2 * bz * q3 * f4 + (2 * bx * q2 + 2 * bz * q0) * f5 + \
+            (2 * bx * q3 - 4 * bz * q1) * f6
+        s2 = -2 * q0 * f1 + 2 * q3 * f2 - 4 * q2 * f3 + (-4 * bx * q2 - 2 * bz * q0) * f4 + \
+            (2 * bx * q1 + 2 * bz * q3) * f5 + (2 * bx * q0 - 4 * bz * q2) * f6
+        s3 = 2 * q1 * f1 + 2 * q2 * f2 + (-4 * bx * q3 + 2 * bz * q1) * f4 + (-2 * bx * q0 + 2 * bz * q2) * f5 + \
+            2 * bx * q1 * f6
+
+        self._integrate(q0, q1, q2, q3, gx, gy, gz, s0, s1, s2, s3, dt)
+        return True
+
+    @micropython.native
+    def update_imu(self, gx, gy, gz, ax, ay, az, dt):
+        """
+        One 6-DOF update step, gravity only
+        :param gx, gy, gz: Gyroscope in radians per second
+        :param ax, ay, az: Accelerometer, any unit
+        :param dt: Sample period in seconds
+        :return: False if the accelerometer reads zero and the step was skipped
+        """
+        q0 = self.q0
+        q1 = self.q1
+        q2 = self.q2
+        q3 = self.q3
+
+        n = math.sqrt(ax * ax + ay * ay + az * az)
+        if n == 0:
+            return False
+        ax /= n
+        ay /= n
+        az /= n
+
+        f1 = 2 * (q1 * q3 - q0 * q2) - ax
+        f2 = 2 * (q0 * q1 + q2 * q3) - ay
+        f3 = 2 * (0.5 - q1 * q1 - q2 * q2) - az
+
+        s0 = -2 * q2 * f1 + 2 * q1 * f2
+        s1 = 2 * q3 * f1 + 2 * q0 * f2 - 4 * q1 * f3
+        s2 = -2 * q0 * f1 + 2 * q3 * f2 - 4 * q2 * f3
+        s3 = 2 * q1 * f1 + 2 * q2 * f2
+
+        self._integrate(q0, q1, q2, q3, gx, gy, gz, s0, s1, s2, s3, dt)
+        return True
+
+    @micropython.native
+    def _integrate(self, q0, q1, q2, q3, gx, gy, gz, s0, s1, s2, s3, dt):
+        # qdot = q (0, g) / 2 - beta * s / |s|, then q += qdot dt and normalise
+        n = math.sqrt(s0 * s0 + s1 * s1 + s2 * s2 + s3 * s3)
+        beta = self.beta / n if n else 0.0
+        d0 = 0.5 * (-q1 * gx - q2 * gy - q3 * gz) - beta * s0
+        d1 = 0.5 * (q0 * gx + q2 * gz - q3 * gy) - beta * s1
+        d2 = 0.5 * (q0 * gy - q1 * gz + q3 * gx) - beta * s2
+        d3 = 0.5 * (q0 * gz + q1 * gy - q2 * gx) - beta * s3
+        q0 += d0 * dt
+        q1 += d1 * dt
+        q2 += d2 * dt
+        q3 += d3 * dt
+        n = math.sqrt(q0 * q0 + q1 * q1 + q2 * q2 + q3 * q3)
+        self.q0 = q0 / n
+        self.q1 = q1 / n
+        self.q2 = q2 / n
+        self.q3 = q3 / n
+
+    def to_euler_angles(self):
+        """
+        Same convention as Quaternion.to_euler_angles
+        :return: roll, pitch, yaw in radians
+        """
+        q0, q1, q2, q3 = self.q0, self.q1, self.q2, self.q3
+        pitch = math.asin(max(-1.0, min(1.0, 2 * q1 * q2 + 2 * q0 * q3)))
+        if abs(q1 * q2 + q3 * q0 - 0.5) < 1e-8:
+            roll = 0
+            yaw = 2 * math.atan2(q1, q0)
+        elif abs(q1 * q2 + q3 * q0 + 0.5) < 1e-8:
+            roll = -2 * math.atan2(q1, q0)
+            yaw = 0
+        else:
+            roll = math.atan2(2 * q0 * q1 - 2 * q2 * q3, 1 - 2 * q1 * q1 - 2 * q3 * q3)
+            yaw = math.atan2(2 * q0 * q2 - 2 * q1 * q3, 1 - 2 * q2 * q2 - 2 * q3 * q3)
+        return roll, pitch, yaw
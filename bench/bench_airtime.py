@@ -0,0 +1,58 @@
+# Radio433 frame rates with the airtime scheduler against the old fixed 1.5 s cadence,
+# for every air data rate and the frames main.py can send. Uses the 9600 baud UART
+# of main.py.
+# Run from the repository root: python bench/bench_airtime.py
+import sys
+
+sys.path.insert(0, ".")
+
+import bitpacker
+import datapacker
+import framing
+from communication import airtime
+from hardware.lora_e220_constants import AirDataRate, SubPacketSetting, UARTBaudRate
+
+FIXED_MS = 1500
+
+
+class Configuration:
+    # Just the parts of lora_e220.Configuration the scheduler reads
+    class SPED:
+        uartBaudRate = UARTBaudRate.BPS_9600
+
+    class OPTION:
+        subPacketSetting = SubPacketSetting.SPS_200_00
+
+    def __init__(self, air_data_rate):
+        self.SPED = Configuration.SPED()
+        self.SPED.airDataRate = air_data_rate
+
+
+def main():
+    frames = {
+        "text log-everything": 4 * ((datapacker.size + 2) // 3) + 1,
+        "binary radio-minimal": framing.HEADER_SIZE + datapacker.profiles["radio-minimal"].size + framing.CRC_SIZE,
+        "bitpacked radio-minimal": framing.HEADER_SIZE + bitpacker.profiles["radio-minimal"].size + framing.CRC_SIZE,
+    }
+    rates = [
+        ("2.4k", AirDataRate.AIR_DATA_RATE_010_24),
+        ("4.8k", AirDataRate.AIR_DATA_RATE_011_48),
+        ("9.6k", AirDataRate.AIR_DATA_RATE_100_96),
+        ("19.2k", AirDataRate.AIR_DATA_RATE_101_192),
+        ("38.4k", AirDataRate.AIR_DATA_RATE_110_384),
+        ("62.5k", AirDataRate.AIR_DATA_RATE_111_625),
+    ]
+    print(f"fixed cadence: {1000 / FIXED_MS:.2f} frames/s for any frame")
+    for name, length in frames.items():
+        print(f"{name} ({length} B)")
+        for label, rate in rates:
+            scheduler = airtime.AirtimeScheduler(Configuration(rate))
+            toa = scheduler.time_on_air_ms(length)
+            period = length * scheduler.byte_ms + toa + airtime.PACKET_GAP_MS
+            duty = period + toa * (1 / airtime.DUTY_CYCLE_EU_433 - 1)
+            print(f"  {label:>5}: {toa:7.1f} ms on air, {1000 / period:6.2f} frames/s, "
+                  f"{1000 / duty:5.2f} frames/s at 10% duty cycle")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+# Compares the compiled datapacker.pack() against the previous implementation
+# that rebuilt the format and walked `structure` on every call.
+# Run from the repository root: python bench/bench_datapacker.py
+import struct
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, ".")
+
+import datapacker
+
+SAMPLE = {
+    "time": 45296123, "bat_v": 3.91, "lat": 54.687157, "lon": 25.279652, "gps_sats": 9,
+    "gps_hdop": 1.2, "gps_alt": 312.4, "gsm_signal": 0.6, "baro_bmp": 1003.2512,
+    "baro_bme": 1003.1018, "baro_ms5611": 1003.3044, "temp_bmp": 21.34, "temp_mpu": 23.1,
+    "temp_bme": 21.02, "temp_ms5611": 20.88, "hum_bme": 41.5, "acc_x": 0.012, "acc_y": -0.034,
+    "acc_z": 0.998, "gyro_x": 1.2, "gyro_y": -0.4, "gyro_z": 0.05, "mag_x": 120, "mag_y": -331,
+    "mag_z": 410, "ahrs_x": 2.5, "ahrs_y": -1.3, "ahrs_z": 178.0, "als": 1200
+}
+
+
+def legacy_pack(structure):
+    fmt = ">" + "".join([datapacker.types[structure[i]["type"]] for i in datapacker.sequencing])
+    dt = []
+    for i in datapacker.sequencing:
+        dt.append(int(structure[i]["value"] * structure[i]["multiplier"]))
+    for i in datapacker.sequencing:
+        if structure[i].get("value", 0) * structure[i]["multiplier"] < \
+                datapacker.dataminmax[structure[i]["type"]]["min"] or \
+                structure[i].get("value", 0) * structure[i]["multiplier"] > \
+                datapacker.dataminmax[structure[i]["type"]]["max"]:
+            raise Exception("Overflow")
+    return datapacker.ubinascii.b2a_base64(struct.pack(fmt, *dt)).decode("utf-8")
+
+
+def run(name, fn, n):
+    fn()
+    start = time.perf_counter()
+    for _ in range(n):
+        fn()
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:10s} {n / elapsed:10.0f} packs/s {elapsed / n * 1e6:7.2f} us/pack {peak:6d} B peak/pack")
+
+
+def main(n=50000):
+    structure = {key: dict(val, value=SAMPLE.get(key, 0)) for key, val in datapacker.structure.items()}
+    datapacker.set_values(SAMPLE)
+    assert legacy_pack(structure) == datapacker.pack()
+
+    run("legacy", lambda: legacy_pack(structure), n)
+    run("compiled", lambda: datapacker.set_values(SAMPLE) or datapacker.pack(), n)
+    # Further readers of the same generation reuse the already packed frame
+    run("snapshot", datapacker.pack, n)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+# Decodes a synthetic 1 hour onboard.log (20 Hz) with the bulk NumPy decoder
+# and with per-frame datapacker.unpack().
+# Run from the repository root: python bench/bench_decoder.py
+import math
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, ".")
+
+import datapacker
+from ground import decoder
+
+
+def write_log(path, seconds=3600, rate=20):
+    with open(path, "w") as f:
+        for n in range(seconds * rate):
+            t = n / rate
+            datapacker.set_values({
+                "time": 36000000 + int(t * 1000),
+                "bat_v": 4.1 - t / 7200,
+                "baro_bmp": 1013.25 - t / 10,
+                "temp_bmp": 20 + 5 * math.sin(t / 600),
+                "acc_z": 1 + 0.01 * math.sin(t),
+                "ahrs_z": 180 * math.sin(t / 60),
+            })
+            f.write(datapacker.pack())
+
+
+def main():
+    path = os.path.join(tempfile.mkdtemp(), "onboard.log")
+    write_log(path)
+    with open(path) as f:
+        lines = f.read().splitlines()
+
+    start = time.perf_counter()
+    columns = decoder.decode_log(path)
+    bulk = time.perf_counter() - start
+
+    start = time.perf_counter()
+    frames = [datapacker.unpack(line) for line in lines]
+    single = time.perf_counter() - start
+
+    assert len(columns["time"]) == len(frames)
+    assert abs(columns["baro_bmp"][-1] - frames[-1]["baro_bmp"]) < 1e-9
+    print(f"{len(lines)} frames")
+    print(f"unpack  {len(lines) / single:12.0f} frames/s")
+    print(f"bulk    {len(lines) / bulk:12.0f} frames/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+# Bytes per frame of plain vs keyframe + delta encoded binary frames, on a
+# synthetic flight (ascent, descent under parachute, noisy IMU) sampled at 1 Hz
+# like the onboard logger and GSM uplink.
+# Run from the repository root: python bench/bench_delta.py
+import math
+import random
+import sys
+
+sys.path.insert(0, ".")
+
+import datapacker
+import delta
+import framing
+
+
+def flight(seconds=3600):
+    random.seed(1)
+    for t in range(seconds):
+        alt = 1000 * math.sin(math.pi * min(t, 600) / 1200) if t < 600 else max(1000 - (t - 600) * 8, 0)
+        yield {
+            "time": 36000000 + t * 1000,
+            "bat_v": 4.1 - t / 7200 + random.gauss(0, 0.005),
+            "lat": 54.687157 + t * 1e-6,
+            "lon": 25.279652 + t * 2e-6,
+            "gps_sats": 9,
+            "gps_hdop": 1.2,
+            "gps_alt": 120 + alt,
+            "gsm_signal": 0.6,
+            "baro_bmp": 1013.25 - alt / 8.3 + random.gauss(0, 0.01),
+            "baro_bme": 1013.15 - alt / 8.3 + random.gauss(0, 0.01),
+            "baro_ms5611": 1013.3 - alt / 8.3 + random.gauss(0, 0.01),
+            "temp_bmp": 20 - alt / 150 + random.gauss(0, 0.02),
+            "temp_mpu": 23 - alt / 150 + random.gauss(0, 0.02),
+            "temp_bme": 20 - alt / 150 + random.gauss(0, 0.02),
+            "temp_ms5611": 20 - alt / 150 + random.gauss(0, 0.02),
+            "hum_bme": 40 + random.gauss(0, 0.1),
+            "acc_x": random.gauss(0, 0.05),
+            "acc_y": random.gauss(0, 0.05),
+            "acc_z": 1 + random.gauss(0, 0.05),
+            "gyro_x": random.gauss(0, 5),
+            "gyro_y": random.gauss(0, 5),
+            "gyro_z": random.gauss(0, 20),
+            "mag_x": int(random.gauss(120, 3)),
+            "mag_y": int(random.gauss(-330, 3)),
+            "mag_z": int(random.gauss(410, 3)),
+            "als": int(1200 + random.gauss(0, 20)),
+        }
+
+
+def main():
+    for profile in ("log-everything", "gsm-full", "radio-minimal"):
+        schema = datapacker.profiles[profile]
+        encoder = delta.DeltaEncoder(schema, keyframe_interval=30)
+        decoder = delta.DeltaDecoder(schema)
+        plain = framing.Framer()
+        framer = framing.Framer()
+        plain_bytes = delta_bytes = frames = 0
+        for sample in flight():
+            datapacker.set_values(sample)
+            frame = datapacker.snapshot(profile)[1]
+            seq = framer.seq
+            payload = encoder.encode(frame)
+            assert decoder.decode(payload, seq) == frame
+            plain_bytes += len(plain.frame(frame, schema.type_id))
+            delta_bytes += len(framer.frame(payload, schema.type_id | delta.DELTA_FLAG))
+            frames += 1
+        print(f"{profile:15s} plain {plain_bytes / frames:6.1f} B/frame  delta {delta_bytes / frames:6.1f} B/frame")
+
+
+if __name__ == "__main__":
+    main()
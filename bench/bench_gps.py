@@ -0,0 +1,117 @@
+# GPS parsing benchmark suite. Per supported sentence type: sentences/s through
+# update_sentence() and the per-character update(), and heap bytes allocated per
+# sentence. Then end to end through GPS.parse() replayed by nmea_replay at 9600 baud
+# with 32 byte UART chunks: sentences/s, and latency from a sentence being readable
+# to it reaching the parser (the GPS loop sleeps POLL_MS per wake), with and without
+# the GGA/RMC filter. Parses a captured NMEA file (--capture) or a synthetic hour
+# of 1 Hz output.
+# Run from the repository root: python bench/bench_gps.py
+import argparse
+import gc
+import sys
+import time
+
+sys.path.insert(0, ".")
+sys.path.insert(0, "bench")
+
+import nmea_replay  # before modules.gps, installs the virtual utime
+
+import datapacker
+from bench_nmea import synthesise
+from hardware import micropyGPS
+from modules import gps as gps_module
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None  # MicroPython, gc.mem_alloc() deltas instead
+
+
+def by_type(lines):
+    groups = {}
+    for line in lines:
+        groups.setdefault(line[1:6].decode(), []).append(line)
+    return groups
+
+
+def throughput(lines, per_char=False):
+    parser = micropyGPS.MicropyGPS(local_offset=3, location_formatting="dd")
+    start = time.perf_counter()
+    if per_char:
+        for line in lines:
+            for c in line:
+                parser.update(chr(c))
+    else:
+        for line in lines:
+            parser.update_sentence(line)
+    return len(lines) / (time.perf_counter() - start)
+
+
+def allocated_per_sentence(lines):
+    # Bytes allocated per update_sentence(); peak for tracemalloc, total for gc.mem_alloc
+    parser = micropyGPS.MicropyGPS(local_offset=3, location_formatting="dd")
+    parser.update_sentence(lines[0])  # first call may create the lazily set attributes
+    if tracemalloc is not None:
+        total = 0
+        tracemalloc.start()
+        for line in lines:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            parser.update_sentence(line)
+            total += tracemalloc.get_traced_memory()[1] - before
+        tracemalloc.stop()
+        return total / len(lines)
+    gc.collect()
+    gc.disable()
+    before = gc.mem_alloc()
+    for line in lines:
+        parser.update_sentence(line)
+    total = gc.mem_alloc() - before
+    gc.enable()
+    return total / len(lines)
+
+
+def replay(lines, sentences, cpu_scale):
+    uart = nmea_replay.FakeGPSUART(lines)
+    gps = gps_module.GPS(uart, datapacker)
+    gps.parser = micropyGPS.MicropyGPS(local_offset=3, location_formatting="dd", sentences=sentences)
+    run = nmea_replay.Replay(gps, uart, cpu_scale)
+
+    def step():
+        # One wake of GPS.loop()
+        gps.parse()
+        nmea_replay.clock.sleep_ms(gps_module.POLL_MS)
+    run.run(step, gps_module.POLL_MS)
+    return run
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--capture", help="NMEA capture, one sentence per line")
+    parser.add_argument("--cpu-scale", type=float, default=50,
+                        help="target CPU time per host CPU time for the replay latencies")
+    args = parser.parse_args()
+    if args.capture:
+        with open(args.capture, "rb") as f:
+            lines = [line + b"\n" for line in f.read().splitlines()]
+    else:
+        lines = synthesise()
+
+    print(f"{'sentence':>8} {'update_sentence':>16} {'per char':>10} {'heap/sentence':>14}")
+    for kind, group in sorted(by_type(lines).items()):
+        fast = throughput(group)
+        slow = throughput(group, per_char=True)
+        heap = allocated_per_sentence(group)
+        print(f"{kind:>8} {fast:>12.0f} s/s {slow:>6.0f} s/s {heap:>12.0f} B")
+
+    for name, sentences in (("all sentences", None), ("GGA/RMC only", gps_module.SENTENCES)):
+        run = replay(lines, sentences, args.cpu_scale)
+        print(f"GPS.parse replay, {name}: {run.sentences / run.cpu:.0f} sentences/s, "
+              f"{run.sentences}/{len(lines)} parsed in {nmea_replay.clock.us / 1e6:.0f} s, latency "
+              f"mean {sum(run.latencies_us) / len(run.latencies_us) / 1000:.1f} ms, "
+              f"p95 {run.latency_ms(0.95):.1f} ms, max {run.latency_ms(1):.1f} ms")
+        nmea_replay.clock.us = 0
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+# Frames/second through communication.gsm.GSM with one CIPSEND per frame vs
+# batched CIPSENDs (GSM.queue_frame/flush with batch_frames), against a fake
+# SIM800L UART and a local TCP stand-in server.
+# Run from the repository root: python bench/bench_gsm_batching.py
+import sys
+import time
+
+sys.path.insert(0, ".")
+sys.path.insert(0, "bench")
+
+import datapacker
+from communication import gsm
+from fake_sim800l import FakeSim800lUART, StandInServer
+
+
+def run(batch_frames, frames=60):
+    server = StandInServer()
+    uart = FakeSim800lUART('127.0.0.1', server.port)
+    # Batches close on batch_frames (or a full MAX_TCP_PAYLOAD) only, not on age
+    g = gsm.GSM(uart, datapacker, batch_frames=batch_frames, batch_ms=60000)
+    while not g.connected():
+        g.reconnect()
+        time.sleep(0.001)
+    cipsends = uart.cipsends
+
+    start = time.perf_counter()
+    for _ in range(frames):
+        g.queue_frame(g.next_frame())
+        if g.batch_due():
+            g.flush()
+    g.flush()
+    elapsed = time.perf_counter() - start
+
+    time.sleep(0.1)
+    assert server.received.count(b'\n') == frames
+    print(f"batch {batch_frames:3d}: {frames / elapsed:7.1f} frames/s, {uart.cipsends - cipsends} CIPSENDs")
+
+
+if __name__ == "__main__":
+    for n in (1, 5, 10, 20):
+        run(n)
@@ -0,0 +1,41 @@
+# Frames/second through sim800l.Modem with TCP (CIPSEND + SEND OK) vs UDP in quick
+# send mode (CIPSEND=<len> + DATA ACCEPT), one frame per send, against a fake
+# SIM800L UART and local stand-in TCP server / UDP receiver.
+# Run from the repository root: python bench/bench_gsm_udp.py
+import struct
+import sys
+import time
+
+sys.path.insert(0, ".")
+sys.path.insert(0, "bench")
+
+import datapacker
+from fake_sim800l import FakeSim800lUART, StandInServer, StandInUDPReceiver
+from hardware import sim800l
+
+
+def run(udp, frames=60):
+    receiver = StandInUDPReceiver() if udp else StandInServer()
+    uart = FakeSim800lUART('127.0.0.1', receiver.port, udp=udp)
+    modem = sim800l.Modem(uart=uart)
+    frame = datapacker.pack(profile='gsm-full').encode('utf-8')
+
+    start = time.perf_counter()
+    for seq in range(frames):
+        if udp:
+            modem.send_udp(struct.pack('>H', seq) + frame)
+        else:
+            modem.send_tcp(frame)
+    elapsed = time.perf_counter() - start
+
+    time.sleep(0.1)
+    if udp:
+        assert [struct.unpack('>H', d[:2])[0] for d in receiver.datagrams] == list(range(frames))
+    else:
+        assert receiver.received.count(b'\n') == frames
+    print(f"{'udp' if udp else 'tcp'}: {frames / elapsed:6.1f} frames/s")
+
+
+if __name__ == "__main__":
+    run(False)
+    run(True)
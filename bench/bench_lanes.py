@@ -0,0 +1,54 @@
+# Simulated 10 minutes of Radio433 at the default 2.4k air data rate with the FEC of
+# main.py: one radio-minimal frame as often as possible against the attitude /
+# environment lanes. Prints frames per second per profile.
+# Run from the repository root: python bench/bench_lanes.py
+import sys
+
+sys.path.insert(0, ".")
+
+import bitpacker
+import framing
+from communication import airtime, multirate
+from hardware.lora_e220_constants import AirDataRate
+
+SECONDS = 600
+FEC_K, FEC_DEPTH = 4, 4
+BYTE_MS = 10000 / 9600
+
+
+def frame_ms(length):
+    return length * BYTE_MS + airtime.time_on_air_ms(length, AirDataRate.AIR_DATA_RATE_010_24) + airtime.PACKET_GAP_MS
+
+
+def simulate(lanes):
+    scheduler = multirate.LaneScheduler(lanes)
+    start = now = multirate.ticks_ms()
+    end = start + SECONDS * 1000
+    data = 0
+    while now < end:
+        lane = scheduler.next(now)
+        if lane is None:
+            now += scheduler.wait_ms(now)
+            continue
+        payload = bitpacker.profiles[lane.profile].size
+        busy = frame_ms(framing.HEADER_SIZE + payload + framing.CRC_SIZE)
+        data += 1
+        if data % (FEC_K * FEC_DEPTH) == 0:
+            busy += FEC_DEPTH * frame_ms(framing.HEADER_SIZE + 5 + 2 + payload + framing.CRC_SIZE)
+        now += busy
+    return {lane.profile: lane.sent / SECONDS for lane in lanes}
+
+
+def main():
+    configs = [
+        ("monolithic", [multirate.Lane("radio-minimal")]),
+        ("lanes", [multirate.Lane("radio-attitude", 0, priority=1),
+                   multirate.Lane("radio-environment", 5000, priority=0)]),
+    ]
+    for name, lanes in configs:
+        rates = simulate(lanes)
+        print(f"{name}: " + ", ".join(f"{p} {r:.2f} frames/s" for p, r in rates.items()))
+
+
+if __name__ == "__main__":
+    main()
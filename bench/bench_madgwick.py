@@ -0,0 +1,136 @@
+# Madgwick filter: the matrix based algorithms.madgwickahrs.MadgwickAHRS against the
+# scalar algorithms.madgwick.Madgwick on a synthetic tumbling sensor at 100 Hz.
+# Asserts both compute the same step (largest quaternion component difference after
+# one update from the same state below STEP_TOLERANCE, the trajectories themselves drift
+# apart at rounding level because the normalised gradient step keeps flipping sign
+# around convergence) and prints updates per second and heap bytes allocated per update.
+# Run from the repository root: python bench/bench_madgwick.py
+import math
+import sys
+import time
+
+sys.path.insert(0, ".")
+
+from algorithms.madgwick import Madgwick
+from algorithms.madgwickahrs import MadgwickAHRS
+from algorithms.umatrix import matrix
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+SAMPLES = 5000
+DT = 0.01
+# Rounding differences only, the results are around 1e-15
+STEP_TOLERANCE = 1e-12
+
+
+def samples(n):
+    # Gyro in rad/s, accel in g, mag in gauss, with some noise-like wobble
+    data = []
+    for i in range(n):
+        t = i * DT
+        gyro = (0.5 * math.sin(t), 0.3 * math.cos(0.7 * t), 0.2 * math.sin(1.3 * t))
+        accel = (0.1 * math.sin(3 * t), 0.1 * math.cos(2 * t), 1 + 0.05 * math.sin(5 * t))
+        mag = (0.2 + 0.02 * math.cos(t), 0.05 * math.sin(t), -0.4)
+        data.append((gyro, accel, mag))
+    return data
+
+
+def reference(data, imu=False):
+    f = MadgwickAHRS(sampleperiod=DT)
+    out = []
+    for gyro, accel, mag in data:
+        if imu:
+            f.update_imu(matrix([list(gyro)]), matrix([list(accel)]))
+        else:
+            f.update(matrix([list(gyro)]), matrix([list(accel)]), matrix([[a] for a in mag]))
+        q = f.quaternion
+        out.append((q[0], q[1], q[2], q[3]))
+    return out
+
+
+def scalar(data, imu=False):
+    f = Madgwick()
+    out = []
+    for gyro, accel, mag in data:
+        if imu:
+            f.update_imu(*gyro, *accel, DT)
+        else:
+            f.update(*gyro, *accel, *mag, DT)
+        out.append((f.q0, f.q1, f.q2, f.q3))
+    return out
+
+
+def step_difference(data, imu=False):
+    ref = MadgwickAHRS(sampleperiod=DT)
+    fast = Madgwick()
+    worst = 0
+    for gyro, accel, mag in data:
+        q = ref.quaternion
+        fast.q0, fast.q1, fast.q2, fast.q3 = q[0], q[1], q[2], q[3]
+        if imu:
+            ref.update_imu(matrix([list(gyro)]), matrix([list(accel)]))
+            fast.update_imu(*gyro, *accel, DT)
+        else:
+            ref.update(matrix([list(gyro)]), matrix([list(accel)]), matrix([[a] for a in mag]))
+            fast.update(*gyro, *accel, *mag, DT)
+        q = ref.quaternion
+        worst = max(worst, abs(q[0] - fast.q0), abs(q[1] - fast.q1), abs(q[2] - fast.q2), abs(q[3] - fast.q3))
+    return worst
+
+
+def speed(run, data, imu):
+    start = time.perf_counter()
+    run(data, imu)
+    return len(data) / (time.perf_counter() - start)
+
+
+def updaters(imu):
+    # One update call per sample with the arguments prepared up front, so only the filter allocates
+    ref = MadgwickAHRS(sampleperiod=DT)
+    fast = Madgwick()
+    if imu:
+        return (lambda g, a, m: ref.update_imu(g, a),
+                lambda g, a, m: fast.update_imu(g[0], g[1], g[2], a[0], a[1], a[2], DT))
+    return (lambda g, a, m: ref.update(g, a, m),
+            lambda g, a, m: fast.update(g[0], g[1], g[2], a[0], a[1], a[2], m[0], m[1], m[2], DT))
+
+
+def allocated(update, data, matrices):
+    args = [(matrix([list(g)]), matrix([list(a)]), matrix([[x] for x in m])) if matrices else (g, a, m)
+            for g, a, m in data]
+    if tracemalloc is None:
+        import gc
+        gc.collect()
+        before = gc.mem_alloc()
+        for g, a, m in args:
+            update(g, a, m)
+        return (gc.mem_alloc() - before) / len(args)
+    # Peak within each update, what the heap has to find room for
+    total = 0
+    tracemalloc.start()
+    for g, a, m in args:
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        update(g, a, m)
+        total += tracemalloc.get_traced_memory()[1] - before
+    tracemalloc.stop()
+    return total / len(args)
+
+
+def main():
+    data = samples(SAMPLES)
+    for imu in (False, True):
+        name = "6-DOF" if imu else "9-DOF"
+        difference = step_difference(data, imu)
+        print(f"{name}: max quaternion difference per step {difference:.2e} over {SAMPLES} updates")
+        assert difference < STEP_TOLERANCE, f"{name} step differs from MadgwickAHRS"
+        heap = [allocated(update, data[:500], matrices) for update, matrices in zip(updaters(imu), (True, False))]
+        for label, run, b in (("MadgwickAHRS", reference, heap[0]), ("Madgwick", scalar, heap[1])):
+            print(f"  {label:>12}: {speed(run, data, imu):8.0f} updates/s, {b:6.0f} B allocated per update")
+
+
+if __name__ == "__main__":
+    main()
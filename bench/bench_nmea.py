@@ -0,0 +1,93 @@
+# NMEA parsing speed of MicropyGPS: the per-character update() path GPS.parse used to
+# take against the line-level update_sentence(), with and without the GGA/RMC
+# allowlist of modules.gps. Parses a captured NMEA file
+# (--capture) or a synthetic hour of 1 Hz GGA/GSA/GSV/RMC/VTG/GLL output.
+# Run from the repository root: python bench/bench_nmea.py
+import argparse
+import math
+import sys
+import time
+
+sys.path.insert(0, ".")
+
+from hardware import micropyGPS
+
+
+def sentence(body):
+    crc = 0
+    for c in body.encode():
+        crc ^= c
+    return f"${body}*{crc:02X}\r\n".encode()
+
+
+def _coord(value, digits):
+    degrees = int(abs(value))
+    return f"{degrees:0{digits}d}{(abs(value) - degrees) * 60:08.5f}"
+
+
+def synthesise(seconds=3600):
+    lines = []
+    for n in range(seconds):
+        h, m, s = (n // 3600 + 9) % 24, n // 60 % 60, n % 60
+        utc = f"{h:02d}{m:02d}{s:02d}.00"
+        lat = 54.6872 + 0.001 * math.sin(n / 300)
+        lon = 25.2797 + 0.001 * math.cos(n / 300)
+        alt = 120 + 900 * math.sin(min(n / 600, math.pi))
+        lat_s, lon_s = _coord(lat, 2), _coord(lon, 3)
+        lines.append(sentence(f"GPGGA,{utc},{lat_s},N,{lon_s},E,1,09,0.92,{alt:.1f},M,28.9,M,,"))
+        lines.append(sentence("GPGSA,A,3,02,05,12,13,15,18,20,25,29,,,,1.60,0.92,1.31"))
+        for i in range(3):
+            sats = ",".join(f"{4 * i + j + 2:02d},{40 + j},{(90 * j + n) % 360:03d},{30 + j}" for j in range(4))
+            lines.append(sentence(f"GPGSV,3,{i + 1},12,{sats}"))
+        lines.append(sentence(f"GPRMC,{utc},A,{lat_s},N,{lon_s},E,0.52,78.3,181026,,,A"))
+        lines.append(sentence("GPVTG,78.3,T,,M,0.52,N,0.96,K,A"))
+        lines.append(sentence(f"GPGLL,{lat_s},N,{lon_s},E,{utc},A,A"))
+    return lines
+
+
+def per_char(lines):
+    parser = micropyGPS.MicropyGPS(local_offset=3, location_formatting="dd")
+    for line in lines:
+        for c in line:
+            parser.update(chr(c))
+    return parser
+
+
+def per_line(lines, sentences=None):
+    parser = micropyGPS.MicropyGPS(local_offset=3, location_formatting="dd", sentences=sentences)
+    for line in lines:
+        parser.update_sentence(line)
+    return parser
+
+
+def filtered(lines):
+    return per_line(lines, ("GGA", "RMC"))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--capture", help="NMEA capture, one sentence per line")
+    args = parser.parse_args()
+    if args.capture:
+        with open(args.capture, "rb") as f:
+            lines = [line + b"\n" for line in f.read().splitlines()]
+    else:
+        lines = synthesise()
+
+    results = []
+    for name, run in (("update() per char", per_char), ("update_sentence()", per_line),
+                      ("GGA/RMC only", filtered)):
+        start = time.perf_counter()
+        gps = run(lines)
+        elapsed = time.perf_counter() - start
+        results.append(gps)
+        print(f"{name:>18}: {len(lines) / elapsed:8.0f} sentences/s, {gps.parsed_sentences} parsed, "
+              f"{gps.crc_fails} CRC failures")
+
+    fields = ("latitude", "longitude", "altitude", "satellites_in_use", "hdop", "timestamp", "date", "speed")
+    same = all(getattr(results[0], f) == getattr(results[1], f) for f in fields)
+    print("same final state" if same else "final state differs!")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+# Replays radio traffic through a fake serial port into ground.radio.RadioReceiver.
+# The traffic is either a raw capture of the ground E220's serial output (--capture)
+# or synthesised: radio433 text frames, binary frames and bit-packed binary frames,
+# each followed by an RSSI byte, with a share of packets corrupted or cut short.
+# Synthesised traffic is checked: exactly the intact frames come out, in order.
+# Run from the repository root: python bench/bench_radio_receiver.py
+import argparse
+import math
+import random
+import sys
+import time
+
+sys.path.insert(0, ".")
+
+import bitpacker
+import datapacker
+import framing
+from ground import radio
+
+
+class FakeSerial:
+    # Serves the capture in random sized chunks, like a USB serial adapter would
+    def __init__(self, data, max_chunk=64, seed=1):
+        self.data = data
+        self.pos = 0
+        self.max_chunk = max_chunk
+        self.random = random.Random(seed)
+        self.reads = 0
+
+    @property
+    def in_waiting(self):
+        return min(self.random.randint(0, self.max_chunk), len(self.data) - self.pos)
+
+    def read(self, n=1):
+        self.reads += 1
+        data = self.data[self.pos:self.pos + n]
+        self.pos += len(data)
+        return data
+
+
+def synthesise(frames, corrupt=0.02, seed=1):
+    rnd = random.Random(seed)
+    framer = framing.Framer()
+    profile = "radio-minimal"
+    schema = datapacker.profiles[profile]
+    out = bytearray()
+    intact = []  # (profile, packed frame, RSSI dBm) the receiver has to deliver
+    for n in range(frames):
+        t = n / 2
+        datapacker.set_values({
+            "time": 36000000 + n * 500,
+            "bat_v": 4.1 - t / 7200,
+            "baro_bmp": 101325 - t * 2,
+            "temp_bmp": 20 + 5 * math.sin(t / 600),
+            "ahrs_z": 180 * math.sin(t / 60),
+        })
+        kind = n % 3
+        if kind == 0:
+            packet = (datapacker.pack(profile=profile).replace("\n", "") + "@").encode()
+        elif kind == 1:
+            packet = framer.frame(datapacker.snapshot(profile)[1], schema.type_id)
+        else:
+            packet = framer.frame(bitpacker.profiles[profile].pack(datapacker.snapshot(profile)[1]),
+                                  schema.type_id | bitpacker.BITPACK_FLAG)
+        packet = bytearray(packet)
+        rssi = rnd.randint(256 - 110, 256 - 40)  # RSSI byte, -110..-40 dBm
+        if rnd.random() < corrupt:
+            if rnd.random() < 0.5:
+                packet[rnd.randrange(len(packet))] ^= 0xFF
+            else:
+                del packet[rnd.randrange(len(packet)):]
+        else:
+            intact.append((profile, datapacker.snapshot(profile)[1], radio.rssi_dbm(rssi)))
+        out += packet
+        out.append(rssi)
+    return bytes(out), intact
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--capture", help="raw serial capture of the ground E220 (RSSI enabled)")
+    parser.add_argument("--frames", type=int, default=30000)
+    parser.add_argument("--corrupt", type=float, default=0.02, help="share of corrupted synthetic packets")
+    args = parser.parse_args()
+
+    if args.capture:
+        with open(args.capture, "rb") as f:
+            data, intact = f.read(), None
+    else:
+        data, intact = synthesise(args.frames, args.corrupt)
+
+    port = FakeSerial(data)
+    receiver = radio.RadioReceiver(port)
+    received = []
+    start = time.perf_counter()
+    while port.pos < len(data):
+        received.extend(receiver.poll())
+    elapsed = time.perf_counter() - start
+
+    rssi = [r for _, _, r in received]
+    print(f"{len(data)} bytes in {port.reads} reads, {elapsed:.2f} s "
+          f"({len(received) / elapsed:.0f} frames/s, {len(data) / elapsed / 1e6:.1f} MB/s)")
+    print(f"decoded {len(received)} frames" + (f" of {len(intact)} intact" if intact is not None else "") +
+          f", {receiver.errors} errors, {receiver.skipped} bytes skipped, "
+          f"RSSI {min(rssi, default=0)}..{max(rssi, default=0)} dBm")
+
+    if intact is not None:
+        assert [(schema.name, raw, rssi) for schema, raw, rssi in received] == intact
+
+
+if __name__ == "__main__":
+    main()
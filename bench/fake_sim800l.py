@@ -0,0 +1,131 @@
+# Minimal SIM800L stand-in for host side benchmarks. Implements the UART calls
+# used by hardware.sim800l.Modem (write/flush/read/readline/any), answers the
+# bearer and connection setup of communication.gsm.GSM, and forwards
+# the payload of every CIPSEND to a real local TCP server (or UDP receiver when
+# udp=True, quick send mode by default) with modem-like delays.
+import socket
+import threading
+import time
+
+
+class FakeSim800lUART:
+    def __init__(self, host, port, prompt_delay=0.03, send_delay=0.15, udp=False, accept_delay=0.02):
+        self.udp = udp
+        self.accept_delay = accept_delay
+        self.expected = None
+        if udp:
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.sock.connect((host, port))
+        else:
+            self.sock = socket.create_connection((host, port))
+        self.prompt_delay = prompt_delay
+        self.send_delay = send_delay
+        self.pending = []  # (ready_at, bytes)
+        self.payload = None
+        self.cipsends = 0
+        # Quick send mode (AT+CIPQSEND=1), CIPSEND=<n> answers DATA ACCEPT instead of SEND OK
+        self.quick = udp
+
+    def _reply(self, delay, data):
+        self.pending.append((time.monotonic() + delay, data))
+
+    def write(self, data):
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        if self.payload is not None and self.expected is not None:
+            self.payload.extend(data)
+            if len(self.payload) >= self.expected:
+                self.sock.sendall(self.payload)
+                if self.quick:
+                    self._reply(self.accept_delay, b'\r\nDATA ACCEPT:%d\r\n' % len(self.payload))
+                else:
+                    self._reply(self.send_delay, b'\r\nSEND OK\r\n')
+                self.payload = None
+                self.expected = None
+                self.cipsends += 1
+        elif self.payload is not None:
+            if data.endswith(b'\x1a'):
+                self.payload.extend(data[:-1])
+                self.sock.sendall(self.payload)
+                self.payload = None
+                self.cipsends += 1
+                self._reply(self.send_delay, b'\r\nSEND OK\r\n')
+            else:
+                self.payload.extend(data)
+        elif data.startswith(b'AT+CIPSEND'):
+            self.payload = bytearray()
+            if data.startswith(b'AT+CIPSEND='):
+                self.expected = int(data[11:].strip())
+            self._reply(self.prompt_delay, b'> ')
+        elif data.startswith(b'AT+CIPQSEND='):
+            self.quick = data[12:13] == b'1'
+            self._reply(0.01, data.rstrip() + b'\r\r\nOK\r\n')
+        elif data.startswith(b'AT+SAPBR=2,1'):
+            self._reply(0.01, data.rstrip() + b'\r\r\n+SAPBR: 1,1,"10.64.12.7"\r\n\r\nOK\r\n')
+        elif data.startswith(b'AT+CIPSTART'):
+            self._reply(0.01, data.rstrip() + b'\r\r\nOK\r\n')
+            self._reply(self.send_delay, b'\r\nCONNECT OK\r\n')
+        elif data.startswith(b'AT+CIPCLOSE'):
+            self._reply(0.01, data.rstrip() + b'\r\r\nCLOSE OK\r\n')
+        elif data.startswith(b'AT'):
+            self._reply(0.01, data.rstrip() + b'\r\r\nOK\r\n')
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def _ready(self):
+        now = time.monotonic()
+        out = b''
+        while self.pending and self.pending[0][0] <= now:
+            out += self.pending.pop(0)[1]
+        return out
+
+    def read(self, n=None):
+        data = self._ready()
+        return data or None
+
+    def readline(self):
+        data = self._ready()
+        if not data:
+            return None
+        line, sep, rest = data.partition(b'\n')
+        if rest:
+            self.pending.insert(0, (0, rest))
+        return line + sep
+
+    def any(self):
+        return len(self.pending)
+
+
+class StandInServer:
+    # Local TCP server counting received bytes and newline or delimiter separated frames
+    def __init__(self):
+        self.server = socket.socket()
+        self.server.bind(('127.0.0.1', 0))
+        self.server.listen(1)
+        self.port = self.server.getsockname()[1]
+        self.received = bytearray()
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    def _serve(self):
+        conn, _ = self.server.accept()
+        while True:
+            data = conn.recv(65536)
+            if not data:
+                break
+            self.received.extend(data)
+
+
+class StandInUDPReceiver:
+    # Local UDP receiver keeping every datagram
+    def __init__(self):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(('127.0.0.1', 0))
+        self.port = self.sock.getsockname()[1]
+        self.datagrams = []
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    def _serve(self):
+        while True:
+            self.datagrams.append(self.sock.recv(65536))
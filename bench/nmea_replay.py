@@ -0,0 +1,182 @@
+# Host side replay harness for modules.gps: feeds recorded NMEA into GPS through a
+# fake UART on a virtual clock, with the byte timing of a 9600 baud receiver that
+# outputs one burst of sentences per fix and a UART driver that hands bytes over
+# in chunks (FIFO threshold) or once the line goes idle.
+#
+# Importing this module installs the virtual clock as `utime`, so import it before
+# modules.gps.
+import sys
+import time
+import types
+
+
+class VirtualClock:
+    # Time only moves on sleep_ms()/sleep_us() and advance()
+    def __init__(self):
+        self.us = 0
+
+    def ticks_us(self):
+        return self.us
+
+    def ticks_ms(self):
+        return self.us // 1000
+
+    @staticmethod
+    def ticks_diff(a, b):
+        return a - b
+
+    @staticmethod
+    def ticks_add(a, b):
+        return a + b
+
+    def sleep_us(self, us):
+        self.us += int(us)
+
+    def sleep_ms(self, ms):
+        self.us += int(ms * 1000)
+
+    def advance(self, seconds):
+        self.us += int(seconds * 1e6)
+
+
+clock = VirtualClock()
+utime = types.ModuleType("utime")
+for _name in ("ticks_us", "ticks_ms", "ticks_diff", "ticks_add", "sleep_us", "sleep_ms"):
+    setattr(utime, _name, getattr(clock, _name))
+sys.modules["utime"] = utime
+
+
+def epochs(lines, first=None):
+    # Groups sentences into the bursts a receiver sends per fix, each starting with
+    # the sentence type the recording starts with (GGA for most receivers)
+    groups = []
+    for line in lines:
+        kind = line[3:6]
+        if first is None:
+            first = kind
+        if kind == first or not groups:
+            groups.append([])
+        groups[-1].append(line)
+    return groups
+
+
+class FakeGPSUART:
+    # The part of machine.UART the GPS code uses (any, read, readinto, readline)
+    def __init__(self, lines, rate_hz=1, baud=9600, chunk=32, idle_chars=2, start_ms=100):
+        byte_us = 10e6 / baud  # 8N1
+        data = bytearray()
+        visible = []  # per byte: virtual us at which the driver hands it over
+        self.line_ends = []  # (offset after the line, us the whole line is readable)
+        for n, burst in enumerate(epochs(lines)):
+            begin = len(data)
+            t0 = start_ms * 1000 + n * 1e6 / rate_hz
+            for line in burst:
+                data.extend(line)
+            arrival = [t0 + (i + 1) * byte_us for i in range(len(data) - begin)]
+            idle = arrival[-1] + idle_chars * byte_us
+            for i in range(len(arrival)):
+                end = (i // chunk + 1) * chunk - 1
+                visible.append(arrival[end] if end < len(arrival) else idle)
+            offset = begin
+            for line in burst:
+                offset += len(line)
+                self.line_ends.append((offset, visible[offset - 1]))
+        self.data = bytes(data)
+        self.visible = visible
+        self.pos = 0
+        self.reads = 0
+
+    def available(self):
+        # Bytes handed over by now (binary search over the visible times)
+        lo, hi, now = self.pos, len(self.data), clock.us
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.visible[mid] <= now:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def done(self):
+        return self.pos >= len(self.data)
+
+    def next_arrival_us(self):
+        return self.visible[self.pos] if not self.done() else None
+
+    def any(self):
+        return self.available() - self.pos
+
+    def read(self, n=None):
+        end = self.available()
+        if n is not None:
+            end = min(end, self.pos + n)
+        if end == self.pos:
+            return None
+        self.reads += 1
+        data = self.data[self.pos:end]
+        self.pos = end
+        return data
+
+    def readinto(self, buf, n=None):
+        data = self.read(len(buf) if n is None else min(n, len(buf)))
+        if data is None:
+            return None
+        buf[:len(data)] = data
+        return len(data)
+
+    def readline(self):
+        # machine.UART.readline() with timeout 0: up to the newline, or whatever is there
+        end = self.available()
+        if end == self.pos:
+            return None
+        nl = self.data.find(b"\n", self.pos, end)
+        return self.read((nl + 1 if nl >= 0 else end) - self.pos)
+
+
+class Replay:
+    # Runs `step` (one wake of the GPS loop) until the recording is consumed, charging
+    # the host CPU time of every step times cpu_scale to the virtual clock, and records
+    # when each sentence reached the parser relative to when it was readable
+    def __init__(self, gps, uart, cpu_scale=1.0):
+        self.gps = gps
+        self.uart = uart
+        self.cpu_scale = cpu_scale
+        self.latencies_us = []
+        self.sentences = 0
+        self.cpu = 0.0
+        self._next_line = 0
+
+        update = gps.parser.update_sentence
+
+        def traced(line):
+            self._seen(line)
+            return update(line)
+        gps.parser.update_sentence = traced
+
+    def _seen(self, line):
+        # Lines reach the parser in order, match on where this one ends in the recording
+        ends = self.uart.line_ends
+        while self._next_line < len(ends):
+            offset, readable = ends[self._next_line]
+            self._next_line += 1
+            if self.uart.data[offset - len(line):offset] == line:
+                self.sentences += 1
+                self.latencies_us.append(clock.us - readable)
+                return
+
+    def run(self, step, period_ms):
+        # step sleeps period_ms itself, idle wakes are skipped in whole periods to keep the phase
+        period_us = period_ms * 1000
+        while not self.uart.done():
+            start = time.perf_counter()
+            step()
+            elapsed = time.perf_counter() - start
+            self.cpu += elapsed
+            clock.advance(elapsed * self.cpu_scale)
+            if not self.uart.any() and not self.uart.done():
+                clock.us += max(self.uart.next_arrival_us() - clock.us, 0) // period_us * period_us
+        return self
+
+    def latency_ms(self, quantile):
+        values = sorted(self.latencies_us)
+        return values[min(int(quantile * len(values)), len(values) - 1)] / 1000 if values else 0
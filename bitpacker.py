@@ -0,0 +1,74 @@
+import math
+import struct
+
+import datapacker
+
+# Bit-packed encoding of datapacker frames. Every field is stored as
+# (value - min) in just enough bits for the declared min/max of the field at the
+# resolution of its multiplier, MSB first, with the last byte zero padded.
+# Values outside the declared range saturate at its ends.
+#
+# Binary frames carrying this encoding use the profile type id with BITPACK_FLAG set.
+
+BITPACK_FLAG = 0x40
+
+
+def _bit_width(n):
+    # Bits needed for 0..n, at least one. MicroPython ints have no bit_length()
+    bits = 0
+    while n:
+        n >>= 1
+        bits += 1
+    return max(bits, 1)
+
+
+class BitSchema:
+    def __init__(self, schema):
+        self.schema = schema
+
+        lows = []
+        highs = []
+        bits = []
+        for n in range(len(schema.fields)):
+            field = datapacker.structure[schema.fields[n]]
+            lo = max(math.floor(field["min"] * schema.multipliers[n]), schema.mins[n])
+            hi = min(math.ceil(field["max"] * schema.multipliers[n]), schema.maxs[n])
+            lows.append(lo)
+            highs.append(hi)
+            bits.append(_bit_width(hi - lo))
+
+        self.lows = tuple(lows)
+        self.highs = tuple(highs)
+        self.bits = tuple(bits)
+        self.masks = tuple([(1 << i) - 1 for i in bits])
+        self.total_bits = sum(bits)
+        self.size = (self.total_bits + 7) // 8
+        self._pad = self.size * 8 - self.total_bits
+
+    def pack(self, frame):
+        # Packed schema frame -> bit-packed bytes
+        lows = self.lows
+        highs = self.highs
+        bits = self.bits
+        acc = 0
+        n = 0
+        for v in struct.unpack(self.schema.fmt, frame):
+            if v < lows[n]:
+                v = lows[n]
+            elif v > highs[n]:
+                v = highs[n]
+            acc = (acc << bits[n]) | (v - lows[n])
+            n += 1
+        return (acc << self._pad).to_bytes(self.size, 'big')
+
+    def unpack(self, data):
+        # Bit-packed bytes -> packed schema frame
+        acc = int.from_bytes(data, 'big') >> self._pad
+        out = [0] * len(self.bits)
+        for n in range(len(out) - 1, -1, -1):
+            out[n] = (acc & self.masks[n]) + self.lows[n]
+            acc >>= self.bits[n]
+        return struct.pack(self.schema.fmt, *out)
+
+
+profiles = {i: BitSchema(datapacker.profiles[i]) for i in datapacker.profiles}
@@ -0,0 +1,105 @@
+import math
+
+from compat import ticks_ms, ticks_add, ticks_diff
+from hardware.lora_e220_constants import AirDataRate, SubPacketSetting, UARTBaudRate
+
+# LoRa time on air for the E220 (LLCC68) in transparent mode. Ebyte doesn't publish
+# which spreading factor / bandwidth each air data rate uses, these are the closest
+# LLCC68 settings at or below the nominal rate (coding rate 4/5, explicit header, CRC
+# on, 8 symbol preamble), so the estimate errs on the long side.
+LORA_SETTINGS = {  # air data rate -> (spreading factor, bandwidth in Hz)
+    AirDataRate.AIR_DATA_RATE_000_24: (9, 125000),
+    AirDataRate.AIR_DATA_RATE_001_24: (9, 125000),
+    AirDataRate.AIR_DATA_RATE_010_24: (9, 125000),
+    AirDataRate.AIR_DATA_RATE_011_48: (9, 250000),
+    AirDataRate.AIR_DATA_RATE_100_96: (9, 500000),
+    AirDataRate.AIR_DATA_RATE_101_192: (8, 500000),
+    AirDataRate.AIR_DATA_RATE_110_384: (6, 500000),
+    AirDataRate.AIR_DATA_RATE_111_625: (5, 500000),
+}
+PREAMBLE_SYMBOLS = 8
+
+SUB_PACKET_SIZES = {
+    SubPacketSetting.SPS_200_00: 200,
+    SubPacketSetting.SPS_128_01: 128,
+    SubPacketSetting.SPS_064_10: 64,
+    SubPacketSetting.SPS_032_11: 32,
+}
+
+UART_BAUD_RATES = {
+    UARTBaudRate.BPS_1200: 1200,
+    UARTBaudRate.BPS_2400: 2400,
+    UARTBaudRate.BPS_4800: 4800,
+    UARTBaudRate.BPS_9600: 9600,
+    UARTBaudRate.BPS_19200: 19200,
+    UARTBaudRate.BPS_38400: 38400,
+    UARTBaudRate.BPS_57600: 57600,
+    UARTBaudRate.BPS_115200: 115200,
+}
+
+# Time between two packets the module needs to switch around, in ms
+PACKET_GAP_MS = 5
+
+# 433.05 - 434.79 MHz in the EU (ERC 70-03 band h1.4)
+DUTY_CYCLE_EU_433 = 0.1
+
+
+def packet_time_on_air_ms(length, sf, bw):
+    # Semtech AN1200.13 with CR 4/5, explicit header and CRC
+    symbol = (1 << sf) / bw * 1000
+    low_rate = 1 if symbol > 16 else 0
+    payload_symbols = 8 + max(math.ceil((8 * length - 4 * sf + 28 + 16) / (4 * (sf - 2 * low_rate))) * 5, 0)
+    return (PREAMBLE_SYMBOLS + 4.25 + payload_symbols) * symbol
+
+
+def time_on_air_ms(length, air_data_rate=AirDataRate.AIR_DATA_RATE_010_24, sub_packet=SubPacketSetting.SPS_200_00):
+    # The module splits anything longer than a sub-packet into several LoRa packets
+    sf, bw = LORA_SETTINGS[air_data_rate]
+    size = SUB_PACKET_SIZES[sub_packet]
+    full, rest = divmod(length, size)
+    total = full * packet_time_on_air_ms(size, sf, bw)
+    if rest:
+        total += packet_time_on_air_ms(rest, sf, bw)
+    return total + (full + (1 if rest else 0) - 1) * PACKET_GAP_MS
+
+
+class AirtimeScheduler:
+    # Decides when the next frame may be written to the E220, from the time the previous
+    # ones occupy the UART and the air and the allowed duty cycle
+    def __init__(self, configuration, duty_cycle=1.0):
+        self.air_data_rate = configuration.SPED.airDataRate
+        self.sub_packet = configuration.OPTION.subPacketSetting
+        self.byte_ms = 10000 / UART_BAUD_RATES[configuration.SPED.uartBaudRate]  # 8N1
+        self.duty_cycle = duty_cycle
+        self.ready_at = ticks_ms()
+        self._toa = {}  # frame length -> ms on air, frames mostly have the same length
+        self.frames = 0
+        self.airtime_ms = 0
+
+    def time_on_air_ms(self, length):
+        toa = self._toa.get(length)
+        if toa is None:
+            toa = self._toa[length] = time_on_air_ms(length, self.air_data_rate, self.sub_packet)
+        return toa
+
+    def wait_ms(self):
+        # How long until the next frame may be written, 0 if now
+        return max(ticks_diff(self.ready_at, ticks_ms()), 0)
+
+    def sent(self, length):
+        # Book a frame of `length` bytes written just now. The module starts transmitting
+        # once the UART goes idle, and with a duty cycle limit stays silent for
+        # toa * (1 / duty_cycle - 1) afterwards.
+        toa = self.time_on_air_ms(length)
+        busy = length * self.byte_ms + toa + PACKET_GAP_MS
+        if self.duty_cycle < 1:
+            busy += toa * (1 / self.duty_cycle - 1)
+        self.ready_at = ticks_add(ticks_ms(), math.ceil(busy))
+        self.frames += 1
+        self.airtime_ms += toa
+
+    def completed(self, airtime_ms):
+        # The module reported (AUX) the frame sent just now, after airtime_ms on air. Replaces
+        # the estimate booked by sent(), only the duty cycle off time is left to wait.
+        off = airtime_ms * (1 / self.duty_cycle - 1) if self.duty_cycle < 1 else 0
+        self.ready_at = ticks_add(ticks_ms(), math.ceil(off))
@@ -0,0 +1,101 @@
+import struct
+
+# Drain order of queued frames
+POLICY_OLDEST_FIRST = 'oldest'
+POLICY_NEWEST_FIRST = 'newest'
+
+_RECORD_HEADER = '>IH'  # seq, length
+_RECORD_HEADER_SIZE = 6
+_INDEX = '>III'  # head, count, next seq
+
+
+class FrameQueue:
+    # Bounded store-and-forward ring of unsent frames on flash.
+    # `path` holds `slots` fixed size records of | seq (4) | length (2) | frame |, so flash use
+    # is capped at slots * slot_size bytes, and `path`.idx holds the head, count and next
+    # sequence number so the queue survives a reset. RAM use doesn't grow with the queue.
+    # When full, the oldest frame is overwritten.
+    def __init__(self, path='gsm_queue.bin', slots=64, slot_size=1472, policy=POLICY_OLDEST_FIRST):
+        # The default slot_size fits a full GSM batch (MAX_TCP_PAYLOAD) plus the record header
+        self.path = path
+        self.index_path = path + '.idx'
+        self.slots = slots
+        self.slot_size = slot_size
+        self.policy = policy
+
+        self.head = 0
+        self.count = 0
+        self.seq = 0
+        self.dropped = 0
+
+        try:
+            with open(self.index_path, 'rb') as f:
+                self.head, self.count, self.seq = struct.unpack(_INDEX, f.read())
+            with open(self.path, 'rb') as f:
+                f.seek(0, 2)
+                if f.tell() != slots * slot_size or self.head >= slots or self.count > slots:
+                    raise ValueError('Queue file does not match its configuration')
+        except (OSError, ValueError, struct.error):
+            self.head = 0
+            self.count = 0
+            self._create()
+
+    def _create(self):
+        empty = bytes(self.slot_size)
+        with open(self.path, 'wb') as f:
+            for _ in range(self.slots):
+                f.write(empty)
+        self._save_index()
+
+    def _save_index(self):
+        with open(self.index_path, 'wb') as f:
+            f.write(struct.pack(_INDEX, self.head, self.count, self.seq))
+
+    def __len__(self):
+        return self.count
+
+    def push(self, frame):
+        n = len(frame)
+        if n > self.slot_size - _RECORD_HEADER_SIZE:
+            raise Exception(f'Frame too big for the queue ({n} bytes)')
+
+        if self.count == self.slots:
+            self.head = (self.head + 1) % self.slots
+            self.count -= 1
+            self.dropped += 1
+
+        slot = (self.head + self.count) % self.slots
+        with open(self.path, 'r+b') as f:
+            f.seek(slot * self.slot_size)
+            f.write(struct.pack(_RECORD_HEADER, self.seq, n))
+            f.write(frame)
+
+        self.seq = (self.seq + 1) & 0xFFFFFFFF
+        self.count += 1
+        self._save_index()
+
+    def peek(self, max_frames=1, max_bytes=None):
+        # Up to max_frames (seq, frame) in drain order without removing them, call
+        # commit() with the number actually sent
+        frames = []
+        size = 0
+        with open(self.path, 'rb') as f:
+            for i in range(min(max_frames, self.count)):
+                if self.policy == POLICY_NEWEST_FIRST:
+                    slot = (self.head + self.count - 1 - i) % self.slots
+                else:
+                    slot = (self.head + i) % self.slots
+                f.seek(slot * self.slot_size)
+                seq, n = struct.unpack(_RECORD_HEADER, f.read(_RECORD_HEADER_SIZE))
+                if frames and max_bytes is not None and size + n > max_bytes:
+                    break
+                frames.append((seq, f.read(n)))
+                size += n
+        return frames
+
+    def commit(self, n):
+        n = min(n, self.count)
+        if self.policy != POLICY_NEWEST_FIRST:
+            self.head = (self.head + n) % self.slots
+        self.count -= n
+        self._save_index()
@@ -1,64 +1,253 @@
+import struct
+
+import delta
+import framing
+from compat import ticks_ms, ticks_add, ticks_diff, sleep_ms
 from hardware import sim800l
 from log import Logger
 
-import utime
-
 GSM_APN = 'internet.tele2.lt'
 
 DOWNSTREAM_IP = '130.61.136.101'
 DOWNSTREAM_PORT = 8019
 
+# Largest payload a single AT+CIPSEND accepts on the SIM800L
+MAX_TCP_PAYLOAD = 1460
+
+TRANSPORT_TCP = 'tcp'
+# Every UDP datagram starts with a 16 bit sequence number so the ground can detect loss
+TRANSPORT_UDP = 'udp'
+UDP_HEADER_SIZE = 2
+
+# Connection states, tracked from command results and URCs
+STATE_DOWN = 0  # no GPRS bearer / IP
+STATE_IP = 1  # have an IP, no downstream connection
+STATE_CONNECTED = 2  # TCP connection (or UDP socket) to downstream open
+
+# Reconnect backoff in ms, doubled on every failed attempt
+BACKOFF_MIN_MS = 1000
+BACKOFF_MAX_MS = 60000
+
 
 class GSM:
-    def __init__(self, uart, datapacker):
+    def __init__(self, uart, datapacker, mode=framing.MODE_TEXT, profile='log-everything',
+                 keyframe_interval=None, batch_frames=1, batch_ms=0, sample_ms=0, queue=None, drain_batches=1,
+                 transport=TRANSPORT_TCP):
         self.uart = uart
         self.datapacker = datapacker
+        self.profile = profile
+        self.framer = framing.Framer() if mode == framing.MODE_BINARY else None
+        # Keyframe + delta encoding, binary mode only
+        self.delta = None
+        if self.framer is not None and keyframe_interval:
+            self.delta = delta.DeltaEncoder(datapacker.profiles[profile], keyframe_interval)
+
+        self.transport = transport
+        self.udp_seq = 0
+        self.max_payload = MAX_TCP_PAYLOAD - UDP_HEADER_SIZE if transport == TRANSPORT_UDP else MAX_TCP_PAYLOAD
+
+        # Frames are collected and sent in one CIPSEND once batch_frames are queued, the oldest
+        # queued frame is batch_ms old or the next one would not fit into max_payload
+        self.batch_frames = batch_frames
+        self.batch_ms = batch_ms
+        self.sample_ms = sample_ms
+        self.batch = bytearray()
+        self.batch_count = 0
+        self.batch_started = 0
+
+        # Optional communication.frame_queue.FrameQueue keeping batches that could not be sent,
+        # up to drain_batches of them are resent per loop iteration once the link is back
+        self.queue = queue
+        self.drain_batches = drain_batches
+
         self.log = Logger('GSM')
         uart.write(b"\x1a")
         uart.read()
         self.modem = sim800l.Modem(uart=self.uart)
 
+        self.state = STATE_DOWN
+        self.backoff = BACKOFF_MIN_MS
+        self.retry_at = ticks_ms()
+        self.connecting = None  # sim800l.ATTask bringing the link up
+        self.modem.engine.on_urc('CONNECT OK', self.on_connected)
+        self.modem.engine.on_urc('ALREADY CONNECT', self.on_connected)
+        self.modem.engine.on_urc('CONNECT FAIL', self.on_closed)
+        self.modem.engine.on_urc('CLOSED', self.on_closed)
+        self.modem.engine.on_urc('+PDP: DEACT', self.on_pdp_deact)
+        self.modem.engine.on_urc('PDP DEACT', self.on_pdp_deact)
+
         self.modem.initialize()
         self.log.log('Modem initialized', 'green')
         self.modem.connect(GSM_APN)
+        self.state = STATE_IP
         self.log.log('Modem connected to APN', 'green')
 
+    def on_connected(self, line):
+        self.state = STATE_CONNECTED
+
+    def on_closed(self, line):
+        if self.state == STATE_CONNECTED:
+            self.log.log('Downstream connection closed', 'red')
+        self.state = min(self.state, STATE_IP)
+
+    def on_pdp_deact(self, line):
+        self.log.log('GPRS context deactivated', 'red')
+        self.state = STATE_DOWN
+
     def set_signal_strength(self):
         self.datapacker.set_value(self.modem.get_signal_strength(), "gsm_signal")
 
+    def next_frame(self):
+        if self.framer is not None:
+            payload = self.datapacker.snapshot(self.profile)[1]
+            frame_type = self.datapacker.profiles[self.profile].type_id
+            if self.delta is not None:
+                payload = self.encode(payload)
+                frame_type |= delta.DELTA_FLAG
+            return self.framer.frame(payload, frame_type)
+        return self.datapacker.pack(profile=self.profile)
+
+    def encode(self, payload):
+        if self.queue is None:
+            return self.delta.encode(payload)
+        # Any batch may end up in the queue and be resent after newer ones, so each one starts
+        # with a keyframe and decodes on its own
+        if not self.batch_count:
+            self.delta.reset()
+        encoded = self.delta.encode(payload)
+        if self.batch_count and \
+                len(self.batch) + framing.HEADER_SIZE + len(encoded) + framing.CRC_SIZE > self.max_payload:
+            # queue_frame() would start a new batch with this frame, do it here so it is the keyframe
+            self.flush()
+            self.delta.reset()
+            encoded = self.delta.encode(payload)
+        return encoded
+
+    def queue_frame(self, frame):
+        if isinstance(frame, str):
+            frame = frame.encode('utf-8')
+        if self.batch_count and len(self.batch) + len(frame) > self.max_payload:
+            self.flush()
+        if not self.batch_count:
+            self.batch_started = ticks_ms()
+        self.batch.extend(frame)
+        self.batch_count += 1
+
+    def batch_due(self):
+        return self.batch_count >= self.batch_frames or \
+            ticks_diff(ticks_ms(), self.batch_started) >= self.batch_ms
+
+    def flush(self):
+        data = self.batch
+        self.batch = bytearray()
+        self.batch_count = 0
+        if not data:
+            return
+        sent = False
+        try:
+            sent = self.send_data(data)
+        finally:
+            if not sent:
+                self.store(data)
+
+    def store(self, data):
+        if self.queue is not None:
+            self.queue.push(data)
+        if self.delta is not None:
+            # The receiver doesn't have these frames (yet), so restart deltas from a keyframe
+            self.delta.reset()
+
+    def drain(self):
+        # Resend stored batches, each is removed from the queue only once sent
+        if self.queue is None or not len(self.queue) or not self.connected():
+            return
+        for seq, data in self.queue.peek(self.drain_batches):
+            self.transmit(data)
+            self.queue.commit(1)
+            self.log.log(f'Resent queued batch {seq}, {len(self.queue)} left', 'blue')
+
+    def transmit(self, data):
+        if self.transport == TRANSPORT_UDP:
+            self.modem.send_udp(struct.pack('>H', self.udp_seq) + data)
+            self.udp_seq = (self.udp_seq + 1) & 0xFFFF
+        else:
+            self.modem.send_tcp(data)
+
     def get_ip_addr(self):
         return self.modem.get_ip_addr()
 
-    def send_data(self, data):
-        ip = self.get_ip_addr()
-        if ip:
-            self.modem.send_tcp(data)
-        else:
-            # Not connected, wait
-            self.modem.connect(GSM_APN)
-            self.log.log('Not connected to GSM network', 'red')
-            utime.sleep_ms(1000)
+    def connected(self):
+        return self.state == STATE_CONNECTED
 
-    def open(self):
-        self.close()
-        self.modem.open_tcp(DOWNSTREAM_IP, DOWNSTREAM_PORT)
+    def reconnect(self):
+        # One engine poll towards a connection, a new attempt at most once per backoff period.
+        # Doesn't block, so the loop keeps collecting frames while the link is down.
+        if self.connecting is None:
+            if ticks_diff(ticks_ms(), self.retry_at) < 0:
+                return
+            self.connecting = sim800l.ATTask(self.modem.engine, self.connect_steps())
+        try:
+            if not self.connecting.poll():
+                return
+        except Exception as e:
+            self.log.log(f'Reconnect failed, retrying in {self.backoff} ms: {e}', 'red')
+            self.connecting = None
+            self.modem.engine.reset()
+            # Re-check the bearer on the next attempt, it is a single command when still up
+            self.state = STATE_DOWN
+            self.retry_at = ticks_add(ticks_ms(), self.backoff)
+            self.backoff = min(self.backoff * 2, BACKOFF_MAX_MS)
+            return
+        self.connecting = None
+        self.backoff = BACKOFF_MIN_MS
 
-    def close(self):
-        self.modem.close_tcp()
+    def connect_steps(self):
+        if self.state == STATE_DOWN:
+            yield from self.modem.connect_steps(GSM_APN)
+            self.state = STATE_IP
+            self.log.log('Modem reconnected to APN', 'green')
+        yield from self.modem.close_steps()
+        yield from self.modem.open_steps(self.transport.upper(), DOWNSTREAM_IP, DOWNSTREAM_PORT)
+        self.state = STATE_CONNECTED
+        self.log.log(f'{self.transport.upper()} connection open', 'green')
+
+    def send_data(self, data):
+        # A healthy link is trusted as long as no URC or error said otherwise,
+        # so sends don't pay for an IP check. Without a link the loop reconnects.
+        if self.state == STATE_CONNECTED:
+            self.transmit(data)
+            return True
+        return False
 
     def loop(self):
-        utime.sleep_ms(10000)  # Wait for modem to be ready
+        sleep_ms(10000)  # Wait for modem to be ready
         self.log.log('Starting GSM loop', 'blue')
-        self.open()
         while True:
-            try:
-                self.set_signal_strength()
-                self.send_data(self.datapacker.pack())
-            except Exception as e:
-                self.log.log(f'Got exception while sending data: {e}', 'red')
-                self.uart.read()  # Clear the buffer
-                # Close and open the connection, in case the connection is lost for
-                # some reason this should recover it 99% of the time if signal is still there
-                self.close()
-                self.open()
-                utime.sleep_ms(1000)
+            self.step()
+
+    def step(self):
+        # One frame, and sending the batch once it is due
+        try:
+            if not self.connected():
+                # One step per frame, batches are queued meanwhile
+                self.reconnect()
+            self.queue_frame(self.next_frame())
+            if self.batch_due():
+                self.flush()
+                self.drain()
+                if self.connecting is None:
+                    # Would wait behind the reconnect's command otherwise. After the flush, so
+                    # a modem that doesn't answer CSQ can't cost the batch.
+                    self.set_signal_strength()
+            elif self.sample_ms:
+                sleep_ms(self.sample_ms)
+        except Exception as e:
+            self.log.log(f'Got exception while sending data: {e}', 'red')
+            if self.batch_count:
+                self.store(bytes(self.batch))
+            self.batch = bytearray()
+            self.batch_count = 0
+            self.modem.engine.reset()  # Clear the buffer
+            self.connecting = None
+            # Most likely the connection was lost, reopen it (with backoff) on the next send
+            self.state = min(self.state, STATE_IP)
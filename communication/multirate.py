@@ -0,0 +1,50 @@
+from compat import ticks_ms, ticks_add, ticks_diff
+
+# Multi-rate telemetry: every lane sends one datapacker profile at its own interval.
+# Whenever the link can take a frame, the due lane with the highest priority (lowest
+# number) goes first, the most overdue one among equals. Lanes that fall behind don't
+# try to catch up, they just go out as soon as possible. A lane asking for more than
+# the link can carry starves the lanes below it, so keep the sum of the rates within
+# the radio budget (bench/bench_lanes.py).
+
+
+class Lane:
+    def __init__(self, profile, interval_ms=0, priority=0):
+        self.profile = profile
+        self.interval_ms = interval_ms
+        self.priority = priority
+        self.due = ticks_ms()
+        self.sent = 0
+
+
+class LaneScheduler:
+    def __init__(self, lanes):
+        # Sorted once, so the first due lane found wins on priority
+        self.lanes = sorted(lanes, key=lambda lane: lane.priority)
+
+    def next(self, now=None):
+        # The lane to send now, None if none is due
+        if now is None:
+            now = ticks_ms()
+        best = None
+        for lane in self.lanes:
+            if ticks_diff(now, lane.due) < 0:
+                continue
+            if best is None:
+                best = lane
+            elif lane.priority != best.priority:
+                break
+            elif ticks_diff(lane.due, best.due) < 0:
+                best = lane
+        if best is not None:
+            best.due = ticks_add(best.due, best.interval_ms)
+            if ticks_diff(now, best.due) >= 0:
+                best.due = ticks_add(now, best.interval_ms)
+            best.sent += 1
+        return best
+
+    def wait_ms(self, now=None):
+        # Time until the next lane is due, 0 if one is already
+        if now is None:
+            now = ticks_ms()
+        return max(min(ticks_diff(lane.due, now) for lane in self.lanes), 0)
@@ -1,16 +1,44 @@
 import utime
 
+import bitpacker
+import fec
+import framing
+from communication import airtime, multirate
 from hardware import lora_e220, lora_e220_constants
 from log import Logger
 
+# Give up on AUX after the estimated time on air plus this, in ms
+AUX_TIMEOUT_MS = 1000
+
+# Log latency statistics every this many frames
+STATS_FRAMES = 100
+
 
 class Radio433:
-    def __init__(self, uart, datapacker):
+    def __init__(self, uart, datapacker, mode=framing.MODE_TEXT, profile='log-everything', bitpack=False,
+                 duty_cycle=airtime.DUTY_CYCLE_EU_433, aux_pin=None, fec_group=None, fec_depth=1, lanes=None):
         self.uart = uart
         self.datapacker = datapacker
+        self.profile = profile
         self.log = Logger('Radio')
 
-        self.radio = lora_e220.LoRaE220('400T22D', self.uart, m1_pin=35, m0_pin=39)
+        # communication.multirate.Lane list, several profiles at their own rates instead of
+        # `profile` as fast as the link allows. With lanes `profile` is not used.
+        if lanes is None:
+            lanes = [multirate.Lane(profile)]
+        self.lanes = multirate.LaneScheduler(lanes)
+
+        # Text frames are base64 terminated with "@", binary frames carry their own sync and length
+        self.framer = framing.Framer() if mode == framing.MODE_BINARY else None
+        # Bit-packed payloads, binary mode only
+        self.bitpack = self.framer is not None and bitpack
+        # XOR parity frame after every fec_group frames (interleaved fec_depth deep), binary mode only
+        self.fec = None
+        if self.framer is not None and fec_group:
+            self.fec = fec.FecEncoder(fec_group, fec_depth)
+        self.parity = []  # (ticks built, frame), sent before the next data frame
+
+        self.radio = lora_e220.LoRaE220('400T22D', self.uart, aux_pin=aux_pin, m1_pin=35, m0_pin=39)
 
         radio_configuration = lora_e220.Configuration("400T22D")
         radio_configuration.CHAN = 42
@@ -18,13 +46,101 @@ class Radio433:
 
         self.radio.set_configuration(radio_configuration)
         self.radio.begin()
-        self.log.log( 'Radio initialized', 'green')
 
-    def send(self, data):
+        # Frames go out as soon as the previous one has left the air (and the duty cycle allows),
+        # see communication.airtime.DUTY_CYCLE_EU_433
+        self.scheduler = airtime.AirtimeScheduler(radio_configuration, duty_cycle)
+
+        # The E220 pulls AUX low while it takes in and transmits a frame and releases it once its
+        # buffer is empty. Without AUX completion is estimated from the time on air.
+        self.aux = self.radio.aux
+        self.aux_rise = 0
+        self.in_flight = None  # (ticks built, ticks written, length) of the frame being sent
+        if self.aux is not None:
+            self.aux.irq(handler=self.on_aux_rise, trigger=self.aux.IRQ_RISING)
+
+        # Per-frame latency from packing to completion, and time from writing to AUX high, in ms
+        self.sent = 0
+        self.timeouts = 0
+        self.latency_sum = 0
+        self.latency_max = 0
+        self.airtime_sum = 0
+        self.log.log('Radio initialized', 'green')
+
+    def on_aux_rise(self, pin):
+        # IRQ handler, no allocation
+        self.aux_rise = utime.ticks_ms()
+
+    def next_frame(self, profile=None):
+        if profile is None:
+            profile = self.profile
+        if self.framer is not None:
+            payload = self.datapacker.snapshot(profile)[1]
+            frame_type = self.datapacker.profiles[profile].type_id
+            if self.bitpack:
+                payload = bitpacker.profiles[profile].pack(payload)
+                frame_type |= bitpacker.BITPACK_FLAG
+            seq = self.framer.seq
+            frame = self.framer.frame(payload, frame_type)
+            if self.fec is not None:
+                built = utime.ticks_ms()
+                self.parity.extend((built, parity) for parity in self.fec.add(frame_type, seq, payload))
+            return frame
+        return (self.datapacker.pack(profile=profile).replace("\n", "") + "@").encode("utf-8")
+
+    def idle(self):
+        # True once the frame in flight has left the module
+        if self.in_flight is None:
+            return True
+        built, written, length = self.in_flight
+        now = utime.ticks_ms()
+        if self.aux is None:
+            if self.scheduler.wait_ms():
+                return False
+            self.frame_done(built, written, now)
+            return True
+
+        # AUX only tells completion once the module has taken the whole frame off the UART
+        uart_done = utime.ticks_add(written, int(length * self.scheduler.byte_ms) + 1)
+        if utime.ticks_diff(now, uart_done) < 0:
+            return False
+        if self.aux.value() and utime.ticks_diff(self.aux_rise, written) >= 0:
+            self.frame_done(built, written, self.aux_rise)
+            return True
+        if utime.ticks_diff(now, written) > self.scheduler.time_on_air_ms(length) + AUX_TIMEOUT_MS:
+            self.timeouts += 1
+            self.log.log('No AUX after send, module stuck?', 'red')
+            self.frame_done(built, written, now)
+            return True
+        if self.aux.value() and utime.ticks_diff(now, uart_done) > 10:
+            # Rising edge missed, e.g. frame sent before the IRQ fired
+            self.frame_done(built, written, now)
+            return True
+        return False
+
+    def frame_done(self, built, written, done):
+        self.in_flight = None
+        latency = utime.ticks_diff(done, built)
+        self.sent += 1
+        self.latency_sum += latency
+        self.latency_max = max(self.latency_max, latency)
+        if self.aux is not None:
+            airtime_ms = utime.ticks_diff(done, written)
+            self.airtime_sum += airtime_ms
+            # The measured time replaces the estimate for the duty cycle
+            self.scheduler.completed(airtime_ms)
+        if self.sent % STATS_FRAMES == 0:
+            self.log.log(f'{self.sent} frames, latency avg {self.latency_sum // self.sent} ms max '
+                         f'{self.latency_max} ms, {self.timeouts} AUX timeouts', 'blue')
+
+    def send(self, data, built=None):
         try:
-            dp = data + "@"
-            self.uart.write(dp.encode("utf-8"))
-            utime.sleep_ms(750)
+            written = utime.ticks_ms()
+            result = self.radio._send_message(data, wait=False)
+            if result != lora_e220.ResponseStatusCode.E220_SUCCESS:
+                raise Exception(f'E220 send failed with code {result}')
+            self.scheduler.sent(len(data))
+            self.in_flight = (written if built is None else built, written, len(data))
         except Exception as e:
             self.log.log(f'Got exception while sending data: {e}', 'red')
             utime.sleep_ms(1000)
@@ -32,5 +148,22 @@ class Radio433:
     def loop(self):
         self.log.log('Starting radio loop', 'blue')
         while True:
-            self.send(self.datapacker.pack().replace("\n", ""))
-            utime.sleep_ms(750)
+            if not self.idle():
+                # AUX is polled every ms, the estimate needs no polling
+                utime.sleep_ms(1 if self.aux is not None else max(self.scheduler.wait_ms(), 1))
+                continue
+            wait = self.scheduler.wait_ms()
+            if wait:
+                utime.sleep_ms(wait)
+                continue
+            if self.parity:
+                built, frame = self.parity.pop(0)
+            else:
+                lane = self.lanes.next()
+                if lane is None:
+                    utime.sleep_ms(max(self.lanes.wait_ms(), 1))
+                    continue
+                # Packed only now so every frame carries the latest values
+                built = utime.ticks_ms()
+                frame = self.next_frame(lane.profile)
+            self.send(frame, built)
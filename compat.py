@@ -0,0 +1,36 @@
+# What differs between MicroPython and CPython, so the modules running on the cansat
+# also run in host side tests and benchmarks
+
+try:
+    from time import ticks_ms, ticks_add, ticks_diff, sleep_ms
+except ImportError:
+    # CPython
+    import time
+
+
+    def ticks_ms():
+        return int(time.monotonic() * 1000)
+
+
+    def ticks_add(ticks, delta):
+        return ticks + delta
+
+
+    def ticks_diff(a, b):
+        return a - b
+
+
+    def sleep_ms(ms):
+        time.sleep(ms / 1000)
+
+
+def find(buf, sub, start=0, end=None):
+    # bytes.find() for a bytearray or memoryview, MicroPython only has it on str and bytes
+    if end is None:
+        end = len(buf)
+    first = sub[0]
+    n = len(sub)
+    for i in range(start, end - n + 1):
+        if buf[i] == first and (n == 1 or bytes(buf[i:i + n]) == sub):
+            return i
+    return -1
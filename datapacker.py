@@ -1,180 +1,253 @@
 import struct
-import ubinascii
+import _thread
 
+try:
+    import ubinascii
+except ImportError:
+    # Host side (ground station, benchmarks) runs on CPython
+    import binascii as ubinascii
+
+# min/max are the physical range of a field in its unit before the multiplier,
+# bitpacker stores each field in just enough bits for that range
 structure = {
     "time": {
         # Time in ms since start of day
         "type": "unsigned int",
         "size": 4,
-        "multiplier": 1
+        "multiplier": 1,
+        "min": 0,
+        "max": 86400000
     },
     "bat_v": {
         "type": "unsigned short",
         "size": 2,
-        "multiplier": 1000
+        "multiplier": 1000,
+        "min": 0,
+        "max": 5
     },
 
     "lat": {
         "type": "int",
         "size": 4,
         # Scale down to 7 decimal places, should be enough
-        "multiplier": 10 ** 6
+        "multiplier": 10 ** 6,
+        "min": -90,
+        "max": 90
     },
     "lon": {
         "type": "int",
         "size": 4,
-        "multiplier": 10 ** 6
+        "multiplier": 10 ** 6,
+        "min": -180,
+        "max": 180
     },
     "gps_sats": {
         "type": "unsigned char",
         "size": 1,
-        "multiplier": 1
+        "multiplier": 1,
+        "min": 0,
+        "max": 31
     },
 
     "gps_hdop": {
         "type": "unsigned short",
         "size": 2,
-        "multiplier": 10
+        "multiplier": 10,
+        "min": 0,
+        "max": 100
     },
     "gps_alt": {
         "type": "unsigned short",
         "size": 2,
-        "multiplier": 10
+        "multiplier": 10,
+        "min": 0,
+        "max": 5000
     },
 
     "gsm_signal": {
         "type": "unsigned char",
         "size": 1,
-        "multiplier": 100
+        "multiplier": 100,
+        "min": 0,
+        "max": 1.27
     },
 
     "baro_bmp": {
+        # Pressures in Pa
         "type": "unsigned int",
         "size": 4,
-        "multiplier": 10000
+        "multiplier": 10000,
+        "min": 0,
+        "max": 110000
     },
     "baro_bme": {
         "type": "unsigned int",
         "size": 4,
-        "multiplier": 10000
+        "multiplier": 10000,
+        "min": 0,
+        "max": 110000
     },
     "baro_ms5611": {
         "type": "unsigned int",
         "size": 4,
-        "multiplier": 10000
+        "multiplier": 10000,
+        "min": 0,
+        "max": 110000
     },
 
     "temp_bmp": {
         "type": "short",
-        "size": 4,
-        "multiplier": 100
+        "size": 2,
+        "multiplier": 100,
+        "min": -40,
+        "max": 85
     },
     "temp_mpu": {
         "type": "short",
-        "size": 4,
-        "multiplier": 100
+        "size": 2,
+        "multiplier": 100,
+        "min": -40,
+        "max": 85
     },
     "temp_bme": {
         "type": "short",
-        "size": 4,
-        "multiplier": 100
+        "size": 2,
+        "multiplier": 100,
+        "min": -40,
+        "max": 85
     },
     "temp_ms5611": {
         "type": "short",
-        "size": 4,
-        "multiplier": 100
+        "size": 2,
+        "multiplier": 100,
+        "min": -40,
+        "max": 85
     },
 
     "hum_bme": {
         "type": "short",
-        "size": 4,
-        "multiplier": 100
+        "size": 2,
+        "multiplier": 100,
+        "min": 0,
+        "max": 100
     },
 
     "acc_x": {
         "type": "int",
         "size": 4,
-        "multiplier": 1000
+        "multiplier": 1000,
+        "min": -16,
+        "max": 16
     },
     "acc_y": {
         "type": "int",
         "size": 4,
-        "multiplier": 1000
+        "multiplier": 1000,
+        "min": -16,
+        "max": 16
     },
     "acc_z": {
         "type": "int",
         "size": 4,
-        "multiplier": 1000
+        "multiplier": 1000,
+        "min": -16,
+        "max": 16
     },
 
     "gyro_x": {
         "type": "int",
         "size": 4,
-        "multiplier": 1000
+        "multiplier": 1000,
+        "min": -2000,
+        "max": 2000
     },
     "gyro_y": {
         "type": "int",
         "size": 4,
-        "multiplier": 1000
+        "multiplier": 1000,
+        "min": -2000,
+        "max": 2000
     },
     "gyro_z": {
         "type": "int",
         "size": 4,
-        "multiplier": 1000
+        "multiplier": 1000,
+        "min": -2000,
+        "max": 2000
     },
     "mag_x": {
         "type": "int",
         "size": 4,
-        "multiplier": 1
+        "multiplier": 1,
+        "min": -8000,
+        "max": 8000
     },
     "mag_y": {
         "type": "int",
         "size": 4,
-        "multiplier": 1
+        "multiplier": 1,
+        "min": -8000,
+        "max": 8000
     },
     "mag_z": {
         "type": "int",
         "size": 4,
-        "multiplier": 1
+        "multiplier": 1,
+        "min": -8000,
+        "max": 8000
     },
 
     "ahrs_x": {
         "type": "int",
         "size": 4,
-        "multiplier": 1000
+        "multiplier": 1000,
+        "min": -180,
+        "max": 180
     },
     "ahrs_y": {
         "type": "int",
         "size": 4,
-        "multiplier": 1000
+        "multiplier": 1000,
+        "min": -180,
+        "max": 180
     },
     "ahrs_z": {
         "type": "int",
         "size": 4,
-        "multiplier": 1000
+        "multiplier": 1000,
+        "min": -180,
+        "max": 180
     },
 
     "ens_tvoc": {
         "type": "unsigned short",
         "size": 2,
-        "multiplier": 1
+        "multiplier": 1,
+        "min": 0,
+        "max": 65000
     },
     "ens_eco2": {
         "type": "unsigned short",
         "size": 2,
-        "multiplier": 1
+        "multiplier": 1,
+        "min": 0,
+        "max": 65000
     },
 
     "als": {
         "type": "unsigned short",
         "size": 2,
-        "multiplier": 1
+        "multiplier": 1,
+        "min": 0,
+        "max": 65535
     },
 
     "vspd": {
         "type": "int",
         "size": 4,
-        "multiplier": 1000
+        "multiplier": 1000,
+        "min": -500,
+        "max": 500
     }
 }
 
@@ -221,21 +294,6 @@ types = {
     "unsigned char": "B"
 }
 
-size = sum([structure[i]["size"] for i in structure])  # 44 bytes == 352 bits\
-
-for i in structure:
-    structure[i]["value"] = 0
-
-
-def set_value(value, key):
-    structure[key]["value"] = value
-
-
-def set_values(values):
-    for key in values:
-        set_value(values[key], key)
-
-
 dataminmax = {
     "int": {
         "min": -2147483648,
@@ -260,38 +318,189 @@ dataminmax = {
 }
 
 
-def pack(dbg=False):
-    # fmt = ">" + "".join([types[structure[i]["type"]] for i in structure])
-    # Pack using sequiencing
-    fmt = ">" + "".join([types[structure[i]["type"]] for i in sequencing])
+class Schema:
+    # Packing layout compiled once from `structure`, so pack() doesn't have to
+    # rebuild the format or walk the structure dict on every call.
+    # Values are read from the shared `values` list (indexed like `sequencing`).
+    def __init__(self, fields, type_id=0, name=None):
+        self.name = name
+        self.type_id = type_id
+        self.fields = tuple(fields)
+        self.slots = tuple([sequencing.index(i) for i in fields])
+        self.fmt = ">" + "".join([types[structure[i]["type"]] for i in fields])
+        self.multipliers = tuple([structure[i]["multiplier"] for i in fields])
+        self.mins = tuple([dataminmax[structure[i]["type"]]["min"] for i in fields])
+        self.maxs = tuple([dataminmax[structure[i]["type"]]["max"] for i in fields])
+        self.size = struct.calcsize(self.fmt)
+        # Text (base64) frames of anything but the legacy full layout start with the type id
+        self.prefix = bytes([type_id]) if type_id else b""
+
+        # Reused between calls, callers must serialise access to them
+        self.buffer = bytearray(self.size)
+        self._scaled = [0] * len(self.fields)
+
+    def scale(self, values):
+        scaled = self._scaled
+        slots = self.slots
+        multipliers = self.multipliers
+        mins = self.mins
+        maxs = self.maxs
+        for n in range(len(scaled)):
+            val = values[slots[n]] * multipliers[n]
+            # Check for int/short overflow
+            if val < mins[n] or val > maxs[n]:
+                raise Exception(
+                    f"Overflow {self.fields[n]} {values[slots[n]]} {multipliers[n]} {val} {mins[n]} {maxs[n]}")
+            scaled[n] = int(val)
+        return scaled
+
+    def pack_into(self, values, buf=None, offset=0):
+        if buf is None:
+            buf = self.buffer
+        struct.pack_into(self.fmt, buf, offset, *self.scale(values))
+        return buf
+
+    def unpack(self, data):
+        unpacked = struct.unpack(self.fmt, data)
+        multipliers = self.multipliers
+        return {self.fields[n]: unpacked[n] / multipliers[n] for n in range(len(unpacked))}
+
+
+# Field profiles, one compiled Schema and frame type id per link.
+# Type 0 is the original full layout and is sent without a type prefix in text mode.
+profile_fields = {
+    "log-everything": (0, sequencing),
+    # ENS160 is not fitted and nothing sets vspd
+    "gsm-full": (1, [i for i in sequencing if i not in ("ens_tvoc", "ens_eco2", "vspd")]),
+    # What the ground station needs to track and recover the can
+    "radio-minimal": (2, [
+        "time",
+        "bat_v",
+        "lat",
+        "lon",
+        "gps_sats",
+        "gps_alt",
+        "baro_bmp",
+        "temp_bmp",
+        "hum_bme",
+        "ahrs_x",
+        "ahrs_y",
+        "ahrs_z"
+    ]),
+    # Radio lanes, see communication.multirate: fast changing motion data sent often,
+    # slow environment and position data now and then
+    "radio-attitude": (3, [
+        "time",
+        "acc_x",
+        "acc_y",
+        "acc_z",
+        "gyro_x",
+        "gyro_y",
+        "gyro_z",
+        "ahrs_x",
+        "ahrs_y",
+        "ahrs_z"
+    ]),
+    "radio-environment": (4, [
+        "time",
+        "bat_v",
+        "lat",
+        "lon",
+        "gps_sats",
+        "gps_hdop",
+        "gps_alt",
+        "baro_bmp",
+        "temp_bmp",
+        "hum_bme",
+        "gsm_signal"
+    ]),
+}
+
+DEFAULT_PROFILE = "log-everything"
+
+profiles = {}
+profiles_by_type = {}
+for i in profile_fields:
+    profiles[i] = Schema(profile_fields[i][1], type_id=profile_fields[i][0], name=i)
+    profiles_by_type[profiles[i].type_id] = profiles[i]
+
+schema = profiles[DEFAULT_PROFILE]
+size = schema.size  # 100 bytes == 800 bits
 
-    dt = []
-    for i in sequencing:
-        val = structure[i]["value"] * structure[i]["multiplier"]
-        # print(i, "=", val, end="; ")
-        dt.append(int(val))
+for i in profiles:
+    # Legacy text frames are told apart from prefixed ones by their length
+    if profiles[i].type_id and profiles[i].size + 1 == size:
+        raise Exception(f"Profile {i} has the same text frame size as {DEFAULT_PROFILE}")
 
-    # print()
-    # Check for int/short overflow
-    for i in sequencing:
-        if structure[i].get("value", 0) * structure[i]["multiplier"] < dataminmax[structure[i]["type"]]["min"] or \
-                structure[i].get("value", 0) * structure[i]["multiplier"] > dataminmax[structure[i]["type"]]["max"]:
-            raise Exception(
-                f"Overflow {i} {structure[i].get('value', 0)} {structure[i]['multiplier']} {structure[i].get('value', 0) * structure[i]['multiplier']} {dataminmax[structure[i]['type']]['min']} {dataminmax[structure[i]['type']]['max']}")
-        # print("Overflow", i, structure[i].get("value", 0), structure[i]["multiplier"], structure[i].get("value", 0) * structure[i]["multiplier"], dataminmax[structure[i]["type"]]["min"],
-        #      dataminmax[structure[i]["type"]]["max"])
+# Double buffered shared state: writers publish into `values` (the back buffer)
+# under `lock`, readers copy it into `_front` once per generation and pack that,
+# so every consumer of a generation gets the same consistent, immutable frame.
+values = [0] * len(sequencing)
+_front = [0] * len(sequencing)
+_index = {key: n for n, key in enumerate(sequencing)}
 
-    s = struct.pack(fmt, *dt)
-    # B64
-    b = ubinascii.b2a_base64(s).decode("utf-8")
-    return b
+lock = _thread.allocate_lock()
+_pack_lock = _thread.allocate_lock()
+
+_dirty = True
+_generation = 0
+# Profile name -> [raw frame, base64 frame] for the current generation
+_frames = {}
+
+
+def set_value(value, key):
+    global _dirty
+    with lock:
+        values[_index[key]] = value
+        _dirty = True
+
+
+def set_values(new_values):
+    global _dirty
+    with lock:
+        for key in new_values:
+            values[_index[key]] = new_values[key]
+        _dirty = True
+
+
+def _cached(profile):
+    # Must be called with _pack_lock held
+    global _dirty, _generation
+    if _dirty:
+        with lock:
+            _front[:] = values
+            _dirty = False
+        _generation += 1
+        _frames.clear()
+
+    frame = _frames.get(profile)
+    if frame is None:
+        p = profiles[profile]
+        p.pack_into(_front)
+        frame = _frames[profile] = [bytes(p.buffer), None]
+    return frame
+
+
+def snapshot(profile=DEFAULT_PROFILE):
+    # Returns (generation, frame), frame being the raw packed bytes. Only the first
+    # reader of a profile after a write packs, the rest get the cached frame.
+    with _pack_lock:
+        frame = _cached(profile)
+        return _generation, frame[0]
+
+
+def pack(dbg=False, profile=DEFAULT_PROFILE):
+    with _pack_lock:
+        frame = _cached(profile)
+        if frame[1] is None:
+            # B64
+            frame[1] = ubinascii.b2a_base64(profiles[profile].prefix + frame[0]).decode("utf-8")
+        return frame[1]
 
 
 def unpack(data):
     # Return a dictionary with the values
-    fmt = ">" + "".join([types[structure[i]["type"]] for i in structure])
     ub = ubinascii.a2b_base64(data)
-    unpacked = struct.unpack(fmt, ub)
-
-    return {list(structure.keys())[i]: unpacked[i] / list(structure.values())[i]["multiplier"] for i in
-            range(len(structure))}
+    if len(ub) == size:
+        return schema.unpack(ub)
+    return profiles_by_type[ub[0]].unpack(ub[1:])
@@ -0,0 +1,95 @@
+import struct
+
+# Keyframe + delta encoding for consecutive frames of one datapacker profile
+#
+# Keyframe: | 0x00 | packed frame |
+# Delta:    | 0x01 | zigzag varint of (value - previous value) for every field |
+#
+# Binary frames carrying this encoding use the profile type id with DELTA_FLAG set.
+# A delta can only be applied on top of the frame right before it, so a decoder
+# that misses a frame waits for the next keyframe.
+
+DELTA_FLAG = 0x80
+
+KEYFRAME = 0
+DELTA = 1
+
+
+def _zigzag(n):
+    return n << 1 if n >= 0 else ((-n) << 1) - 1
+
+
+def _unzigzag(n):
+    return n >> 1 if not n & 1 else -((n + 1) >> 1)
+
+
+class DeltaEncoder:
+    def __init__(self, schema, keyframe_interval=30):
+        self.schema = schema
+        self.keyframe_interval = keyframe_interval
+        self.count = 0
+        self.prev = None
+
+    def reset(self):
+        # Next frame will be a keyframe
+        self.prev = None
+
+    def encode(self, frame):
+        cur = struct.unpack(self.schema.fmt, frame)
+        prev = self.prev
+        self.prev = cur
+
+        if prev is None or self.count % self.keyframe_interval == 0:
+            self.count = 1
+            return bytes([KEYFRAME]) + frame
+        self.count += 1
+
+        out = bytearray([DELTA])
+        for n in range(len(cur)):
+            z = _zigzag(cur[n] - prev[n])
+            while z > 0x7F:
+                out.append((z & 0x7F) | 0x80)
+                z >>= 7
+            out.append(z)
+        return out
+
+
+class DeltaDecoder:
+    def __init__(self, schema):
+        self.schema = schema
+        self.prev = None
+        self.seq = None
+        self.lost = 0  # deltas that could not be applied
+
+    def decode(self, payload, seq=None):
+        # Returns the packed frame, or None until the next keyframe after a gap
+        in_order = seq is None or self.seq is None or seq == (self.seq + 1) & 0xFFFF
+        self.seq = seq
+
+        if payload[0] == KEYFRAME:
+            frame = bytes(payload[1:])
+            self.prev = struct.unpack(self.schema.fmt, frame)
+            return frame
+
+        if self.prev is None or not in_order:
+            self.prev = None
+            self.lost += 1
+            return None
+
+        prev = self.prev
+        cur = []
+        pos = 1
+        for n in range(len(prev)):
+            z = 0
+            shift = 0
+            while True:
+                b = payload[pos]
+                pos += 1
+                z |= (b & 0x7F) << shift
+                shift += 7
+                if not b & 0x80:
+                    break
+            cur.append(prev[n] + _unzigzag(z))
+
+        self.prev = tuple(cur)
+        return struct.pack(self.schema.fmt, *cur)
@@ -0,0 +1,142 @@
+import struct
+
+import framing
+
+# Forward error correction for binary radio frames: interleaved XOR parity
+#
+# Data frames are taken in blocks of k * depth consecutive sequence numbers starting
+# at `base`. Group r of a block holds the frames base + r, base + r + depth, ...
+# (k frames), so a burst of up to `depth` lost frames hits every group at most once.
+# Once a block is complete one parity frame per group is sent:
+#
+# | base seq (2) | depth (1) | k (1) | group (1) | check (2) | XOR of (type, length, payload) |
+#
+# where each frame contributes its type byte, payload length and payload, zero
+# padded to the longest one, and `check` is the sum of their CRC16s. The ground can
+# rebuild any single missing frame of a group from the others and the parity, and
+# drops the rebuild if its CRC16 does not match the check (the frames it held for
+# the group were not the ones sent). The CRCs are summed rather than XORed since a
+# CRC is linear: an XOR would carry the same error as the rebuilt payload. Parity frames have the type FEC_TYPE and
+# their own sequence numbers, so data frames keep consecutive ones.
+
+FEC_TYPE = 0x3F
+
+_HEADER = '>HBBBH'
+_HEADER_SIZE = 7
+
+
+def _crc(frame_type, payload):
+    # CRC16 of the (type, length, payload) bytes a frame adds to the parity
+    return framing.crc16(payload, framing.crc16((frame_type, len(payload))))
+
+
+class FecEncoder:
+    def __init__(self, k=4, depth=1):
+        if k * depth > 255:
+            raise Exception(f'FEC block too big ({k} x {depth})')
+        self.k = k
+        self.depth = depth
+        self.framer = framing.Framer()
+        self.base = None
+        self.count = 0
+        self.parity = [bytearray() for _ in range(depth)]
+        self.check = [0] * depth
+
+    def add(self, frame_type, seq, payload):
+        # Account for a data frame sent with sequence number `seq`, returns the parity
+        # frames to send after it (none until a block is complete)
+        if self.base is None or (seq - self.base) & 0xFFFF != self.count:
+            # First frame, or frames were skipped, start a new block here
+            self.base = seq
+            self.count = 0
+            for p in self.parity:
+                p[:] = b''
+            for group in range(self.depth):
+                self.check[group] = 0
+
+        group = self.count % self.depth
+        acc = self.parity[group]
+        n = len(payload) + 2
+        if len(acc) < n:
+            acc.extend(bytes(n - len(acc)))
+        acc[0] ^= frame_type
+        acc[1] ^= len(payload)
+        for i in range(len(payload)):
+            acc[i + 2] ^= payload[i]
+        self.check[group] = (self.check[group] + _crc(frame_type, payload)) & 0xFFFF
+        self.count += 1
+
+        if self.count < self.k * self.depth:
+            return ()
+        frames = []
+        for group in range(self.depth):
+            header = struct.pack(_HEADER, self.base, self.depth, self.k, group, self.check[group])
+            frames.append(self.framer.frame(header + self.parity[group], FEC_TYPE))
+        self.base = None
+        return frames
+
+
+class FecDecoder:
+    # Passes data frames through and rebuilds single missing frames of a group from
+    # its parity frame. Rebuilt frames come out late, after the frames following them.
+    def __init__(self, history=512):
+        self.history = history
+        self.frames = {}  # seq -> (type, payload)
+        self.order = []
+        self.last = None  # newest data frame seq
+        self.recovered = 0
+        self.unrecoverable = 0  # groups with more than one frame missing
+        self.rejected = 0  # rebuilds that failed the check
+
+    def _remember(self, frame_type, seq, payload):
+        self.frames[seq] = (frame_type, payload)
+        self.order.append(seq)
+        if len(self.order) > self.history:
+            self.frames.pop(self.order.pop(0), None)
+
+    def feed(self, frame_type, seq, payload):
+        # One (type, seq, payload) frame from the deframer, returns the data frames it yields
+        if frame_type != FEC_TYPE:
+            if self.frames.get(seq) == (frame_type, payload):
+                return []
+            if self.last is not None and (self.last - seq) & 0xFFFF < 0x8000:
+                # Data frames arrive in order, so an old seq with new content means the
+                # sender restarted: the history belongs to the previous run
+                self.frames.clear()
+                self.order.clear()
+            self.last = seq
+            self._remember(frame_type, seq, payload)
+            return [(frame_type, seq, payload)]
+
+        if len(payload) < _HEADER_SIZE + 2:
+            return []
+        base, depth, k, group, check = struct.unpack(_HEADER, payload[:_HEADER_SIZE])
+        seqs = [(base + group + i * depth) & 0xFFFF for i in range(k)]
+        missing = [s for s in seqs if s not in self.frames]
+        if not missing:
+            return []
+        if len(missing) > 1:
+            self.unrecoverable += 1
+            return []
+
+        acc = bytearray(payload[_HEADER_SIZE:])
+        for s in seqs:
+            if s == missing[0]:
+                continue
+            t, p = self.frames[s]
+            check -= _crc(t, p)
+            if len(p) + 2 > len(acc):
+                return []
+            acc[0] ^= t
+            acc[1] ^= len(p)
+            for i in range(len(p)):
+                acc[i + 2] ^= p[i]
+        if acc[1] + 2 > len(acc):
+            return []
+        frame = (acc[0], missing[0], bytes(acc[2:2 + acc[1]]))
+        if _crc(frame[0], frame[2]) != check & 0xFFFF:
+            self.rejected += 1
+            return []
+        self._remember(*frame)
+        self.recovered += 1
+        return [frame]
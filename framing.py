@@ -0,0 +1,108 @@
+import struct
+
+# Binary telemetry framing, used instead of base64 text where a sink supports it
+#
+# | sync (2) | length (1) | type (1) | seq (2) | payload (length) | crc16 (2) |
+#
+# type is the datapacker profile type id. The CRC16 (CCITT, poly 0x1021,
+# init 0xFFFF) covers length, type, seq and payload.
+
+MODE_TEXT = 'text'
+MODE_BINARY = 'binary'
+
+SYNC = b'\xa5\x5a'
+HEADER_SIZE = 6
+CRC_SIZE = 2
+MAX_PAYLOAD = 255
+
+
+def _crc_table():
+    table = []
+    for i in range(256):
+        crc = i << 8
+        for _ in range(8):
+            if crc & 0x8000:
+                crc = ((crc << 1) ^ 0x1021) & 0xFFFF
+            else:
+                crc = (crc << 1) & 0xFFFF
+        table.append(crc)
+    return tuple(table)
+
+
+_table = _crc_table()
+
+
+def crc16(data, crc=0xFFFF):
+    table = _table
+    for b in data:
+        crc = ((crc << 8) & 0xFFFF) ^ table[(crc >> 8) ^ b]
+    return crc
+
+
+class Framer:
+    # Wraps payloads into binary frames with a rolling 16 bit sequence number
+    def __init__(self):
+        self.seq = 0
+
+    def frame(self, payload, frame_type=0):
+        n = len(payload)
+        if n > MAX_PAYLOAD:
+            raise Exception(f'Payload too big for a frame ({n} bytes)')
+
+        buf = bytearray(HEADER_SIZE + n + CRC_SIZE)
+        buf[0:2] = SYNC
+        struct.pack_into('>BBH', buf, 2, n, frame_type, self.seq)
+        buf[HEADER_SIZE:HEADER_SIZE + n] = payload
+        struct.pack_into('>H', buf, HEADER_SIZE + n, crc16(memoryview(buf)[2:HEADER_SIZE + n]))
+
+        self.seq = (self.seq + 1) & 0xFFFF
+        return buf
+
+
+class Deframer:
+    # Streaming decoder for Framer output. Accepts arbitrary chunks, returns the
+    # complete (type, seq, payload) frames found so far and resynchronises on the next
+    # sync word whenever a frame fails its CRC.
+    def __init__(self):
+        self.buffer = bytearray()
+        self.skipped = 0  # bytes thrown away while looking for a sync word
+        self.errors = 0  # frames dropped because of a bad CRC
+
+    def feed(self, data):
+        buf = self.buffer
+        buf.extend(data)
+        frames = []
+        pos = 0
+        while True:
+            start = buf.find(SYNC, pos)
+            if start < 0:
+                # The last byte may be the first half of a sync word
+                keep = len(buf) - 1 if buf[-1:] == SYNC[:1] else len(buf)
+                self.skipped += max(keep - pos, 0)
+                pos = max(keep, pos)
+                break
+
+            self.skipped += start - pos
+            pos = start
+            if len(buf) - start < HEADER_SIZE + CRC_SIZE:
+                break
+
+            n = buf[start + 2]
+            end = start + HEADER_SIZE + n + CRC_SIZE
+            if len(buf) < end:
+                break
+
+            crc = (buf[end - 2] << 8) | buf[end - 1]
+            if crc16(memoryview(buf)[start + 2:end - CRC_SIZE]) != crc:
+                # Corrupted or a false sync inside payload data, retry one byte further
+                self.errors += 1
+                self.skipped += 1
+                pos = start + 1
+                continue
+
+            seq = (buf[start + 4] << 8) | buf[start + 5]
+            frames.append((buf[start + 3], seq, bytes(buf[start + HEADER_SIZE:end - CRC_SIZE])))
+            pos = end
+
+        del buf[:pos]
+        return frames
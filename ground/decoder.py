@@ -0,0 +1,96 @@
+# Ground side bulk decoder for datapacker frames (CPython + NumPy)
+import binascii
+import struct
+
+import numpy as np
+
+import bitpacker
+import datapacker
+import delta
+
+# struct format characters used by datapacker.types -> big endian NumPy types
+_dtypes = {
+    "i": ">i4",
+    "I": ">u4",
+    "h": ">i2",
+    "H": ">u2",
+    "B": "u1"
+}
+
+
+def schema_dtype(schema=datapacker.schema):
+    # Structured dtype with the same layout as schema.fmt
+    return np.dtype([(name, _dtypes[c]) for name, c in zip(schema.fields, schema.fmt[1:])])
+
+
+def decode_raw(raw, schema=datapacker.schema):
+    # Decode concatenated raw frames into columns of scaled float64 arrays
+    records = np.frombuffer(raw, dtype=schema_dtype(schema), count=len(raw) // schema.size)
+    return {name: records[name] / multiplier for name, multiplier in zip(schema.fields, schema.multipliers)}
+
+
+def decode_frames(frames, schema=datapacker.schema):
+    # Decode many base64 frames of one profile at once, silently dropping corrupted
+    # ones and frames of other profiles
+    a2b = binascii.a2b_base64
+    prefix = schema.prefix
+    skip = len(prefix)
+    size = schema.size + skip
+    chunks = []
+    for frame in frames:
+        try:
+            raw = a2b(frame)
+        except (binascii.Error, ValueError):
+            continue
+        if len(raw) == size and raw[:skip] == prefix:
+            chunks.append(raw[skip:])
+    return decode_raw(b"".join(chunks), schema)
+
+
+def decode_log(path, schema=datapacker.schema):
+    # onboard.log is one base64 frame per line
+    with open(path, "rb") as f:
+        return decode_frames(f.read().splitlines(), schema)
+
+
+class StreamDecoder:
+    # Turns the frames of one telemetry stream into (schema, packed frame) pairs, ready
+    # for decode_raw. Handles profile type ids, bit-packed and delta encoded payloads.
+    def __init__(self):
+        self.deltas = {}
+
+    def binary(self, frame_type, seq, payload):
+        # A (type, seq, payload) tuple from framing.Deframer, None if it can't be decoded
+        schema = datapacker.profiles_by_type.get(frame_type & ~(delta.DELTA_FLAG | bitpacker.BITPACK_FLAG))
+        if schema is None:
+            return None
+        if frame_type & bitpacker.BITPACK_FLAG:
+            if len(payload) != bitpacker.profiles[schema.name].size:
+                return None
+            return schema, bitpacker.profiles[schema.name].unpack(payload)
+        if frame_type & delta.DELTA_FLAG:
+            decoder = self.deltas.get(schema.type_id)
+            if decoder is None:
+                decoder = self.deltas[schema.type_id] = delta.DeltaDecoder(schema)
+            try:
+                raw = decoder.decode(payload, seq)
+            except (IndexError, struct.error):
+                decoder.prev = None
+                return None
+            return (schema, raw) if raw is not None else None
+        if len(payload) != schema.size:
+            return None
+        return schema, payload
+
+    def text(self, line):
+        # One base64 frame as produced by datapacker.pack()
+        try:
+            raw = binascii.a2b_base64(line)
+        except (binascii.Error, ValueError):
+            return None
+        if len(raw) == datapacker.size:
+            return datapacker.schema, raw
+        schema = datapacker.profiles_by_type.get(raw[0]) if raw else None
+        if schema is None or len(raw) != schema.size + 1:
+            return None
+        return schema, raw[1:]
@@ -0,0 +1,177 @@
+# Ground station receive path for the 433 MHz LoRa E220 link (CPython)
+#
+# The ground E220 runs in transparent mode with RSSI enabled, so every packet sent
+# by communication.radio433 arrives followed by one RSSI byte. Text frames end with
+# "@", binary frames carry the sync word and length from framing.py. A frame has to
+# fit into one E220 sub-packet, otherwise the module inserts RSSI bytes mid-frame.
+#
+#   python -m ground.radio /dev/ttyUSB0 --baud 9600 --out flight/
+import argparse
+import re
+import time
+
+import datapacker
+import fec
+import framing
+from ground import decoder
+from ground import server as ground_server
+
+# Longest text frame: base64 of the biggest profile plus type id
+MAX_TEXT = 4 * ((max(s.size for s in datapacker.profiles.values()) + 1 + 2) // 3)
+_BASE64 = frozenset(b"ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/=")
+_base64_run = re.compile(rb"[A-Za-z0-9+/=]*")
+
+
+def rssi_dbm(value):
+    # E220 reports RSSI as an unsigned byte, -(256 - value) dBm
+    return value - 256
+
+
+class RadioReceiver:
+    # Reads a serial port (pyserial or anything with read(n) and in_waiting) in bulk into
+    # a fixed buffer and returns the decoded (schema, packed frame, rssi dBm) tuples.
+    # Binary frames lost on the way are rebuilt from fec parity frames where possible.
+    def __init__(self, port, rssi=True, size=4096):
+        self.port = port
+        self.rssi = 1 if rssi else 0
+        self.buffer = bytearray(size)
+        self.view = memoryview(self.buffer)
+        self.start = 0
+        self.end = 0
+        self.stream = decoder.StreamDecoder()
+        self.fec = fec.FecDecoder()
+        self.frames = 0
+        self.errors = 0  # frames that failed their CRC or could not be decoded
+        self.skipped = 0  # bytes thrown away between frames
+
+    def fill(self):
+        # One bulk read of whatever is waiting (blocks for at most the port timeout)
+        if self.start == self.end:
+            self.start = self.end = 0
+        elif len(self.buffer) - self.end < 512:
+            n = self.end - self.start
+            self.buffer[:n] = self.view[self.start:self.end]
+            self.start, self.end = 0, n
+        free = len(self.buffer) - self.end
+        if not free:
+            # A full buffer without a single frame in it is noise
+            self.skipped += self.end - self.start
+            self.start = self.end = 0
+            free = len(self.buffer)
+        data = self.port.read(min(max(self.port.in_waiting, 1), free))
+        self.buffer[self.end:self.end + len(data)] = data
+        self.end += len(data)
+        return len(data)
+
+    def poll(self):
+        self.fill()
+        return self.parse()
+
+    def parse(self):
+        buf = self.buffer
+        frames = []
+        while self.start < self.end:
+            start = self.start
+            if buf[start] == framing.SYNC[0]:
+                result = self._binary(start)
+            elif buf[start] in _BASE64:
+                result = self._text(start)
+            else:
+                self.skipped += 1
+                self.start += 1
+                continue
+            if result is None:
+                break
+            frames.extend(frame for frame in result if frame is not None)
+        return frames
+
+    def _binary(self, start):
+        # None: need more data, else the decoded frames (none if dropped)
+        buf = self.buffer
+        available = self.end - start
+        if available < 2:
+            return None
+        if buf[start + 1] != framing.SYNC[1]:
+            self.skipped += 1
+            self.start += 1
+            return ()
+        if available < framing.HEADER_SIZE:
+            return None
+        n = buf[start + 2]
+        end = start + framing.HEADER_SIZE + n + framing.CRC_SIZE
+        if self.end < end + self.rssi:
+            return None
+        crc = (buf[end - 2] << 8) | buf[end - 1]
+        if framing.crc16(self.view[start + 2:end - framing.CRC_SIZE]) != crc:
+            # Corrupted, or the sync was noise, retry one byte further
+            self.errors += 1
+            self.skipped += 1
+            self.start += 1
+            return ()
+        seq = (buf[start + 4] << 8) | buf[start + 5]
+        payload = bytes(buf[start + framing.HEADER_SIZE:end - framing.CRC_SIZE])
+        rssi = self._rssi(end)
+        # Parity frames yield the data frame they rebuild, if any
+        return [self._accept(self.stream.binary(*frame), rssi) for frame in self.fec.feed(buf[start + 3], seq, payload)]
+
+    def _text(self, start):
+        buf = self.buffer
+        at = _base64_run.match(buf, start, min(self.end, start + MAX_TEXT + 1)).end()
+        if at == self.end:
+            return None
+        if buf[at] != 0x40 or at - start > MAX_TEXT:
+            # Packet cut short (its RSSI byte or the next packet follows) or way too long,
+            # drop it and carry on from the first byte that can't belong to it
+            self.errors += 1
+            self.skipped += at - start
+            self.start = at
+            return ()
+        if self.end < at + 1 + self.rssi:
+            return None
+        line = bytes(buf[start:at])
+        return [self._accept(self.stream.text(line), self._rssi(at + 1))]
+
+    def _rssi(self, end):
+        # Consumes the packet ending at `end` and its RSSI byte
+        rssi = rssi_dbm(self.buffer[end]) if self.rssi else None
+        self.start = end + self.rssi
+        return rssi
+
+    def _accept(self, decoded, rssi):
+        if decoded is None:
+            self.errors += 1
+            return None
+        self.frames += 1
+        return decoded[0], decoded[1], rssi
+
+
+def main():
+    import serial
+
+    parser = argparse.ArgumentParser(description="Cansat 433 MHz ground receiver")
+    parser.add_argument("port")
+    parser.add_argument("--baud", type=int, default=9600)
+    parser.add_argument("--out", default=None, help="directory to save <profile>.npz columns to")
+    parser.add_argument("--interval", type=float, default=5.0, help="seconds between decode/save passes")
+    args = parser.parse_args()
+
+    receiver = RadioReceiver(serial.Serial(args.port, args.baud, timeout=0.1))
+    store = ground_server.ColumnStore()
+    rssi = []
+    next_flush = time.monotonic() + args.interval
+    while True:
+        for schema, raw, value in receiver.poll():
+            store.append(schema, raw)
+            rssi.append(value)
+        if time.monotonic() >= next_flush:
+            store.flush()
+            if args.out:
+                store.save(args.out)
+            mean = sum(rssi) / len(rssi) if rssi else float("nan")
+            print(f"{receiver.frames} frames, {receiver.errors} errors, mean RSSI {mean:.0f} dBm")
+            rssi.clear()
+            next_flush += args.interval
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+# Load test for ground.server: replays a recorded onboard.log (one base64 frame per
+# line) over many concurrent TCP connections or UDP sockets at a target frame rate.
+# Every connection stands for its own cansat, each replayed frame gets its own time
+# value so the server's duplicate filter doesn't drop the repeats of the log.
+#
+#   python -m ground.replay onboard.log --rate 5000 --connections 20 --seconds 10
+#   python -m ground.replay onboard.log --local   # also start a server in-process
+import argparse
+import asyncio
+import binascii
+import socket
+import struct
+import time
+
+import datapacker
+from ground import server as ground_server
+
+# Time values of the frames replayed by different connections never meet
+CONNECTION_TIME_SPAN = 100000000
+
+
+def restamp(frame, time_value):
+    # The recorded base64 frame with its time field, the first of every profile, replaced
+    raw = bytearray(binascii.a2b_base64(frame))
+    struct.pack_into(">I", raw, 0 if len(raw) == datapacker.size else 1, time_value)
+    return binascii.b2a_base64(bytes(raw))
+
+
+def stamped(frames, connection, first, n):
+    return [restamp(frames[(first + i) % len(frames)], connection * CONNECTION_TIME_SPAN + first + i)
+            for i in range(n)]
+
+
+async def replay_tcp(host, port, frames, rate, seconds, batch, connection):
+    _, writer = await asyncio.open_connection(host, port)
+    sent = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        writer.write(b"".join(stamped(frames, connection, sent, batch)))
+        await writer.drain()
+        sent += batch
+        # Keep to the target rate
+        delay = start + sent / rate - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+    writer.close()
+    await writer.wait_closed()
+    return sent
+
+
+async def replay_udp(host, port, frames, rate, seconds, batch, connection):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.connect((host, port))
+    sock.setblocking(False)
+    sent = 0
+    seq = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        sock.send(struct.pack(">H", seq) + b"".join(stamped(frames, connection, sent, batch)))
+        seq = (seq + 1) & 0xFFFF
+        sent += batch
+        delay = start + sent / rate - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+    sock.close()
+    return sent
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Replay a recorded log against the ground server")
+    parser.add_argument("log")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8019)
+    parser.add_argument("--rate", type=float, default=5000, help="total frames per second")
+    parser.add_argument("--connections", type=int, default=10)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--batch", type=int, default=10, help="frames per write / datagram")
+    parser.add_argument("--udp", action="store_true")
+    parser.add_argument("--local", action="store_true", help="start a ground server in this process")
+    args = parser.parse_args()
+
+    with open(args.log, "rb") as f:
+        frames = [line + b"\n" for line in f.read().splitlines() if line]
+
+    server = None
+    if args.local:
+        server = await ground_server.GroundServer().start(args.host, args.port)
+
+    replay = replay_udp if args.udp else replay_tcp
+    start = time.perf_counter()
+    sent = await asyncio.gather(*[
+        replay(args.host, args.port, frames, args.rate / args.connections, args.seconds, args.batch, connection)
+        for connection in range(args.connections)
+    ])
+    elapsed = time.perf_counter() - start
+    print(f"sent {sum(sent)} frames in {elapsed:.1f} s ({sum(sent) / elapsed:.0f} frames/s)")
+
+    if server is not None:
+        await asyncio.sleep(0.5)
+        decode_start = time.perf_counter()
+        server.store.flush()
+        decode = time.perf_counter() - decode_start
+        print(f"server: {server.frames} frames, {server.duplicates} duplicates, {server.errors} errors, "
+              f"{server.store.rows} rows decoded in {decode:.2f} s")
+        server.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
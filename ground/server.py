@@ -0,0 +1,198 @@
+# Ground station receiver for the GSM downlink (CPython, asyncio + NumPy)
+#
+# Accepts any number of concurrent TCP connections and UDP datagrams on the
+# DOWNSTREAM_PORT the cansats send to, deframes base64 text or binary frames,
+# drops duplicates and bulk-decodes everything into a columnar store.
+#
+#   python -m ground.server --port 8019 --out flight/
+import argparse
+import asyncio
+import collections
+import os
+
+import numpy as np
+
+import datapacker
+import framing
+from ground import decoder
+
+
+class Deduplicator:
+    # Remembers the last `window` frame identities per key. A frame is only a duplicate if
+    # its sequence number came before with the same payload: a batch resent from the cansat's
+    # flash queue is a byte for byte copy (on a new connection, so peers can't be the key),
+    # while a rebooted cansat starting over at seq 0, or a second one whose sequence numbers
+    # overlap, sends different data.
+    def __init__(self, window=4096):
+        self.window = window
+        self.seen = {}
+
+    def duplicate(self, key, seq, payload):
+        entry = self.seen.get(key)
+        if entry is None:
+            entry = self.seen[key] = (set(), collections.deque())
+        seen, order = entry
+        frame = (seq, payload)
+        if frame in seen:
+            return True
+        seen.add(frame)
+        order.append(frame)
+        if len(order) > self.window:
+            seen.discard(order.popleft())
+        return False
+
+
+class ColumnStore:
+    # Raw frames are collected per profile and decoded in bulk on flush() into
+    # chunks of columns, one NumPy array per field
+    def __init__(self):
+        self.pending = collections.defaultdict(list)
+        self.chunks = collections.defaultdict(list)
+        self.rows = 0
+
+    def append(self, schema, raw):
+        self.pending[schema.name].append(raw)
+
+    def flush(self):
+        for name, frames in self.pending.items():
+            if frames:
+                self.chunks[name].append(decoder.decode_raw(b"".join(frames), datapacker.profiles[name]))
+                self.rows += len(frames)
+        self.pending.clear()
+
+    def columns(self, name):
+        self.flush()
+        chunks = self.chunks.get(name)
+        if not chunks:
+            return {}
+        return {field: np.concatenate([c[field] for c in chunks]) for field in chunks[0]}
+
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        for name in list(self.chunks) + list(self.pending):
+            columns = self.columns(name)
+            if columns:
+                np.savez(os.path.join(directory, f"{name}.npz"), **columns)
+
+
+class Session:
+    # Decoding state of one TCP connection or UDP peer. The first byte tells binary
+    # frames (sync word) from base64 text, which never contains 0xA5.
+    def __init__(self, server, peer):
+        self.server = server
+        self.peer = peer
+        self.binary = None
+        self.deframer = framing.Deframer()
+        self.text = bytearray()
+        self.stream = decoder.StreamDecoder()
+
+    def feed(self, data):
+        if self.binary is None and data:
+            self.binary = data[0] == framing.SYNC[0]
+
+        if self.binary:
+            for frame_type, seq, payload in self.deframer.feed(data):
+                if self.server.dedup.duplicate(frame_type, seq, payload):
+                    self.server.duplicates += 1
+                    continue
+                self.server.accept(self.stream.binary(frame_type, seq, payload))
+            return
+
+        self.text.extend(data)
+        lines = self.text.split(b"\n")
+        self.text = bytearray(lines.pop())
+        for line in lines:
+            line = line.strip(b"\r@")
+            if not line:
+                continue
+            # Text frames have no sequence number, resent frames are identical though
+            if self.server.dedup.duplicate("text", None, bytes(line)):
+                self.server.duplicates += 1
+                continue
+            self.server.accept(self.stream.text(line))
+
+
+class _UDPProtocol(asyncio.DatagramProtocol):
+    def __init__(self, server):
+        self.server = server
+
+    def datagram_received(self, data, addr):
+        if len(data) < 2:
+            return
+        # communication.gsm prefixes every datagram with a 16 bit sequence number. It restarts
+        # with every boot, so duplicates are left to the frames inside.
+        self.server.datagrams += 1
+        self.server.session(("udp", addr[:2])).feed(data[2:])
+
+
+class GroundServer:
+    def __init__(self, store=None, window=4096):
+        self.store = store if store is not None else ColumnStore()
+        self.dedup = Deduplicator(window)
+        self.sessions = {}
+        self.frames = 0
+        self.errors = 0
+        self.duplicates = 0
+        self.datagrams = 0
+        self.connections = 0
+
+    def session(self, peer):
+        session = self.sessions.get(peer)
+        if session is None:
+            session = self.sessions[peer] = Session(self, peer)
+        return session
+
+    def accept(self, decoded):
+        if decoded is None:
+            self.errors += 1
+            return
+        self.frames += 1
+        self.store.append(*decoded)
+
+    async def handle_tcp(self, reader, writer):
+        # Several cansats may share an address behind carrier NAT, so every connection is its own stream
+        peer = writer.get_extra_info("peername")[:2]
+        self.connections += 1
+        session = Session(self, peer)
+        try:
+            while True:
+                data = await reader.read(65536)
+                if not data:
+                    break
+                session.feed(data)
+        finally:
+            writer.close()
+
+    async def start(self, host="0.0.0.0", port=8019):
+        loop = asyncio.get_running_loop()
+        self.tcp = await asyncio.start_server(self.handle_tcp, host, port)
+        self.udp, _ = await loop.create_datagram_endpoint(lambda: _UDPProtocol(self), local_addr=(host, port))
+        return self
+
+    def close(self):
+        self.tcp.close()
+        self.udp.close()
+
+    async def flush_periodically(self, interval=1.0, directory=None):
+        while True:
+            await asyncio.sleep(interval)
+            self.store.flush()
+            if directory:
+                self.store.save(directory)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Cansat ground station receiver")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8019)
+    parser.add_argument("--out", default=None, help="directory to save <profile>.npz columns to")
+    parser.add_argument("--interval", type=float, default=5.0, help="seconds between decode/save passes")
+    args = parser.parse_args()
+
+    server = await GroundServer().start(args.host, args.port)
+    print(f"Listening on {args.host}:{args.port} (TCP and UDP)")
+    await server.flush_periodically(args.interval, args.out)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -35,6 +35,7 @@
 # THE SOFTWARE.
 #############################################################################################
 
+from compat import find
 from hardware.lora_e220_constants import UARTParity, UARTBaudRate, TransmissionPower, FixedTransmission, AirDataRate, \
     OperatingFrequency, LbtEnableByte, WorPeriod, RssiEnableByte, RssiAmbientNoiseEnable, SubPacketSetting
 from hardware.lora_e220_operation_constant import ResponseStatusCode, ModeType, ProgramCommand, SerialUARTBaudRate, \
@@ -340,6 +341,9 @@ class LoRaE220:
         self.uart_baudrate = uart_baudrate
         self.mode = None
 
+        # Bytes read past the last terminator, kept for the next _read_until
+        self._rx = bytearray()
+
     # model is like 433T20D or 433T27D or 433T30D or 868T20S or 868T27S or 868T30S
     # def __init__(self, model, tx_pin, rx_pin, uart_id=0, aux_pin=None, m0_pin=None, m1_pin=None,
     #              uart_baudrate=SerialUARTBaudRate.BPS_RATE_9600):
@@ -621,8 +625,9 @@ class LoRaE220:
         code = ResponseStatusCode.E220_SUCCESS
         rssi_value = None
         if delimiter is not None:
-            data = self._read_until(delimiter)
-            if rssi:
+            # The RSSI byte follows the whole packet, so it comes after the delimiter
+            data = self._read_until(delimiter, 1 if rssi else 0)
+            if rssi and data:
                 rssi_value = data[-1]  # last byte is rssi
                 data = data[:-1]  # remove rssi from data
         elif size is not None:
@@ -645,15 +650,29 @@ class LoRaE220:
 
     def clean_UART_buffer(self):
         self.uart.read()
-
-    def _read_until(self, terminator='\n') -> bytes:
-        line = b''
+        self._rx = bytearray()
+
+    def _read_until(self, terminator='\n', trailing=0) -> bytes:
+        # Returns the bytes before the terminator followed by the `trailing` bytes after it,
+        # or None if the UART times out first. Reads whatever is waiting in one go, anything
+        # past the end is kept for the next call.
+        if isinstance(terminator, str):
+            terminator = terminator.encode('utf-8')
+        rx = self._rx
+        start = 0
         while True:
-            c = self.uart.read(1)
-            if c == terminator:
-                break
-            line += c
-        return line
+            i = find(rx, terminator, start)
+            if i >= 0 and len(rx) >= i + len(terminator) + trailing:
+                end = i + len(terminator)
+                line = bytes(rx[:i]) + bytes(rx[end:end + trailing])
+                self._rx = rx[end + trailing:]
+                return line
+            if i < 0:
+                start = max(len(rx) - len(terminator) + 1, 0)
+            chunk = self.uart.read(self.uart.any() or 1)
+            if not chunk:
+                return None
+            rx.extend(chunk)
 
     def send_broadcast_message(self, CHAN, message) -> ResponseStatusCode:
         return self._send_message(message, BROADCAST_ADDRESS, BROADCAST_ADDRESS, CHAN)
@@ -676,10 +695,12 @@ class LoRaE220:
         message = ujson.dumps(dict_message)
         return self._send_message(message)
 
-    def _send_message(self, message, ADDH=None, ADDL=None, CHAN=None) -> ResponseStatusCode:
+    def _send_message(self, message, ADDH=None, ADDL=None, CHAN=None, wait=True) -> ResponseStatusCode:
+        # With wait=False returns as soon as the message is written, completion is then
+        # up to the caller (AUX going high)
         result = ResponseStatusCode.E220_SUCCESS
 
-        size_ = len(message.encode('utf-8'))
+        size_ = len(message.encode('utf-8')) if isinstance(message, str) else len(message)
         if size_ > MAX_SIZE_TX_PACKET + 2:
             return ResponseStatusCode.ERR_E220_PACKET_TOO_BIG
 
@@ -701,7 +722,7 @@ class LoRaE220:
                 result = ResponseStatusCode.ERR_E220_NO_RESPONSE_FROM_DEVICE
             else:
                 result = ResponseStatusCode.ERR_E220_DATA_SIZE_NOT_MATCH
-        if result != ResponseStatusCode.E220_SUCCESS:
+        if result != ResponseStatusCode.E220_SUCCESS or not wait:
             return result
 
         result = self.wait_complete_response(1000)
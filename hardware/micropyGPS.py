@@ -8,7 +8,6 @@
 # Time Since First Fix
 # Distance/Time to Target
 # More Helper Functions
-# Dynamically limit sentences types to parse
 
 from math import floor, modf
 
@@ -38,7 +37,7 @@ class MicropyGPS(object):
                 'June', 'July', 'August', 'September', 'October',
                 'November', 'December')
 
-    def __init__(self, local_offset=0, location_formatting='ddm'):
+    def __init__(self, local_offset=0, location_formatting='ddm', sentences=None):
         """
         Setup GPS Object Status Flags, Internal Data Registers, etc
             local_offset (int): Timzone Difference to UTC
@@ -46,6 +45,8 @@ class MicropyGPS(object):
                                        Decimal Degree Minute (ddm) - 40° 26.767′ N
                                        Degrees Minutes Seconds (dms) - 40° 26′ 46″ N
                                        Decimal Degrees (dd) - 40.446° N
+            sentences (iterable): Sentence types to parse in update_sentence(), e.g. ('GGA', 'RMC') for any
+                                  talker. Others are skipped before checksum and tokenising. None parses all.
         """
 
         #####################
@@ -63,6 +64,9 @@ class MicropyGPS(object):
         self.crc_fails = 0
         self.clean_sentences = 0
         self.parsed_sentences = 0
+        self.skipped_sentences = 0
+
+        self.sentence_filter = None if sentences is None else set(s.encode() for s in sentences)
 
         #####################
         # Logging Related
@@ -631,6 +635,50 @@ class MicropyGPS(object):
         # Tell Host no new sentence was parsed
         return None
 
+    def update_sentence(self, line):
+        """Process one complete NMEA line (bytes, as returned by UART.readline()) and update the GPS object.
+        Same result as feeding the line through update() char by char, but the checksum is computed over the
+        buffer and the sentence is split once. Returns sentence type on successful parse, None otherwise"""
+
+        start = line.find(b'$')
+        if start < 0:
+            return None
+        end = line.find(b'*', start)
+        if end < 0 or end - start > self.SENTENCE_LIMIT or len(line) < end + 3:
+            return None
+        if self.sentence_filter is not None and line[start + 3:start + 6] not in self.sentence_filter:
+            self.skipped_sentences += 1
+            return None
+
+        if self.log_en:
+            self.write_log(line[start:end + 3].decode('ascii'))
+
+        crc_xor = 0
+        for i in range(start + 1, end):
+            crc_xor ^= line[i]
+        try:
+            if crc_xor != int(line[end + 1:end + 3], 16):
+                self.crc_fails += 1
+                return None
+            body = line[start + 1:end].decode('ascii')
+        except (ValueError, UnicodeError):
+            return None  # CRC Value was deformed or the line carries garbage
+
+        self.clean_sentences += 1
+        self.sentence_active = False
+        segments = body.split(',')
+        parser = self.supported_sentences.get(segments[0])
+        if parser is None:
+            return None
+
+        # The sentence parsers expect the CRC as last segment, like update() leaves it
+        segments.append(line[end + 1:end + 3].decode('ascii'))
+        self.gps_segments = segments
+        if parser(self):
+            self.parsed_sentences += 1
+            return segments[0]
+        return None
+
     def new_fix_time(self):
         """Updates a high resolution counter with current time when fix is updated. Currently only triggered from
         GGA, GSA and RMC sentences"""
@@ -2,6 +2,8 @@
 import time
 import json
 
+from compat import find, ticks_ms, ticks_add, ticks_diff, sleep_ms
+
 
 # Setup logging.
 
@@ -35,6 +37,265 @@ class Response(object):
         self.content = content
 
 
+class ATCommand(object):
+    # A queued AT command. string is written followed by CRLF, payload (if any) is
+    # written raw instead. The command finishes when a line matching end arrives,
+    # fails on a line containing any of errors or when timeout (seconds) expires.
+
+    def __init__(self, string, end='OK', timeout=3, payload=None, errors=('ERROR',)):
+        self.string = string
+        self.end = end
+        self.timeout = timeout
+        self.payload = payload
+        self.errors = errors
+
+        self.lines = []
+        self.done = False
+        self.error = None
+        self.deadline = None
+        self.pre_end = True
+
+    @property
+    def output(self):
+        return ''.join(self.lines)
+
+
+class ATEngine(object):
+    # Non-blocking AT command engine. Commands are queued and written one at a time,
+    # received bytes are split into lines incrementally and matched against the running
+    # command, lines starting with a registered prefix are also dispatched to their URC
+    # handlers. Drive it by calling poll() from a loop, or run it as a uasyncio task.
+
+    def __init__(self, uart):
+        self.uart = uart
+        self.queue = []
+        self.current = None
+        self.buffer = bytearray()
+        self.urc_handlers = []
+
+    def on_urc(self, prefix, handler):
+        # handler(line) is called for every received line starting with prefix
+        self.urc_handlers.append((prefix, handler))
+
+    def submit(self, command):
+        self.queue.append(command)
+        return command
+
+    def reset(self):
+        # Drop queued commands and anything left unread, e.g. after an error
+        self.queue = []
+        self.current = None
+        self.buffer = bytearray()
+        self.uart.read()
+
+    def busy(self):
+        return self.current is not None or len(self.queue) > 0
+
+    def _start(self, command):
+        self.current = command
+        command.deadline = ticks_add(ticks_ms(), int(command.timeout * 1000))
+        if command.payload is not None:
+            self.uart.write(command.payload)
+        else:
+            command_string_for_at = "{}\r\n".format(command.string)
+            logger.debug('Writing AT command "{}"'.format(command_string_for_at.encode('utf-8')))
+            self.uart.write(command_string_for_at)
+
+    def _finish(self, error=None):
+        command = self.current
+        command.error = error
+        command.done = True
+        self.current = None
+
+    def _handle_line(self, line):
+        logger.debug('Read "{}"'.format(line))
+        try:
+            line_str = line.decode('utf-8')
+        except UnicodeError:
+            # Most likely the echo of a binary CIPSEND payload
+            logger.debug('Skipping undecodable line "{}"'.format(line))
+            return
+
+        for prefix, handler in self.urc_handlers:
+            if line_str.startswith(prefix):
+                handler(line_str)
+
+        command = self.current
+        if command is None:
+            return
+
+        # Do we have an error?
+        for error in command.errors:
+            if error in line_str:
+                self._finish(GenericATError(f'Got generic AT error {line_str} from command {command.string}'))
+                return
+
+        # If we had a pre-end, do we have the expected end?
+        if line_str == '{}\r\n'.format(command.end):
+            logger.debug('Detected exact end')
+            self._finish()
+            return
+        if command.pre_end and line_str.startswith('{}'.format(command.end)):
+            logger.debug('Detected startwith end (and adding this line to the output too)')
+            command.lines.append(line_str)
+            self._finish()
+            return
+
+        # Do we have a pre-end?
+        command.pre_end = line_str == '\r\n'
+        command.lines.append(line_str)
+
+    def poll(self):
+        if self.current is None and self.queue:
+            self._start(self.queue.pop(0))
+
+        n = self.uart.any()
+        if n:
+            data = self.uart.read(n)
+            if data:
+                self.buffer.extend(data)
+
+        buf = self.buffer
+        while True:
+            idx = find(buf, b'\n')
+            if idx < 0:
+                break
+            line = bytes(buf[:idx + 1])
+            del buf[:idx + 1]
+            self._handle_line(line)
+            if self.current is None and self.queue:
+                self._start(self.queue.pop(0))
+
+        # The data prompt of CIPSEND is not terminated by a newline
+        command = self.current
+        if command is not None and command.end == '>' and buf and buf[0] == 0x3E:  # '>'
+            del buf[:2 if len(buf) > 1 and buf[1] == 0x20 else 1]  # '> '
+            self._finish()
+
+        if self.current is not None and ticks_diff(ticks_ms(), self.current.deadline) > 0:
+            command = self.current
+            self._finish(Exception('Timeout for command "{}" (timeout={})'.format(command.string, command.timeout)))
+
+    def wait(self, command, interval_ms=10):
+        # Blocking helper, polls until the command is done and raises its error
+        while not command.done:
+            self.poll()
+            if not command.done:
+                sleep_ms(interval_ms)
+        if command.error is not None:
+            raise command.error
+        return command.output
+
+    def execute(self, command):
+        return self.wait(self.submit(command))
+
+    async def run(self, interval_ms=10):
+        import uasyncio
+        while True:
+            self.poll()
+            await uasyncio.sleep_ms(interval_ms)
+
+
+class ATTask(object):
+    # Runs a multi-command sequence on an ATEngine without blocking. steps is a generator
+    # that yields an ATCommand to wait for (the finished command is sent back in, its
+    # error is thrown in) or a number of ms to pause. Call poll() until it returns True,
+    # a failed step raises out of poll().
+
+    def __init__(self, engine, steps):
+        self.engine = engine
+        self.steps = steps
+        self.waiting = None
+        self.resume_at = None
+        self.done = False
+
+    def poll(self):
+        if self.done:
+            return True
+        self.engine.poll()
+        command = self.waiting
+        if command is not None and not command.done:
+            return False
+        if self.resume_at is not None and ticks_diff(ticks_ms(), self.resume_at) < 0:
+            return False
+
+        self.waiting = None
+        self.resume_at = None
+        try:
+            if command is not None and command.error is not None:
+                step = self.steps.throw(command.error)
+            else:
+                step = self.steps.send(command)
+        except StopIteration:
+            self.done = True
+            return True
+
+        if isinstance(step, ATCommand):
+            self.waiting = self.engine.submit(step)
+        else:
+            self.resume_at = ticks_add(ticks_ms(), step)
+        return False
+
+    def wait(self, interval_ms=10):
+        # Blocking helper
+        while not self.poll():
+            sleep_ms(interval_ms)
+
+
+# Command name -> (string, timeout in seconds, expected end). "{}" in the string is replaced by
+# the command data. Not the best approach ever, but works nicely.
+COMMANDS = {
+    'modeminfo': ('ATI', 3, 'OK'),
+    'fwrevision': ('AT+CGMR', 3, 'OK'),
+    'battery': ('AT+CBC', 3, 'OK'),
+    'scan': ('AT+COPS=?', 60, 'OK'),
+    'network': ('AT+COPS?', 3, 'OK'),
+    'networkset': ('AT+COPS=1,1,"TELE2"', 120, 'OK'),
+    'signal': ('AT+CSQ', 3, 'OK'),
+    'checkreg': ('AT+CREG?', 3, None),
+    'setapn': ('AT+SAPBR=3,1,"APN","{}"', 3, 'OK'),
+    'setuser': ('AT+SAPBR=3,1,"USER","{}"', 3, 'OK'),
+    'setpwd': ('AT+SAPBR=3,1,"PWD","{}"', 3, 'OK'),
+    'initgprs': ('AT+SAPBR=3,1,"Contype","GPRS"', 3, 'OK'),
+    # Appeared on hologram net here or below
+    'opengprs': ('AT+SAPBR=1,1', 3, 'OK'),
+    'getbear': ('AT+SAPBR=2,1', 10, 'OK'),
+    'inithttp': ('AT+HTTPINIT', 3, 'OK'),
+    'sethttp': ('AT+HTTPPARA="CID",1', 3, 'OK'),
+    'checkssl': ('AT+CIPSSL=?', 3, 'OK'),
+    'enablessl': ('AT+HTTPSSL=1', 3, 'OK'),
+    'disablessl': ('AT+HTTPSSL=0', 3, 'OK'),
+    'initurl': ('AT+HTTPPARA="URL","{}"', 3, 'OK'),
+    'doget': ('AT+HTTPACTION=0', 3, '+HTTPACTION'),
+    'setcontent': ('AT+HTTPPARA="CONTENT","{}"', 3, 'OK'),
+    # "data" is data_lenght in this context, while 5000 is the timeout
+    'postlen': ('AT+HTTPDATA={},5000', 3, 'DOWNLOAD'),
+    'dumpdata': ('{}', 1, 'OK'),
+    'dopost': ('AT+HTTPACTION=1', 3, '+HTTPACTION'),
+    'getdata': ('AT+HTTPREAD', 3, 'OK'),
+    'closehttp': ('AT+HTTPTERM', 3, 'OK'),
+    'closebear': ('AT+SAPBR=0,1', 3, 'OK'),
+    'debug': ('AT+CMEE=1', 5, 'OK'),
+    'opentcp': ('AT+CIPSTART="TCP",{}', 15, 'CONNECT OK'),
+    'sendtcp': ('AT+CIPSEND', 15, '>'),
+    'closetcp': ('AT+CIPCLOSE', 15, 'CLOSE OK'),
+}
+
+# CIPSTART answers OK right away and CONNECT OK / CONNECT FAIL once the connection is up or not
+CIPSTART_ERRORS = ('CONNECT FAIL', 'ERROR')
+TRANSPORT_TCP = 'TCP'
+TRANSPORT_UDP = 'UDP'
+
+# getbear attempts after opengprs, a second apart
+CONNECT_IP_RETRIES = 5
+
+# References:
+# https://github.com/olablt/micropython-sim800/blob/4d181f0c5d678143801d191fdd8a60996211ef03/app_sim.py
+# https://arduino.stackexchange.com/questions/23878/what-is-the-proper-way-to-send-data-through-http-using-sim908
+# https://stackoverflow.com/questions/35781962/post-api-rest-with-at-commands-sim800
+# https://arduino.stackexchange.com/questions/34901/http-post-request-in-json-format-using-sim900-module (full post example)
+
+
 class Modem(object):
 
     def __init__(self, uart=None, MODEM_PWKEY_PIN=None, MODEM_RST_PIN=None, MODEM_POWER_ON_PIN=None, MODEM_TX_PIN=None,
@@ -49,6 +310,7 @@ class Modem(object):
 
         # Uart
         self.uart = uart
+        self.engine = ATEngine(uart) if uart else None
 
         self.initialized = False
         self.modem_info = None
@@ -81,6 +343,7 @@ class Modem(object):
 
             # Setup UART
             self.uart = UART(1, 9600, timeout=1000, rx=self.MODEM_TX_PIN, tx=self.MODEM_RX_PIN)
+            self.engine = ATEngine(self.uart)
 
         # Test AT commands
         retries = 0
@@ -109,124 +372,33 @@ class Modem(object):
     # Execute AT commands
     # ----------------------
     def execute_at_command(self, command, data=None, clean_output=True):
+        at_command = self.engine.submit(self.at_command(command, data))
+        self.engine.wait(at_command)
+        return self.command_output(at_command, command, clean_output)
 
-        # Commands dictionary. Not the best approach ever, but works nicely.
-        commands = {
-            'modeminfo': {'string': 'ATI', 'timeout': 3, 'end': 'OK'},
-            'fwrevision': {'string': 'AT+CGMR', 'timeout': 3, 'end': 'OK'},
-            'battery': {'string': 'AT+CBC', 'timeout': 3, 'end': 'OK'},
-            'scan': {'string': 'AT+COPS=?', 'timeout': 60, 'end': 'OK'},
-            'network': {'string': 'AT+COPS?', 'timeout': 3, 'end': 'OK'},
-            'networkset': {'string': f'AT+COPS=1,1,"TELE2"', 'timeout': 120, 'end': 'OK'},
-            'signal': {'string': 'AT+CSQ', 'timeout': 3, 'end': 'OK'},
-            'checkreg': {'string': 'AT+CREG?', 'timeout': 3, 'end': None},
-            'setapn': {'string': 'AT+SAPBR=3,1,"APN","{}"'.format(data), 'timeout': 3, 'end': 'OK'},
-            'setuser': {'string': 'AT+SAPBR=3,1,"USER","{}"'.format(data), 'timeout': 3, 'end': 'OK'},
-            'setpwd': {'string': 'AT+SAPBR=3,1,"PWD","{}"'.format(data), 'timeout': 3, 'end': 'OK'},
-            'initgprs': {'string': 'AT+SAPBR=3,1,"Contype","GPRS"', 'timeout': 3, 'end': 'OK'},
-            # Appeared on hologram net here or below
-            'opengprs': {'string': 'AT+SAPBR=1,1', 'timeout': 3, 'end': 'OK'},
-            'getbear': {'string': 'AT+SAPBR=2,1', 'timeout': 10, 'end': 'OK'},
-            'inithttp': {'string': 'AT+HTTPINIT', 'timeout': 3, 'end': 'OK'},
-            'sethttp': {'string': 'AT+HTTPPARA="CID",1', 'timeout': 3, 'end': 'OK'},
-            'checkssl': {'string': 'AT+CIPSSL=?', 'timeout': 3, 'end': 'OK'},
-            'enablessl': {'string': 'AT+HTTPSSL=1', 'timeout': 3, 'end': 'OK'},
-            'disablessl': {'string': 'AT+HTTPSSL=0', 'timeout': 3, 'end': 'OK'},
-            'initurl': {'string': 'AT+HTTPPARA="URL","{}"'.format(data), 'timeout': 3, 'end': 'OK'},
-            'doget': {'string': 'AT+HTTPACTION=0', 'timeout': 3, 'end': '+HTTPACTION'},
-            'setcontent': {'string': 'AT+HTTPPARA="CONTENT","{}"'.format(data), 'timeout': 3, 'end': 'OK'},
-            'postlen': {'string': 'AT+HTTPDATA={},5000'.format(data), 'timeout': 3, 'end': 'DOWNLOAD'},
-            # "data" is data_lenght in this context, while 5000 is the timeout
-            'dumpdata': {'string': data, 'timeout': 1, 'end': 'OK'},
-            'dopost': {'string': 'AT+HTTPACTION=1', 'timeout': 3, 'end': '+HTTPACTION'},
-            'getdata': {'string': 'AT+HTTPREAD', 'timeout': 3, 'end': 'OK'},
-            'closehttp': {'string': 'AT+HTTPTERM', 'timeout': 3, 'end': 'OK'},
-            'closebear': {'string': 'AT+SAPBR=0,1', 'timeout': 3, 'end': 'OK'},
-            'debug': {'string': 'AT+CMEE=1', 'timeout': 5, 'end': 'OK'},
-            'opentcp': {'string': 'AT+CIPSTART="TCP",{}'.format(data), 'timeout': 15, 'end': 'CONNECT OK'},
-            'sendtcp': {'string': 'AT+CIPSEND', 'timeout': 15, 'end': '> '},
-            'closetcp': {'string': 'AT+CIPCLOSE', 'timeout': 15, 'end': 'CLOSE OK'},
-        }
-
-        # References:
-        # https://github.com/olablt/micropython-sim800/blob/4d181f0c5d678143801d191fdd8a60996211ef03/app_sim.py
-        # https://arduino.stackexchange.com/questions/23878/what-is-the-proper-way-to-send-data-through-http-using-sim908
-        # https://stackoverflow.com/questions/35781962/post-api-rest-with-at-commands-sim800
-        # https://arduino.stackexchange.com/questions/34901/http-post-request-in-json-format-using-sim900-module (full post example)
+    def at_command(self, command, data=None):
+        # The ATCommand for a COMMANDS entry
 
         # Sanity checks
-        if command not in commands:
+        if command not in COMMANDS:
             raise Exception('Unknown command "{}"'.format(command))
 
         # Support vars
-        command_string = commands[command]['string']
-        excpected_end = commands[command]['end']
-        timeout = commands[command]['timeout']
-        processed_lines = 0
+        command_string, timeout, excpected_end = COMMANDS[command]
+        if '{}' in command_string:
+            command_string = command_string.format(data)
 
-        # Execute the AT command
-        command_string_for_at = "{}\r\n".format(command_string)
-        logger.debug('Writing AT command "{}"'.format(command_string_for_at.encode('utf-8')))
-        self.uart.write(command_string_for_at)
-
-        # Support vars
-        pre_end = True
-        output = ''
-        empty_reads = 0
+        return ATCommand(command_string, excpected_end, timeout)
 
-        while True:
-
-            line = self.uart.readline()
-            if not line and excpected_end != '> ':
-                time.sleep(1)
-                empty_reads += 1
-                if empty_reads > timeout:
-                    raise Exception('Timeout for command "{}" (timeout={})'.format(command, timeout))
-                    # logger.warning('Timeout for command "{}" (timeout={})'.format(command, timeout))
-                    # break
-            else:
-                logger.debug('Read "{}"'.format(line))
-
-                # Convert line to string
-                try:
-                    line_str = line.decode('utf-8')
-                except UnicodeError:
-                    print(line)
-                    raise Exception('Error decoding line "{}"'.format(line))
-                except:
-                    line_str = self.uart.read()
-
-                # Do we have an error?
-                if 'ERROR' in line_str:
-                    raise GenericATError(f'Got generic AT error {line_str} from command {command_string_for_at}')
-
-                # If we had a pre-end, do we have the expected end?
-                if line_str == '{}\r\n'.format(excpected_end):
-                    logger.debug('Detected exact end')
-                    break
-                if pre_end and line_str.startswith('{}'.format(excpected_end)):
-                    logger.debug('Detected startwith end (and adding this line to the output too)')
-                    output += line_str
-                    break
-
-                # Do we have a pre-end?
-                if line_str == '\r\n':
-                    pre_end = True
-                    logger.debug('Detected pre-end')
-                else:
-                    pre_end = False
-
-                # Keep track of processed lines and stop if exceeded
-                processed_lines += 1
-
-                # Save this line unless in particular conditions
-                if command == 'getdata' and line_str.startswith('+HTTPREAD:'):
-                    pass
-                else:
-                    output += line_str
+    def command_output(self, at_command, command, clean_output=True):
+        # Save the lines unless in particular conditions
+        if command == 'getdata':
+            output = ''.join([l for l in at_command.lines if not l.startswith('+HTTPREAD:')])
+        else:
+            output = at_command.output
 
         # Remove the command string from the output
-        output = output.replace(command_string + '\r\r\n', '')
+        output = output.replace(at_command.string + '\r\r\n', '')
 
         # ..and remove the last \r\n added by the AT protocol
         if output.endswith('\r\n'):
@@ -295,7 +467,10 @@ class Modem(object):
         return signal_ratio
 
     def get_ip_addr(self):
-        output = self.execute_at_command('getbear')
+        return self.parse_ip_addr(self.execute_at_command('getbear'))
+
+    @staticmethod
+    def parse_ip_addr(output):
         output = output.split('+')[-1]  # Remove potential leftovers in the buffer before the "+SAPBR:" response
         pieces = output.split(',')
         if len(pieces) != 3:
@@ -308,49 +483,48 @@ class Modem(object):
         return ip_addr
 
     def connect(self, apn, user='', pwd=''):
+        ATTask(self.engine, self.connect_steps(apn, user, pwd)).wait()
+
+    def connect_steps(self, apn, user='', pwd=''):
+        # connect() as ATTask steps, so a caller can bring the bearer up without blocking
         if not self.initialized:
             raise Exception('Modem is not initialized, cannot connect')
 
         # Are we already connected?
-        if self.get_ip_addr():
+        command = yield self.at_command('getbear')
+        if self.parse_ip_addr(self.command_output(command, 'getbear')):
             logger.debug('Modem is already connected, not reconnecting.')
             return
 
         # Closing bearer if left opened from a previous connect gone wrong:
         logger.debug('Trying to close the bearer in case it was left open somehow..')
         try:
-            self.execute_at_command('closebear')
+            yield self.at_command('closebear')
         except GenericATError:
             pass
 
         # First, init gprs
         logger.debug('Connect step #1 (initgprs)')
-        self.execute_at_command('initgprs')
+        yield self.at_command('initgprs')
 
         # Second, set the APN
         logger.debug('Connect step #2 (setapn)')
-        self.execute_at_command('setapn', apn)
-        self.execute_at_command('setuser', user)
-        self.execute_at_command('setpwd', pwd)
+        yield self.at_command('setapn', apn)
+        yield self.at_command('setuser', user)
+        yield self.at_command('setpwd', pwd)
 
         # Then, open the GPRS connection.
         logger.debug('Connect step #3 (opengprs)')
-        self.execute_at_command('opengprs')
+        yield self.at_command('opengprs')
 
         # Ok, now wait until we get a valid IP address
-        retries = 0
-        max_retries = 5
-        while True:
-            retries += 1
-            ip_addr = self.get_ip_addr()
-            if not ip_addr:
-                retries += 1
-                if retries > max_retries:
-                    raise Exception('Cannot connect modem as could not get a valid IP address')
-                logger.debug('No valid IP address yet, retrying... (#')
-                time.sleep(1)
-            else:
-                break
+        for retries in range(CONNECT_IP_RETRIES):
+            command = yield self.at_command('getbear')
+            if self.parse_ip_addr(self.command_output(command, 'getbear')):
+                return
+            logger.debug('No valid IP address yet, retrying... (#{})'.format(retries + 1))
+            yield 1000
+        raise Exception('Cannot connect modem as could not get a valid IP address')
 
     def disconnect(self):
 
@@ -446,70 +620,55 @@ class Modem(object):
         return Response(status_code=response_status_code, content="")
 
     def open_tcp(self, host, port):
-        logger.debug('Opening TCP connection to {}:{}'.format(host, port))
-        # self.execute_at_command('opentcp', f'"{host}","{port}"')
-        self.uart.write(b'AT+CIPSTART="TCP","{}","{}"\r\n'.format(host, port))
-        self.uart.flush()
-        n = 10
-        while True:
-            l = self.uart.readline()
-            if l:
-                if b'CONNECT OK' in l:
-                    break
-                if b'ERROR' in l:
-                    raise Exception('Error connecting to TCP')
-            time.sleep(1)
-            n -= 1
-            if n == 0:
-                break
-                raise Exception('Timeout while connecting to TCP')
-
+        ATTask(self.engine, self.open_steps(TRANSPORT_TCP, host, port)).wait()
         return True
 
+    def open_steps(self, transport, host, port):
+        # Opens a TCP connection or UDP socket (TRANSPORT_TCP / TRANSPORT_UDP) as ATTask steps
+        logger.debug('Opening {} connection to {}:{}'.format(transport, host, port))
+        # Quick send mode for UDP: CIPSEND answers DATA ACCEPT as soon as the data is buffered
+        # instead of waiting for SEND OK. TCP waits for SEND OK. Must be set before CIPSTART.
+        yield ATCommand('AT+CIPQSEND={}'.format(1 if transport == TRANSPORT_UDP else 0), 'OK', 3)
+        yield ATCommand('AT+CIPSTART="{}","{}","{}"'.format(transport, host, port), 'CONNECT OK', 15,
+                        errors=CIPSTART_ERRORS)
+
     def send_tcp(self, data):
         logger.debug('Sending TCP')
-        self.uart.write(b'AT+CIPSEND\r\n')
-        self.uart.flush()
-        n = 500
-        while True:
-            r = self.uart.read()
-            if r and b'>' in r:
-                break
-            time.sleep(0.01)
-            n -= 1
-            if n == 0:
-                break
-                raise Exception('Timeout while sending TCP')
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        # With a fixed length no Ctrl-Z is needed, so binary frames may contain 0x1A (end) and 0x1B (abort)
+        self.engine.execute(ATCommand('AT+CIPSEND={}'.format(len(data)), '>', 5))
+        self.engine.execute(ATCommand(None, 'SEND OK', 5, payload=bytes(data), errors=('ERROR', 'CLOSED')))
 
-        # Write data
-        self.uart.write(data)
-        # Flush
-        self.uart.flush()
-        self.uart.write(b'\x1a')
-        self.uart.flush()
-        r = b""
-        n = 500
-        while True:
-            d = self.uart.readline()
-            if d:
-                r += d
-            if b'SEND OK' in r:
-                break
-            if b'ERROR' in r or b'CLOSED' in r:
-                raise Exception('Error sending TCP')
-            n -= 1
-            if n == 0:
-                print("timed out")
-                break
-                raise Exception('Timeout while sending TCP')
+        return True
+
+    def open_udp(self, host, port):
+        ATTask(self.engine, self.open_steps(TRANSPORT_UDP, host, port)).wait()
+        return True
 
-            time.sleep(0.01)
+    def send_udp(self, data):
+        logger.debug('Sending UDP')
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        # With a fixed length no Ctrl-Z is needed, so any byte can be sent
+        self.engine.execute(ATCommand('AT+CIPSEND={}'.format(len(data)), '>', 5))
+        self.engine.execute(ATCommand(None, 'DATA ACCEPT', 5, payload=bytes(data), errors=('ERROR', 'CLOSED')))
 
         return True
 
+    def close_udp(self):
+        self.close_tcp()
+
     def close_tcp(self):
+        ATTask(self.engine, self.close_steps()).wait()
+
+    def close_steps(self):
         logger.debug('Closing TCP connection')
+        # Abort a CIPSEND left waiting for data, then close. Waits for the reply so the next
+        # command doesn't queue behind CIPCLOSE, ERROR means there was nothing to close.
         self.uart.write(b'\x1a')
         self.uart.flush()
-        self.uart.write(b'AT+CIPCLOSE\r\n')
-        self.uart.flush()
+        try:
+            yield ATCommand('AT+CIPCLOSE', 'CLOSE OK', 15)
+        except GenericATError:
+            pass
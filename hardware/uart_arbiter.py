@@ -0,0 +1,180 @@
+import _thread
+
+import machine
+import utime
+
+from compat import find
+
+# Bytes buffered per consumer, the oldest are dropped when a consumer falls behind
+QUEUE_SIZE = 1024
+# Driver RX buffer, holds ~1 s at 9600 baud between two polls
+RX_BUFFER_SIZE = 1024
+
+
+class UARTArbiter:
+    # Owns one UART peripheral shared by several devices. One port owns TX, the RX pin
+    # is routed to one port at a time and what arrives is queued for that port only, so
+    # a device draining its own RX can't swallow another one's bytes.
+    def __init__(self, uart_id, baudrate=9600, tx=None, rx=None, rxbuf=RX_BUFFER_SIZE):
+        self.uart = machine.UART(uart_id, baudrate=baudrate, tx=machine.Pin(tx), rx=machine.Pin(rx), rxbuf=rxbuf)
+        self.rx_pin = rx
+        self.lock = _thread.allocate_lock()
+        self.scratch = bytearray(256)
+        self.scratch_view = memoryview(self.scratch)
+
+        self.ports = []
+        self.tx_owner = None
+        self.rx_owner = None
+
+        self.switches = 0
+        self.discarded = 0  # bytes received while RX was routed to nobody
+
+    def port(self, name, rx=None, tx=False, size=QUEUE_SIZE):
+        # A machine.UART lookalike for one device, rx is the pin its TX is wired to
+        port = UARTPort(self, name, rx, size)
+        if tx:
+            if self.tx_owner is not None:
+                raise Exception(f'UART TX already owned by {self.tx_owner.name}')
+            self.tx_owner = port
+        self.ports.append(port)
+        return port
+
+    def route_rx(self, port):
+        # Sends what arrives from now on to `port`, only the RX pin is reconfigured
+        with self.lock:
+            self._pump()
+            if port is not None and port.rx_pin != self.rx_pin:
+                if port.rx_pin is None:
+                    raise Exception(f'{port.name} has no RX pin')
+                self.uart.init(rx=machine.Pin(port.rx_pin))
+                self.rx_pin = port.rx_pin
+                self.switches += 1
+            self.rx_owner = port
+
+    def release(self, port):
+        with self.lock:
+            self._pump()
+            if self.tx_owner is port:
+                self.tx_owner = None
+            if self.rx_owner is port:
+                self.rx_owner = None
+            if port in self.ports:
+                self.ports.remove(port)
+
+    def pump(self):
+        with self.lock:
+            self._pump()
+
+    def _pump(self):
+        # Moves everything the driver holds into the RX owner's queue, never blocks
+        while True:
+            waiting = self.uart.any()
+            if not waiting:
+                return
+            n = self.uart.readinto(self.scratch_view, min(waiting, len(self.scratch)))
+            if not n:
+                return
+            if self.rx_owner is None:
+                self.discarded += n
+            else:
+                self.rx_owner.put(self.scratch_view[:n])
+
+
+class UARTPort:
+    # The part of machine.UART the device drivers use, served from the port's own queue
+    def __init__(self, arbiter, name, rx_pin, size):
+        self.arbiter = arbiter
+        self.name = name
+        self.rx_pin = rx_pin
+        self.size = size
+        self.queue = bytearray()
+        self.overflows = 0  # bytes dropped because the consumer fell behind
+
+        # machine.UART semantics: wait up to timeout ms for the first byte and timeout_char ms
+        # between the following ones, only while this port owns RX
+        self.timeout = 0
+        self.timeout_char = 0
+
+    def put(self, data):
+        # Called by the arbiter with its lock held
+        queue = self.queue
+        queue.extend(data)
+        if len(queue) > self.size:
+            drop = len(queue) - self.size
+            self.overflows += drop
+            self.queue = queue[drop:]
+
+    def init(self, timeout=None, timeout_char=None, **kwargs):
+        # Timeouts are per port, line settings are shared and only the TX owner may change them
+        if timeout is not None:
+            self.timeout = timeout
+        if timeout_char is not None:
+            self.timeout_char = timeout_char
+        if kwargs:
+            if self.arbiter.tx_owner is not self:
+                raise Exception(f'{self.name} does not own the UART, can not change {", ".join(kwargs)}')
+            with self.arbiter.lock:
+                self.arbiter.uart.init(**kwargs)
+
+    def deinit(self):
+        self.arbiter.release(self)
+
+    def claim_rx(self):
+        self.arbiter.route_rx(self)
+
+    def any(self):
+        self.arbiter.pump()
+        return len(self.queue)
+
+    def _wait(self, n):
+        # Pumps until n bytes are queued (any number for None) or the timeouts run out
+        arbiter = self.arbiter
+        arbiter.pump()
+        if arbiter.rx_owner is not self or not self.timeout:
+            return
+        have = len(self.queue)
+        last = utime.ticks_ms()
+        while n is None or have < n:
+            utime.sleep_ms(1)
+            arbiter.pump()
+            now = utime.ticks_ms()
+            if len(self.queue) != have:
+                have = len(self.queue)
+                last = now
+            elif utime.ticks_diff(now, last) >= (self.timeout_char if have else self.timeout):
+                return
+
+    def _take(self, n):
+        with self.arbiter.lock:
+            queue = self.queue
+            if n is None or n >= len(queue):
+                self.queue = bytearray()
+                return bytes(queue)
+            data = bytes(queue[:n])
+            self.queue = queue[n:]
+            return data
+
+    def read(self, n=None):
+        self._wait(n)
+        if not self.queue:
+            return None
+        return self._take(n)
+
+    def readinto(self, buf, n=None):
+        n = len(buf) if n is None else min(n, len(buf))
+        self._wait(n)
+        if not self.queue:
+            return None
+        data = self._take(n)
+        buf[:len(data)] = data
+        return len(data)
+
+    def readline(self):
+        self.arbiter.pump()
+        i = find(self.queue, b'\n')
+        return self.read(i + 1 if i >= 0 else None)
+
+    def write(self, data):
+        if self.arbiter.tx_owner is not self:
+            raise Exception(f'{self.name} does not own UART TX')
+        return self.arbiter.uart.write(data)
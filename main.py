@@ -4,10 +4,16 @@ import machine
 import utime
 
 import datapacker
+import framing
 import log
-from communication import radio433, gsm
+from communication import radio433, gsm, frame_queue, multirate
 from modules import onboard_logger, gps, ahrs
-from hardware import bmp280, bme280, ms5611, battery, clock, bh1750, PiicoDev_ENS160
+from hardware import bmp280, bme280, ms5611, battery, clock, bh1750, PiicoDev_ENS160, uart_arbiter
+
+# E220 AUX pin. None until the harness wiring is confirmed, frames are then released on
+# the time on air estimate. A wrong or floating AUX pin releases frames early or stalls
+# every frame until the AUX timeout.
+RADIO_AUX_PIN = None
 
 log = log.Logger()
 log.log('Logging started', 'blue')
@@ -16,7 +22,7 @@ led = machine.Pin(15, machine.Pin.OUT)
 battery = battery.Battery()
 log.log('RTC and battery initialized', 'green')
 
-onboard_logger = onboard_logger.OnboardLogger(datapacker)
+onboard_logger = onboard_logger.OnboardLogger(datapacker, profile='log-everything')
 
 if battery.voltage() < 3:
     log.log('Battery voltage low, expecting USB power', 'blue')
@@ -34,7 +40,10 @@ i2c_secondary = machine.I2C(1, scl=machine.Pin(5), sda=machine.Pin(3))
 log.log(f'Got following I2C devices on secondary bus: {", ".join([str(hex(i)) for i in i2c_secondary.scan()])}', 'blue')
 
 gsm_uart = machine.UART(0, tx=machine.Pin(17), rx=machine.Pin(16))
-gsm = gsm.GSM(gsm_uart, datapacker)
+# Send 5 frames a second, batched into one CIPSEND every 2 s. Batches sent during an outage
+# are kept on flash (64 batches, ~94 KB) and resent oldest first once the link is back
+gsm = gsm.GSM(gsm_uart, datapacker, profile='gsm-full', batch_frames=10, batch_ms=2000, sample_ms=200,
+              queue=frame_queue.FrameQueue('gsm_queue.bin', slots=64))
 
 ahrs = ahrs.AHRS(i2c_main, clock)
 
@@ -48,12 +57,29 @@ bme = bme280.BME280(i2c=i2c_secondary, mode=4)
 # ens160 = PiicoDev_ENS160.PiicoDev_ENS160(bus=i2c_secondary)
 
 log.log('Sensors initialized', 'green')
-radio_uart = machine.UART(1, baudrate=9600, tx=machine.Pin(33), rx=machine.Pin(34))
-radio433 = radio433.Radio433(radio_uart, datapacker)
-
-log.log('Switch UART to tx for radio and rx for GPS', 'blue')
-radio_uart = machine.UART(1, baudrate=9600, tx=machine.Pin(33), rx=machine.Pin(38))
-gps = gps.GPS(radio_uart, datapacker)
+# UART1 is shared: TX (33) goes to the radio, RX is switched from the radio (34) to the GPS (38)
+# once the radio is configured. Each device gets its own port and RX queue.
+uart1 = uart_arbiter.UARTArbiter(1, baudrate=9600, tx=33, rx=34)
+radio_uart = uart1.port('radio', rx=34, tx=True)
+gps_uart = uart1.port('gps', rx=38)
+radio_uart.claim_rx()
+# Binary frames save the base64 overhead on the 9600 baud UART and LoRa airtime
+# Frames go out once the previous one's estimated time on air has passed (on AUX with RADIO_AUX_PIN),
+# keeping to the 10% EU duty cycle (airtime.DUTY_CYCLE_EU_433, the Radio433 default).
+# A parity frame per 4 frames, interleaved 4 deep, lets the ground rebuild frames lost in short bursts.
+# Environment data goes out every 5 s, attitude frames take the rest of the airtime.
+radio433 = radio433.Radio433(radio_uart, datapacker, mode=framing.MODE_BINARY, bitpack=True,
+                             aux_pin=RADIO_AUX_PIN, fec_group=4, fec_depth=4, lanes=[
+                                 multirate.Lane('radio-environment', 5000, priority=0),
+                                 multirate.Lane('radio-attitude', 0, priority=1),
+                             ])
+
+log.log('Switch UART RX to GPS', 'blue')
+gps_uart.claim_rx()
+# The GPS only gets configured (gps.PROTOCOL_PMTK / PROTOCOL_UBX) with its RX wired to a UART TX.
+# Here TX pin 33 goes to the radio, which would send the commands over the air, so the
+# receiver keeps its default output and the parser skips everything but GGA and RMC.
+gps = gps.GPS(gps_uart, datapacker)
 
 # Run radio loop in a separate thread to not block the main loop,
 # use main loop only for sampling sensors and saving onboard
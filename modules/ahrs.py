@@ -1,61 +1,143 @@
 # AHRS using MPU6050 and magnetometer
+import _thread
 import math
 import utime
+from machine import Timer
 
-from algorithms.madgwickahrs import MadgwickAHRS
-from algorithms.quaternion import Quaternion
+from algorithms.madgwick import Madgwick
 from hardware.hmc5883l import HMC5883L
 from hardware.imu import MPU6050
+from log import Logger
 
-from algorithms.umatrix import matrix
+# Fusion rate. A hardware timer paces the loop, which waits on a lock in between so the
+# other threads get the CPU. sleep_ms() would busy-wait, holding the GIL, for anything
+# shorter than a FreeRTOS tick (10 ms on the ESP32), which is the whole wait at 100 Hz.
+RATE_HZ = 100
+AHRS_TIMER = 0
+# The HMC5883L updates its output at 15 Hz
+MAG_HZ = 15
+# The MPU6050 temperature only goes into the frames
+TEMP_HZ = 1
+# Seconds between rate, jitter and overrun statistics
+STATS_S = 10
+
+DEG_TO_RAD = math.pi / 180
 
 
 class AHRS:
-    def __init__(self, i2c, clock):
+    def __init__(self, i2c, clock, rate_hz=RATE_HZ, timer_id=AHRS_TIMER):
         self.mpu = MPU6050(i2c, device_addr=1, gyro_calibration=(1.797567, 0.06129264, 0.4031449),
                            accel_calibration=(5.30599 * (10 ** -5), -0.02539356, -0.02039746))
 
         self.accel = [0, 0, 0]
         self.gyro = [0, 0, 0]
         self.mag = [0, 0, 0]
+        self.mag_valid = False  # the last compass read succeeded
         self.pos = (0, 0, 0)
         self.temp = 0
 
         self.clock = clock
+        self.log = Logger('AHRS')
 
         self.compass = HMC5883L(i2c)
 
-        startqt = Quaternion(0.7071068, 0, 0, -0.7071068)
-
-        self.madgwick = MadgwickAHRS()
-
-    def update(self, t):
-        self.gyro = self.mpu.gyro.xyz  # in deg/s, convert to rad/s
-        self.accel = self.mpu.accel.xyz
-        self.temp = self.mpu.temperature
-
-        self.mag = self.get_mag()
-        # self.madgwick.update(matrix([[a * math.pi / 180 for a in self.gyro]]),
-        #                      matrix([[a for a in self.mpu.accel.xyz]]),
-        #                      matrix([[a] for a in self.mag]), t)
-        #
-        # self.pos = self.position()
-
-        # self.madgwick.update_imu(matrix([[a * math.pi / 180 for a in self.gyro]]), matrix([list(self.accel)]), t)
+        self.madgwick = Madgwick()
+
+        self.period_ms = 1000 // rate_hz
+        self.period_us = self.period_ms * 1000
+        # Read the magnetometer and temperature every this many cycles, log statistics every stats_cycles
+        self.mag_every = max(1, rate_hz // MAG_HZ)
+        self.temp_every = max(1, rate_hz // TEMP_HZ)
+        self.stats_cycles = STATS_S * rate_hz
+        self.cycles = 0
+        # Per statistics window: how late cycles started in us, cycles that ran past their period
+        # and timer ticks that came while one was still pending
+        self.jitter_sum = 0
+        self.jitter_max = 0
+        self.overruns = 0
+        self.skipped = 0
+
+        # Released by the timer once per period, the loop blocks on it
+        self.tick = _thread.allocate_lock()
+        self.tick.acquire()
+        self.timer = Timer(timer_id)
+
+    def update(self, dt):
+        # dt is the time since the previous update in seconds
+        gyro = self.gyro = self.mpu.gyro.xyz  # in deg/s, the filter takes rad/s
+        accel = self.accel = self.mpu.accel.xyz
+        if self.cycles % self.temp_every == 0:
+            self.temp = self.mpu.temperature
+        if self.cycles % self.mag_every == 0:
+            try:
+                self.mag = self.get_mag()
+                self.mag_valid = True
+            except Exception as e:
+                self.mag_valid = False
+                self.log.log(f'Got exception while reading compass: {e}', 'red')
+        mag = self.mag
+
+        gx, gy, gz = gyro[0] * DEG_TO_RAD, gyro[1] * DEG_TO_RAD, gyro[2] * DEG_TO_RAD
+        updated = self.mag_valid and self.madgwick.update(gx, gy, gz, accel[0], accel[1], accel[2],
+                                                          mag[0], mag[1], mag[2], dt)
+        if not updated:
+            # No (or an all zero) magnetometer reading, keep fusing gyro and accel without a heading
+            updated = self.madgwick.update_imu(gx, gy, gz, accel[0], accel[1], accel[2], dt)
+        if updated:
+            self.pos = self.position()
 
     def position(self):
         try:
-            x, y, z = self.madgwick.quaternion.to_euler_angles()
+            x, y, z = self.madgwick.to_euler_angles()
             return x * 180.0 / math.pi, y * 180.0 / math.pi, z * 180.0 / math.pi
         except:
             return 0, 0, 0
 
+    def on_tick(self, timer):
+        # Scheduled timer callback, wakes the loop
+        if self.tick.locked():
+            self.tick.release()
+        else:
+            self.skipped += 1
+
     def loop(self):
-        self.last_update = self.clock.millis()
+        period = self.period_us
+        stats_cycles = self.stats_cycles
+        self.timer.init(period=self.period_ms, mode=Timer.PERIODIC, callback=self.on_tick)
+        self.tick.acquire()
+        # deadline is when the cycle is due, one period after the previous one
+        last = deadline = window_start = utime.ticks_us()
         while True:
-            self.update(self.clock.millis() - self.last_update)
-            self.last_update = self.clock.millis()
-            utime.sleep_ms(1)
+            start = utime.ticks_us()
+            late = utime.ticks_diff(start, deadline)
+            self.jitter_sum += late
+            if late > self.jitter_max:
+                self.jitter_max = late
+
+            try:
+                self.update(utime.ticks_diff(start, last) / 1000000)
+            except Exception as e:
+                self.log.log(f'Got exception while reading data: {e}', 'red')
+            last = start
+            self.cycles += 1
+
+            if self.cycles % stats_cycles == 0:
+                elapsed = utime.ticks_diff(start, window_start)
+                window_start = start
+                self.log.log(f'{stats_cycles * 1000000 // elapsed} Hz, jitter avg {self.jitter_sum // stats_cycles} us '
+                             f'max {self.jitter_max} us, {self.overruns} overruns, {self.skipped} ticks skipped',
+                             'blue')
+                self.jitter_sum = self.jitter_max = self.overruns = self.skipped = 0
+
+            deadline = utime.ticks_add(deadline, period)
+            if utime.ticks_diff(deadline, utime.ticks_us()) < 0:
+                self.overruns += 1
+            # Ticks missed while behind are dropped in on_tick(), the filter integrates the measured dt
+            self.tick.acquire()
+            now = utime.ticks_us()
+            if utime.ticks_diff(now, deadline) > period:
+                # Fell behind by more than a tick, measure jitter from this one on
+                deadline = now
 
     def get_mag(self):
         f = self.compass.read()
@@ -1,27 +1,125 @@
+import struct
+
 import log
+from compat import find
 from hardware import micropyGPS
 import utime
 
+# parse() only needs GGA (position, altitude, satellites, HDOP), RMC is kept for date and speed
+SENTENCES = ('GGA', 'RMC')
+
+PROTOCOL_PMTK = 'pmtk'  # MediaTek (PA6H, L80, ...)
+PROTOCOL_UBX = 'ubx'  # u-blox (NEO-6M, NEO-M8N, ...)
+
+# UBX NMEA message ids (class 0xF0) that SENTENCES don't need
+_UBX_NMEA_OFF = (0x01, 0x02, 0x03, 0x05)  # GLL, GSA, GSV, VTG
+
+# A 1 Hz burst of every sentence a receiver outputs by default is ~600 bytes
+RX_BUFFER_SIZE = 1024
+# A sentence takes ~70 ms at 9600 baud, so a fix waits at most one poll after its line end
+POLL_MS = 10
+
+
+def pmtk(body):
+    # $<body>*<checksum>\r\n
+    crc = 0
+    for c in body.encode():
+        crc ^= c
+    return f'${body}*{crc:02X}\r\n'.encode()
+
+
+def ubx(msg_class, msg_id, payload=b''):
+    # UBX frame with its 8 bit Fletcher checksum
+    frame = struct.pack('<BBH', msg_class, msg_id, len(payload)) + payload
+    a = b = 0
+    for c in frame:
+        a = (a + c) & 0xFF
+        b = (b + a) & 0xFF
+    return b'\xb5\x62' + frame + bytes([a, b])
+
+
+def configuration(protocol, rate_ms=1000):
+    # Commands restricting the receiver output to GGA and RMC every rate_ms. At 9600 baud
+    # GGA + RMC (~150 bytes) fit up to 5 Hz.
+    if protocol == PROTOCOL_PMTK:
+        return [
+            # GLL, RMC, VTG, GGA, GSA, GSV, ... output every n fixes
+            pmtk('PMTK314,0,1,0,1,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0'),
+            pmtk(f'PMTK220,{rate_ms}'),
+        ]
+    if protocol == PROTOCOL_UBX:
+        # CFG-MSG off for every unneeded sentence, then CFG-RATE (measurement rate, 1 cycle, GPS time)
+        return [ubx(0x06, 0x01, bytes([0xF0, msg_id, 0])) for msg_id in _UBX_NMEA_OFF] + \
+            [ubx(0x06, 0x08, struct.pack('<HHH', rate_ms, 1, 1))]
+    raise Exception(f'Unknown GPS protocol {protocol}')
+
 
 class GPS:
-    def __init__(self, uart, datapacker):
+    def __init__(self, uart, datapacker, protocol=None, rate_ms=1000):
         self.uart = uart
         self.log = log.Logger("GPS")
         self.datapacker = datapacker
-        self.parser = micropyGPS.MicropyGPS(local_offset=3,
-                                            location_formatting="dd")  # offset for UTC+3, decimal degrees
+        self.parser = micropyGPS.MicropyGPS(local_offset=3, location_formatting="dd",
+                                            sentences=SENTENCES)  # offset for UTC+3, decimal degrees
+
+        # Received bytes, the unfinished line is kept at the front between calls
+        self.buffer = bytearray(RX_BUFFER_SIZE)
+        self.view = memoryview(self.buffer)
+        self.end = 0
+
+        # Needs the UART TX wired to the receiver's RX, see main.py
+        if protocol is not None:
+            self.configure(protocol, rate_ms)
 
         self.log.log('GPS initialized', 'green')
 
+    def configure(self, protocol, rate_ms=1000):
+        for command in configuration(protocol, rate_ms):
+            self.uart.write(command)
+            utime.sleep_ms(100)
+        self.log.log(f'GPS output set to {", ".join(SENTENCES)} every {rate_ms} ms', 'green')
+
+    def fill(self):
+        # Drains the UART into the buffer, returns the number of bytes read
+        waiting = self.uart.any()
+        if not waiting:
+            return 0
+        if self.end == len(self.buffer):
+            # A full buffer without a line end is garbage
+            self.end = 0
+        n = self.uart.readinto(self.view[self.end:], min(waiting, len(self.buffer) - self.end))
+        if not n:
+            return 0
+        self.end += n
+        return n
+
     def parse(self):
-        gps_data = {}
-        if self.uart.any():
-            line = self.uart.readline()
+        # Handles every complete line received since the last call, returns how many
+        if not self.fill():
+            return 0
+        buffer = self.buffer
+        start = lines = 0
+        while True:
+            nl = find(buffer, b'\n', start, self.end)
+            if nl < 0:
+                break
+            line = bytes(self.view[start:nl + 1])
+            start = nl + 1
+            lines += 1
+            try:
+                self.parser.update_sentence(line)
+            except Exception as e:
+                # A corrupted sentence that still passed the checksum, the rest of the burst is fine
+                self.log.log(f'Could not parse {line}: {e}', 'red')
 
-            for c in line:
-                self.parser.update(chr(c))
-            # print("got", line)
+        if start:
+            remaining = self.end - start
+            self.view[:remaining] = self.view[start:self.end]
+            self.end = remaining
 
+        if lines:
+            # The fix age is parser.time_since_fix(), lines are parsed as soon as a poll reads them
+            gps_data = {}
             gps_data["lat"] = self.parser.latitude[0]
             gps_data["lon"] = self.parser.longitude[0]
             gps_data["gps_sats"] = self.parser.satellites_in_use
@@ -29,14 +127,14 @@ class GPS:
             gps_data["gps_alt"] = self.parser.altitude
 
             self.datapacker.set_values(gps_data)
+        return lines
 
     def loop(self):
         self.log.log('Starting GPS loop', 'blue')
         while True:
             try:
                 self.parse()
-                utime.sleep_ms(20)
             except Exception as e:
-                self.log.log('GPS', f'Got exception while reading data: {e}', 'red')
+                self.log.log(f'Got exception while reading data: {e}', 'red')
                 utime.sleep_ms(1000)
-            utime.sleep_ms(10)
+            utime.sleep_ms(POLL_MS)
@@ -1,29 +1,67 @@
 import utime
 
+import bitpacker
+import delta
+import framing
 import log
 
 
 class OnboardLogger:
     # Onboard logging
     # Logs data to a file on the MCU
-    def __init__(self, datapacker):
+    def __init__(self, datapacker, mode=framing.MODE_TEXT, profile='log-everything',
+                 keyframe_interval=None, bitpack=False):
         self.log = log.Logger('Onboard')
         self.datapacker = datapacker
+        self.profile = profile
+
+        # Binary frames go to a separate file so onboard.log stays one base64 frame per line
+        if mode == framing.MODE_BINARY:
+            self.framer = framing.Framer()
+            self.path = 'onboard.bin'
+        else:
+            self.framer = None
+            self.path = 'onboard.log'
+
+        # Keyframe + delta encoding, binary mode only
+        self.delta = None
+        if self.framer is not None and keyframe_interval:
+            self.delta = delta.DeltaEncoder(datapacker.profiles[profile], keyframe_interval)
+
+        # Bit-packed payloads, binary mode only and not combined with deltas
+        self.bits = None
+        if self.framer is not None and bitpack:
+            if self.delta is not None:
+                raise Exception('Bit packing and delta encoding cannot be combined')
+            self.bits = bitpacker.profiles[profile]
 
         self.log.log('Onboard logging initialized', 'green')
 
     def clear_log(self):
-        open('onboard.log', 'w').close()
+        open(self.path, 'w').close()
+
+    def next_frame(self):
+        if self.framer is not None:
+            payload = self.datapacker.snapshot(self.profile)[1]
+            frame_type = self.datapacker.profiles[self.profile].type_id
+            if self.delta is not None:
+                payload = self.delta.encode(payload)
+                frame_type |= delta.DELTA_FLAG
+            elif self.bits is not None:
+                payload = self.bits.pack(payload)
+                frame_type |= bitpacker.BITPACK_FLAG
+            return self.framer.frame(payload, frame_type)
+        return self.datapacker.pack(profile=self.profile)
 
     def log_write(self, message):
-        with open('onboard.log', 'a') as f:
-            f.write(f'{message}')
+        with open(self.path, 'ab' if self.framer is not None else 'a') as f:
+            f.write(message)
 
     def loop(self):
         self.log.log('Starting onboard logging loop', 'blue')
         while True:
             utime.sleep_ms(950)
             try:
-                self.log_write(self.datapacker.pack())
+                self.log_write(self.next_frame())
             except Exception as e:
                 self.log.log(f'Error while logging: {e}', 'red')
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# Tests run on the host from the repository root layout, like the benchmarks
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
@@ -0,0 +1,77 @@
+# Scripted SIM800L UART for the AT engine and GSM tests. Every written command gets the
+# reply of the longest matching prefix in `replies`: bytes, a list of bytes used one per
+# call (the last one repeats) or a callable(data) returning bytes. Commands without a
+# reply get none, like a modem that doesn't answer. URCs are injected with inject().
+# With chunk set, read() hands out at most that many bytes per call.
+# CIPSEND payloads must match the length announced by CIPSEND=<n>, or contain no 0x1A/0x1B
+# before the closing Ctrl-Z, which the modem would take as end of data or abort.
+class FakeModemUART:
+    def __init__(self, replies=None, chunk=None):
+        self.replies = dict(replies or {})
+        self.chunk = chunk
+        self.written = []
+        self.rx = bytearray()
+        self.sent = []  # CIPSEND payloads
+        self.expected = None  # payload length announced by CIPSEND=<n>, or 0 for Ctrl-Z terminated
+        self.payload = None
+
+    def inject(self, data):
+        self.rx.extend(data)
+
+    def _reply(self, key, data):
+        reply = self.replies.get(key)
+        if isinstance(reply, list):
+            reply = reply.pop(0) if len(reply) > 1 else reply[0]
+        if callable(reply):
+            reply = reply(data)
+        if reply:
+            self.rx.extend(reply)
+
+    def write(self, data):
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        self.written.append(bytes(data))
+        if self.payload is not None:
+            if self.expected:
+                # Anything past the announced length would be read as AT commands
+                assert len(self.payload) + len(data) <= self.expected, 'CIPSEND payload longer than announced'
+            else:
+                # 0x1A ends the data and 0x1B aborts the send, wherever they are
+                assert b'\x1b' not in data, 'Unescaped 0x1B in a Ctrl-Z terminated payload'
+                assert b'\x1a' not in data[:-1], 'Unescaped 0x1A in a Ctrl-Z terminated payload'
+            self.payload.extend(data)
+            if self.expected and len(self.payload) == self.expected:
+                self._payload_done(bytes(self.payload))
+            elif not self.expected and self.payload[-1:] == b'\x1a':
+                self._payload_done(bytes(self.payload[:-1]))
+            return len(data)
+        if data == b'\x1a':
+            return 1
+        command = data.rstrip(b'\r\n')
+        if command.startswith(b'AT+CIPSEND'):
+            self.expected = int(command[11:]) if command.startswith(b'AT+CIPSEND=') else 0
+        keys = [k for k in self.replies if k != 'payload' and command.startswith(k.encode())]
+        if keys:
+            self._reply(max(keys, key=len), command)
+            if command.startswith(b'AT+CIPSEND') and self.rx.endswith(b'> '):
+                self.payload = bytearray()
+        return len(data)
+
+    def _payload_done(self, payload):
+        self.payload = None
+        self.sent.append(payload)
+        self._reply('payload', payload)
+
+    def flush(self):
+        pass
+
+    def any(self):
+        return min(len(self.rx), self.chunk or len(self.rx))
+
+    def read(self, n=None):
+        if not self.rx:
+            return None
+        n = self.any() if n is None else min(n, self.any())
+        data = bytes(self.rx[:n])
+        del self.rx[:n]
+        return data
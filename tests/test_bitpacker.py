@@ -0,0 +1,86 @@
+import random
+
+import pytest
+
+import bitpacker
+import datapacker
+
+
+def round_trip(schema, values):
+    bit = bitpacker.profiles[schema.name]
+    raw = bytes(schema.pack_into(values, bytearray(schema.size)))
+    packed = bit.pack(raw)
+    assert len(packed) == bit.size
+    return schema.unpack(raw), schema.unpack(bit.unpack(packed))
+
+
+def values_with(field, value):
+    values = [0] * len(datapacker.sequencing)
+    values[datapacker.sequencing.index(field)] = value
+    return values
+
+
+def in_range(schema):
+    # Declared min, max, middle and a few random values of every field
+    rng = random.Random(schema.type_id)
+    for field in schema.fields:
+        lo = datapacker.structure[field]['min']
+        hi = datapacker.structure[field]['max']
+        for value in [lo, hi, (lo + hi) / 2] + [rng.uniform(lo, hi) for _ in range(5)]:
+            yield field, value
+
+
+@pytest.mark.parametrize('name', list(datapacker.profiles))
+def test_agrees_with_schema_within_range(name):
+    schema = datapacker.profiles[name]
+    for field, value in in_range(schema):
+        expected, decoded = round_trip(schema, values_with(field, value))
+        # Schema.scale truncates to the multiplier's resolution, the bit-packed frame must keep exactly that
+        assert decoded == expected, (field, value)
+        assert abs(decoded[field] - value) <= 1 / schema.multipliers[schema.fields.index(field)]
+
+
+@pytest.mark.parametrize('name', list(datapacker.profiles))
+def test_all_fields_at_once(name):
+    schema = datapacker.profiles[name]
+    rng = random.Random(len(name))
+    values = [0] * len(datapacker.sequencing)
+    for field in schema.fields:
+        values[datapacker.sequencing.index(field)] = rng.uniform(datapacker.structure[field]['min'],
+                                                                 datapacker.structure[field]['max'])
+    expected, decoded = round_trip(schema, values)
+    assert decoded == expected
+
+
+@pytest.mark.parametrize('name', list(datapacker.profiles))
+def test_out_of_range_saturates(name):
+    schema = datapacker.profiles[name]
+    for n, field in enumerate(schema.fields):
+        lo = datapacker.structure[field]['min']
+        hi = datapacker.structure[field]['max']
+        step = 1 / schema.multipliers[n]
+        # Outside the declared range but still inside what the Schema's type can hold
+        if hi * schema.multipliers[n] + 10 <= schema.maxs[n]:
+            _, decoded = round_trip(schema, values_with(field, hi + 10 * step))
+            assert abs(decoded[field] - hi) <= step, field
+        if lo * schema.multipliers[n] - 10 >= schema.mins[n]:
+            _, decoded = round_trip(schema, values_with(field, lo - 10 * step))
+            assert abs(decoded[field] - lo) <= step, field
+
+
+class NoBitLength(int):
+    # An int without bit_length(), like on MicroPython
+    @property
+    def bit_length(self):
+        raise AttributeError('bit_length')
+
+
+def test_bit_width_without_bit_length():
+    for n in [0, 1, 2, 3, 127, 128, 255, 256, 180000000, 4294967295]:
+        assert bitpacker._bit_width(NoBitLength(n)) == max(n.bit_length(), 1)
+
+
+def test_schema_widths():
+    bit = bitpacker.profiles['gsm-full']
+    for n, field in enumerate(bit.schema.fields):
+        assert bit.highs[n] - bit.lows[n] < 1 << bit.bits[n] <= max(2 * (bit.highs[n] - bit.lows[n]), 2), field
@@ -0,0 +1,10 @@
+import compat
+
+
+def test_find_matches_bytes_find():
+    data = b'$GPGGA,1*4F\r\n$GPRMC\r\n\xa5\x5a\x00'
+    buf = bytearray(data)
+    for sub in (b'\n', b'$', b'\r\n', b'\xa5\x5a', b'\x00', b'missing', b'\x5a\x00\x01'):
+        for start in range(0, len(data) + 1, 3):
+            assert compat.find(buf, sub, start) == data.find(sub, start), (sub, start)
+            assert compat.find(memoryview(buf), sub, start, len(data) - 2) == data.find(sub, start, len(data) - 2)
@@ -0,0 +1,56 @@
+import fec
+import framing
+
+
+def parity_payloads(encoder, frame_type, seq, payload):
+    return [bytes(p[framing.HEADER_SIZE:-framing.CRC_SIZE]) for p in encoder.add(frame_type, seq, payload)]
+
+
+def encode(frames, k=4, depth=1):
+    # (type, seq, payload) data frames with their parity frames in place
+    encoder = fec.FecEncoder(k, depth)
+    stream = []
+    for frame in frames:
+        stream.append(frame)
+        stream.extend((fec.FEC_TYPE, 0, p) for p in parity_payloads(encoder, *frame))
+    return stream
+
+
+def payload(seq, run=0):
+    return bytes((run, seq & 0xFF)) * (1 + seq % 3)
+
+
+def test_rebuilds_one_lost_frame_per_group():
+    frames = [(0x81, seq, payload(seq)) for seq in range(16)]
+    decoder = fec.FecDecoder()
+    out = []
+    for frame in encode(frames, k=4, depth=2):
+        if frame[0] != fec.FEC_TYPE and frame[1] in (2, 3, 12):
+            continue
+        out.extend(decoder.feed(*frame))
+    assert sorted(out, key=lambda f: f[1]) == frames
+    assert decoder.recovered == 3 and decoder.rejected == 0
+
+
+def test_restart_flushes_history():
+    decoder = fec.FecDecoder()
+    for seq in range(20):
+        assert decoder.feed(0x81, seq, payload(seq)) == [(0x81, seq, payload(seq))]
+    for seq in range(5):
+        frame = (0x81, seq, payload(seq, run=1))
+        assert decoder.feed(*frame) == [frame]
+    # The same frame twice is still dropped
+    assert decoder.feed(0x81, 4, payload(4, run=1)) == []
+
+
+def test_rebuild_against_stale_frames_is_rejected():
+    # The ground missed the restart: it holds frames 1..3 of the previous run
+    decoder = fec.FecDecoder()
+    for seq in range(1, 4):
+        decoder.feed(0x81, seq, payload(seq))
+    encoder = fec.FecEncoder(4)
+    parity = []
+    for seq in range(4):
+        parity += parity_payloads(encoder, 0x81, seq, payload(seq, run=1))
+    assert decoder.feed(fec.FEC_TYPE, 0, parity[0]) == []
+    assert decoder.rejected == 1 and decoder.recovered == 0
@@ -0,0 +1,65 @@
+import datapacker
+import framing
+from ground import server as ground_server
+
+
+def frames(n, start=0, time=0):
+    # n frames from one cansat with seq from `start`, each with its own time value
+    framer = framing.Framer()
+    framer.seq = start
+    out = b''
+    for i in range(n):
+        datapacker.set_value(time + i, 'time')
+        out += framer.frame(datapacker.snapshot('gsm-full')[1], datapacker.profiles['gsm-full'].type_id)
+    return out
+
+
+def test_resend_on_new_connection_is_duplicate():
+    server = ground_server.GroundServer()
+    ground_server.Session(server, ('10.0.0.1', 40001)).feed(frames(5))
+    # The link dropped, the queued batch comes again over a new connection
+    ground_server.Session(server, ('10.0.0.1', 40002)).feed(frames(5) + frames(3, start=5, time=5))
+    assert server.frames == 8
+    assert server.duplicates == 5
+
+
+def test_senders_with_overlapping_seqs():
+    # Two cansats behind the same carrier NAT address, both counting from 0
+    server = ground_server.GroundServer()
+    a = ground_server.Session(server, ('10.0.0.1', 40001))
+    b = ground_server.Session(server, ('10.0.0.1', 40002))
+    a.feed(frames(20, time=1000))
+    b.feed(frames(20, time=5000))
+    a.feed(frames(5, start=20, time=1020))
+    assert server.frames == 45
+    assert server.duplicates == 0
+
+
+def test_reboot_restarts_seq():
+    server = ground_server.GroundServer()
+    session = ground_server.Session(server, ('10.0.0.1', 40001))
+    session.feed(frames(20, time=1000))
+    # Framer.seq is back at 0 after the reboot, the frames are new ones
+    ground_server.Session(server, ('10.0.0.1', 40002)).feed(frames(5, time=90000))
+    assert server.frames == 25
+    assert server.duplicates == 0
+
+
+def test_udp_resend_from_new_port_is_duplicate():
+    server = ground_server.GroundServer()
+    protocol = ground_server._UDPProtocol(server)
+    datagram = b'\x00\x07' + frames(2)
+    protocol.datagram_received(datagram, ('10.0.0.1', 40001))
+    protocol.datagram_received(datagram, ('10.0.0.1', 40002))
+    assert server.frames == 2
+    assert server.duplicates == 2
+
+
+def test_udp_after_reboot():
+    # The datagram sequence number restarts too
+    server = ground_server.GroundServer()
+    protocol = ground_server._UDPProtocol(server)
+    protocol.datagram_received(b'\x00\x00' + frames(2, time=1000), ('10.0.0.1', 40001))
+    protocol.datagram_received(b'\x00\x00' + frames(2, time=90000), ('10.0.0.1', 40002))
+    assert server.frames == 4
+    assert server.duplicates == 0
@@ -0,0 +1,200 @@
+import time
+
+import pytest
+
+import datapacker
+import delta
+import framing
+from communication import frame_queue, gsm
+from fake_modem import FakeModemUART
+from hardware.sim800l import GenericATError
+
+IP = b'AT+SAPBR=2,1\r\r\n+SAPBR: 1,1,"10.64.12.7"\r\n\r\nOK\r\n'
+NO_IP = b'AT+SAPBR=2,1\r\r\n+SAPBR: 1,3,"0.0.0.0"\r\n\r\nOK\r\n'
+CONNECT_OK = b'\r\nOK\r\n\r\nCONNECT OK\r\n'
+CONNECT_FAIL = b'\r\nOK\r\n\r\nCONNECT FAIL\r\n'
+
+
+def replies(**overrides):
+    r = {
+        'AT': lambda data: data + b'\r\r\nOK\r\n',
+        'ATI': b'ATI\r\r\nSIM800 R14.18\r\n\r\nOK\r\n',
+        'AT+CIPSSL=?': b'AT+CIPSSL=?\r\r\n+CIPSSL: (0-1)\r\n\r\nOK\r\n',
+        'AT+SAPBR=2,1': IP,
+        'AT+SAPBR=0,1': b'AT+SAPBR=0,1\r\r\nERROR\r\n',
+        'AT+CSQ': b'AT+CSQ\r\r\n+CSQ: 20,0\r\n\r\nOK\r\n',
+        'AT+CIPCLOSE': b'AT+CIPCLOSE\r\r\nCLOSE OK\r\n',
+        'AT+CIPSTART': CONNECT_OK,
+        'AT+CIPSEND': b'AT+CIPSEND\r\r\n> ',
+        'payload': b'\r\nSEND OK\r\n',
+    }
+    r.update(overrides)
+    return r
+
+
+def make_gsm(uart, **kwargs):
+    kwargs.setdefault('mode', framing.MODE_BINARY)
+    kwargs.setdefault('profile', 'gsm-full')
+    return gsm.GSM(uart, datapacker, **kwargs)
+
+
+def reconnect_until(g, done, seconds=3):
+    # Drives reconnect() like the loop does, checking that no call blocks
+    deadline = time.monotonic() + seconds
+    while not done():
+        assert time.monotonic() < deadline, 'reconnect did not finish'
+        start = time.monotonic()
+        g.reconnect()
+        assert time.monotonic() - start < 0.1, 'reconnect() blocked'
+        time.sleep(0.005)
+
+
+def test_reconnect_opens_connection():
+    uart = FakeModemUART(replies())
+    g = make_gsm(uart)
+    reconnect_until(g, g.connected)
+    assert any(w.startswith(b'AT+CIPSTART="TCP"') for w in uart.written)
+
+
+def test_connect_fail_fails_fast_with_backoff():
+    uart = FakeModemUART(replies(**{'AT+CIPSTART': CONNECT_FAIL}))
+    g = make_gsm(uart)
+    start = time.monotonic()
+    reconnect_until(g, lambda: g.backoff > gsm.BACKOFF_MIN_MS)
+    assert time.monotonic() - start < 1
+    assert g.state == gsm.STATE_DOWN and g.connecting is None
+
+    # Backing off: no new attempt before retry_at
+    written = len(uart.written)
+    g.reconnect()
+    assert len(uart.written) == written
+
+
+def test_cipstart_error_fails_fast():
+    uart = FakeModemUART(replies(**{'AT+CIPSTART': b'\r\nERROR\r\n'}))
+    g = make_gsm(uart)
+    start = time.monotonic()
+    reconnect_until(g, lambda: g.backoff > gsm.BACKOFF_MIN_MS)
+    assert time.monotonic() - start < 1
+
+
+def test_bearer_reconnect_does_not_block():
+    # The bearer comes back only on the second IP check after opengprs, a second later
+    uart = FakeModemUART(replies())
+    g = make_gsm(uart)
+    uart.replies['AT+SAPBR=2,1'] = [NO_IP, NO_IP, IP]
+    g.state = gsm.STATE_DOWN
+    reconnect_until(g, g.connected)
+    assert b'AT+SAPBR=1,1\r\n' in uart.written
+
+
+def test_silent_modem_does_not_block():
+    uart = FakeModemUART(replies())
+    g = make_gsm(uart)
+    del uart.replies['AT+CIPSTART']
+    for _ in range(20):
+        start = time.monotonic()
+        g.reconnect()
+        assert time.monotonic() - start < 0.1
+    assert g.connecting is not None and not g.connected()
+
+
+def test_queued_batches_survive_link_drop_mid_drain(tmp_path):
+    uart = FakeModemUART(replies())
+    queue = frame_queue.FrameQueue(str(tmp_path / 'queue.bin'), slots=8)
+    g = make_gsm(uart, keyframe_interval=30, batch_frames=3, queue=queue, drain_batches=2)
+    packed = []
+
+    def batch():
+        for _ in range(3):
+            datapacker.set_value(len(packed) * 7, 'time')
+            datapacker.set_value(len(packed) % 5, 'gps_sats')
+            packed.append(datapacker.snapshot('gsm-full')[1])
+            g.queue_frame(g.next_frame())
+        assert g.batch_due()
+        g.flush()
+        g.drain()
+
+    reconnect_until(g, g.connected)
+    batch()  # 1, sent
+
+    uart.inject(b'\r\nCLOSED\r\n')
+    g.modem.engine.poll()
+    assert not g.connected()
+    batch()  # 2, queued
+    batch()  # 3, queued
+    assert len(queue) == 2
+
+    # 4 goes out live, then the link drops while 3 is drained after 2
+    uart.replies['payload'] = [b'\r\nSEND OK\r\n', b'\r\nSEND OK\r\n', b'\r\nCLOSED\r\n', b'\r\nSEND OK\r\n']
+    reconnect_until(g, g.connected)
+    with pytest.raises(GenericATError):
+        batch()
+    lost = len(uart.sent) - 1
+    assert len(queue) == 1
+    g.modem.engine.reset()
+    g.state = gsm.STATE_IP
+
+    reconnect_until(g, g.connected)
+    g.drain()  # 3
+    assert len(queue) == 0
+    batch()  # 5
+
+    # The receiver gets 1, 4, 2, 3, 5 and must still decode every frame
+    decoder = delta.DeltaDecoder(datapacker.profiles['gsm-full'])
+    decoded = []
+    for i, payload in enumerate(uart.sent):
+        if i == lost:
+            continue
+        for frame_type, seq, data in framing.Deframer().feed(payload):
+            decoded.append(decoder.decode(data, seq))
+    assert decoder.lost == 0
+    assert decoded == packed[0:3] + packed[9:12] + packed[3:9] + packed[12:15]
+
+
+def test_queue_recreated_from_truncated_index(tmp_path):
+    path = str(tmp_path / 'queue.bin')
+    queue = frame_queue.FrameQueue(path, slots=4, slot_size=64)
+    queue.push(b'frame')
+    with open(path + '.idx', 'wb') as f:
+        f.write(b'\x00\x01')  # Reset while the index was written
+    queue = frame_queue.FrameQueue(path, slots=4, slot_size=64)
+    assert len(queue) == 0
+    queue.push(b'next')
+    assert queue.peek() == [(0, b'next')]
+
+
+def test_unanswered_csq_does_not_lose_the_batch(tmp_path):
+    uart = FakeModemUART(replies())
+    queue = frame_queue.FrameQueue(str(tmp_path / 'queue.bin'), slots=8)
+    g = make_gsm(uart, batch_frames=3, batch_ms=60000, queue=queue)
+    reconnect_until(g, g.connected)
+
+    def no_answer():
+        raise Exception('Timeout for command "AT+CSQ" (timeout=3)')
+    g.set_signal_strength = no_answer
+    for _ in range(3):
+        g.step()
+    assert len(uart.sent) == 1 and len(queue) == 0
+
+
+def test_failed_step_queues_the_open_batch(tmp_path):
+    uart = FakeModemUART(replies())
+    queue = frame_queue.FrameQueue(str(tmp_path / 'queue.bin'), slots=8)
+    g = make_gsm(uart, batch_frames=3, batch_ms=60000, queue=queue)
+    reconnect_until(g, g.connected)
+    g.step()
+    g.step()
+    batch = bytes(g.batch)
+
+    next_frame = g.next_frame
+    g.next_frame = lambda: 1 / 0
+    g.step()
+    assert g.batch_count == 0
+    assert queue.peek() == [(0, batch)]
+
+    # Back out of the queue once the link is up again
+    g.next_frame = next_frame
+    reconnect_until(g, g.connected)
+    g.drain()
+    assert uart.sent == [batch] and len(queue) == 0
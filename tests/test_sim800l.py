@@ -0,0 +1,106 @@
+import pytest
+
+from fake_modem import FakeModemUART
+from hardware import sim800l
+from hardware.sim800l import ATCommand, ATEngine, GenericATError
+
+
+def test_execute_returns_output_without_echo():
+    uart = FakeModemUART({'ATI': b'ATI\r\r\nSIM800 R14.18\r\n\r\nOK\r\n'})
+    modem = sim800l.Modem(uart=uart)
+    assert modem.execute_at_command('modeminfo') == 'SIM800 R14.18'
+    assert not modem.engine.busy()
+
+
+def test_urc_interleaved_with_command_reply():
+    uart = FakeModemUART({'AT+CSQ': b'AT+CSQ\r\r\n\r\nCLOSED\r\n+CSQ: 20,0\r\n\r\nOK\r\n'})
+    engine = ATEngine(uart)
+    urcs = []
+    engine.on_urc('CLOSED', urcs.append)
+    output = engine.execute(ATCommand('AT+CSQ'))
+    assert urcs == ['CLOSED\r\n']
+    assert '+CSQ: 20,0' in output
+
+
+def test_urc_without_running_command():
+    uart = FakeModemUART()
+    engine = ATEngine(uart)
+    urcs = []
+    engine.on_urc('+PDP: DEACT', urcs.append)
+    uart.inject(b'\r\n+PDP: DEACT\r\n')
+    engine.poll()
+    assert urcs == ['+PDP: DEACT\r\n']
+
+
+def test_line_split_across_polls():
+    uart = FakeModemUART()
+    engine = ATEngine(uart)
+    command = engine.submit(ATCommand('AT'))
+    engine.poll()
+    uart.inject(b'AT\r\r\nO')
+    engine.poll()
+    assert not command.done
+    uart.inject(b'K\r\n')
+    engine.poll()
+    assert command.done and command.error is None
+
+
+def test_timeout_raises_and_next_command_runs():
+    uart = FakeModemUART({'AT+CGMR': b'AT+CGMR\r\r\nRevision:1418B05\r\n\r\nOK\r\n'})
+    engine = ATEngine(uart)
+    silent = engine.submit(ATCommand('AT+SILENT', timeout=0.05))
+    after = engine.submit(ATCommand('AT+CGMR'))
+    with pytest.raises(Exception, match='Timeout'):
+        engine.wait(silent)
+    assert 'Revision' in engine.wait(after)
+
+
+def test_error_raises_generic_at_error():
+    uart = FakeModemUART({'AT+SAPBR=1,1': b'AT+SAPBR=1,1\r\r\nERROR\r\n', 'AT': b'AT\r\r\nOK\r\n'})
+    engine = ATEngine(uart)
+    failing = engine.submit(ATCommand('AT+SAPBR=1,1'))
+    after = engine.submit(ATCommand('AT'))
+    with pytest.raises(GenericATError):
+        engine.wait(failing)
+    engine.wait(after)
+    assert after.error is None
+
+
+def test_custom_error_token():
+    uart = FakeModemUART({'AT+CIPSTART': b'AT+CIPSTART="TCP","h","1"\r\r\nOK\r\n\r\nCONNECT FAIL\r\n'})
+    engine = ATEngine(uart)
+    with pytest.raises(GenericATError):
+        engine.execute(ATCommand('AT+CIPSTART="TCP","h","1"', 'CONNECT OK', 15, errors=('CONNECT FAIL', 'ERROR')))
+
+
+def test_send_prompt_without_newline():
+    uart = FakeModemUART({'AT+CIPSEND': b'AT+CIPSEND\r\r\n> ', 'payload': b'\r\nSEND OK\r\n'})
+    modem = sim800l.Modem(uart=uart)
+    modem.send_tcp(b'\x00\x01frame\n')
+    assert uart.sent == [b'\x00\x01frame\n']
+    assert not modem.engine.busy()
+
+
+def test_send_tcp_binary_with_ctrl_z_and_esc():
+    uart = FakeModemUART({'AT+CIPSEND': b'AT+CIPSEND\r\r\n> ', 'payload': b'\r\nSEND OK\r\n'})
+    modem = sim800l.Modem(uart=uart)
+    frame = b'\xa5\x5a\x04\x01\x00\x1a\x1b\x1a\x00\x1b\x12\x34'
+    modem.send_tcp(frame)
+    assert b'AT+CIPSEND=12\r\n' in uart.written
+    assert uart.sent == [frame]
+
+
+def test_close_tcp_waits_for_reply():
+    # The reply trickles in over several polls
+    uart = FakeModemUART({'AT+CIPCLOSE': b'AT+CIPCLOSE\r\r\nCLOSE OK\r\n', 'AT': b'AT\r\r\nOK\r\n'}, chunk=4)
+    modem = sim800l.Modem(uart=uart)
+    modem.close_tcp()
+    assert not modem.engine.busy()
+    modem.engine.execute(ATCommand('AT', timeout=0.05))
+
+
+def test_close_tcp_without_connection():
+    uart = FakeModemUART({'AT+CIPCLOSE': b'AT+CIPCLOSE\r\r\nERROR\r\n'})
+    modem = sim800l.Modem(uart=uart)
+    modem.close_tcp()
+    assert not modem.engine.busy()
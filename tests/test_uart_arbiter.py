@@ -0,0 +1,164 @@
+import importlib
+import sys
+import threading
+import time
+import types
+
+import pytest
+
+
+class FakeUART:
+    # machine.UART on the host: bytes fed on a pin only arrive while RX is routed to it
+    def __init__(self, uart_id, baudrate=9600, tx=None, rx=None, rxbuf=256):
+        self.rx = rx
+        self.rxbuf = bytearray()
+        self.inits = []
+        self.written = bytearray()
+
+    def init(self, **kwargs):
+        self.inits.append(kwargs)
+        if 'rx' in kwargs:
+            self.rx = kwargs['rx']
+
+    def feed(self, pin, data):
+        if pin == self.rx:
+            self.rxbuf.extend(data)
+
+    def any(self):
+        return len(self.rxbuf)
+
+    def readinto(self, buf, n):
+        n = min(n, len(self.rxbuf))
+        buf[:n] = self.rxbuf[:n]
+        del self.rxbuf[:n]
+        return n
+
+    def write(self, data):
+        self.written.extend(data)
+        return len(data)
+
+
+machine = types.ModuleType('machine')
+machine.UART = FakeUART
+machine.Pin = lambda pin, *args: pin
+
+utime = types.ModuleType('utime')
+utime.ticks_ms = lambda: int(time.monotonic() * 1000)
+utime.ticks_diff = lambda a, b: a - b
+utime.sleep_ms = lambda ms: time.sleep(ms / 1000)
+
+
+@pytest.fixture
+def uart_arbiter(monkeypatch):
+    # hardware.uart_arbiter imported against the fakes, none of them stays in sys.modules
+    monkeypatch.setitem(sys.modules, 'machine', machine)
+    monkeypatch.setitem(sys.modules, 'utime', utime)
+    sys.modules.pop('hardware.uart_arbiter', None)
+    yield importlib.import_module('hardware.uart_arbiter')
+    sys.modules.pop('hardware.uart_arbiter', None)
+
+
+@pytest.fixture
+def uart1(uart_arbiter):
+    arbiter = uart_arbiter.UARTArbiter(1, baudrate=9600, tx=33, rx=34)
+    radio = arbiter.port('radio', rx=34, tx=True)
+    gps = arbiter.port('gps', rx=38)
+    return arbiter, radio, gps
+
+
+def test_rx_goes_to_owner_only(uart1):
+    arbiter, radio, gps = uart1
+    radio.claim_rx()
+    arbiter.uart.feed(34, b'OK\r\n')
+    assert gps.any() == 0
+    assert radio.read() == b'OK\r\n'
+
+
+def test_switch_keeps_bytes_received_before(uart1):
+    arbiter, radio, gps = uart1
+    radio.claim_rx()
+    arbiter.uart.feed(34, b'radio')
+    gps.claim_rx()
+    assert arbiter.uart.inits == [{'rx': 38}]
+    arbiter.uart.feed(38, b'$GPGGA,1\r\n$GPRMC,2\r\n')
+    assert radio.read() == b'radio'
+    assert gps.readline() == b'$GPGGA,1\r\n'
+    assert gps.readline() == b'$GPRMC,2\r\n'
+    assert arbiter.switches == 1
+
+
+def test_unrouted_bytes_are_discarded(uart1):
+    arbiter, radio, gps = uart1
+    radio.claim_rx()
+    arbiter.route_rx(None)
+    arbiter.uart.feed(34, b'noise')
+    arbiter.pump()
+    assert arbiter.discarded == 5
+    assert radio.any() == 0
+
+
+def test_slow_consumer_loses_oldest(uart1):
+    arbiter, radio, gps = uart1
+    small = arbiter.port('small', rx=34, size=4)
+    small.claim_rx()
+    arbiter.uart.feed(34, b'abcdef')
+    assert small.read() == b'cdef'
+    assert small.overflows == 2
+
+
+def test_ownership_errors(uart1):
+    arbiter, radio, gps = uart1
+    with pytest.raises(Exception, match='already owned by radio'):
+        arbiter.port('other', tx=True)
+    with pytest.raises(Exception, match='gps does not own UART TX'):
+        gps.write(b'$PMTK')
+    with pytest.raises(Exception, match='gps does not own the UART'):
+        gps.init(baudrate=115200)
+    with pytest.raises(Exception, match='no RX pin'):
+        arbiter.port('tx-only').claim_rx()
+
+    gps.init(timeout=100)  # Timeouts are per port
+    radio.init(baudrate=115200)
+    assert arbiter.uart.inits[-1] == {'baudrate': 115200}
+    assert radio.write(b'AT\r\n') == 4 and arbiter.uart.written == b'AT\r\n'
+
+    radio.deinit()
+    assert arbiter.tx_owner is None
+    assert arbiter.port('next', tx=True).name == 'next'
+
+
+def test_read_times_out_for_owner(uart1):
+    arbiter, radio, gps = uart1
+    gps.claim_rx()
+    gps.init(timeout=50, timeout_char=20)
+    start = time.monotonic()
+    assert gps.read(10) is None
+    assert 0.04 <= time.monotonic() - start < 0.5
+
+    arbiter.uart.feed(38, b'$GP')
+    start = time.monotonic()
+    assert gps.read(10) == b'$GP'
+    assert 0.015 <= time.monotonic() - start < 0.5
+
+
+def test_read_waits_for_bytes_in_flight(uart1):
+    arbiter, radio, gps = uart1
+    gps.claim_rx()
+    gps.init(timeout=200, timeout_char=50)
+    buf = bytearray(4)
+    arbiter.uart.feed(38, b'$G')
+    # The rest arrives within timeout_char
+    feeder = threading.Timer(0.01, arbiter.uart.feed, (38, b'PGGA'))
+    feeder.start()
+    assert gps.readinto(buf) == 4
+    feeder.join()
+    assert buf == b'$GPG'
+
+
+def test_non_owner_does_not_wait(uart1):
+    arbiter, radio, gps = uart1
+    radio.claim_rx()
+    gps.init(timeout=1000)
+    start = time.monotonic()
+    assert gps.read(1) is None
+    assert time.monotonic() - start < 0.1